@@ -0,0 +1,114 @@
+"""Measures the throughput and latency percentiles of the match-lookup service, see lookupservice.py.
+
+The service is started in a separate process on a free port, unless --port points to a running one. Every client
+keeps a connection open and sends the rows of restaurants.tsv one by one as single listings.
+
+Usage (from the src directory):
+    python benchmark_lookup.py --clients 1 8 32 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str,
+                   payload: Optional[Any] = None) -> Any:
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write("{} {} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n"
+                 .format(method, path, len(body)).encode("latin-1") + body)
+    await writer.drain()
+    await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return json.loads(await reader.readexactly(length))
+
+
+async def _client(port: int, records: List[Dict[str, Any]], latencies: List[float]):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for record in records:
+            start = time.perf_counter()
+            await _request(reader, writer, "POST", "/match", record)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def _measure(port: int, records: List[Dict[str, Any]], clients: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(port, records[c::clients], latencies) for c in range(clients)))
+    seconds = time.perf_counter() - start
+    milliseconds = np.array(latencies) * 1000
+    return {"clients": clients, "requests": len(latencies), "qps": len(latencies) / seconds,
+            "p50_ms": np.percentile(milliseconds, 50), "p99_ms": np.percentile(milliseconds, 99),
+            "max_ms": milliseconds.max()}
+
+
+def _freePort() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _waitForService(port: int, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+            continue
+        await _request(reader, writer, "GET", "/health")
+        writer.close()
+        return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measures the throughput and latency of the match-lookup service")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32],
+                        help="numbers of concurrent connections to measure, default = 1 8 32")
+    parser.add_argument("--requests", type=int, default=5000, help="requests per measurement, default = 5000")
+    parser.add_argument("--port", type=int, help="port of a running service, default = a new service is started")
+    args = parser.parse_args()
+
+    df = pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t')
+    rows = df.drop(columns="id").to_dict("records")
+    records = [rows[i % len(rows)] for i in range(args.requests)]
+
+    service = None
+    port = args.port
+    if port is None:
+        port = _freePort()
+        service = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 "lookupservice.py"), "--port", str(port)],
+                                   stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(_waitForService(port))
+        print("clients,requests,qps,p50_ms,p99_ms,max_ms")
+        for clients in args.clients:
+            result = asyncio.run(_measure(port, records, clients))
+            print("{clients},{requests},{qps:.0f},{p50_ms:.3f},{p99_ms:.3f},{max_ms:.3f}".format(**result))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
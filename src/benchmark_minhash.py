@@ -0,0 +1,138 @@
+"""Recall versus speed report of the MinHash-LSH approximate mode, see minhash.py.
+
+For every combination of the token and character (bands, rows) parameters, main.deduplicate and clean.calcDistances
+run in the approximate mode and are compared to the exact mode: the time, the evaluated pairs, the pairwise precision
+and recall against the Gold Standard and the share of the exactly found pairs that the approximate mode finds, too.
+
+Usage (from the src directory):
+    python benchmark_minhash.py --rows 100000 --tokens 16x2 32x3 64x4 --chars 32x6 64x8 32x16
+"""
+import argparse
+import time
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+import clean
+import evaluation
+import main
+import minhash
+import utils
+from instrumentation import RECORDER
+
+
+def _parameters(value: str) -> Tuple[int, int]:
+    bands, rows = value.lower().split("x")
+    return int(bands), int(rows)
+
+
+def _deduplicate(df: pd.DataFrame, approximate: bool) -> Tuple[float, int, set]:
+    RECORDER.reset()
+    RECORDER.enable()
+    try:
+        start = time.perf_counter()
+        _, dupes = main.deduplicate(df.copy(), approximate=approximate)
+        seconds = time.perf_counter() - start
+        pairsScored = RECORDER.counters["pairsScored"]
+    finally:
+        RECORDER.disable()
+        RECORDER.reset()
+    return seconds, pairsScored, evaluation.pairsOf(dupes)
+
+
+def _calcDistances(names, approximate: bool, minDistance: float, bias: float) -> Tuple[float, set]:
+    start = time.perf_counter()
+    distances = clean.calcDistances(names, bias, readFromFile=False, writeToFile=False, minDistance=minDistance,
+                                    approximate=approximate)
+    seconds = time.perf_counter() - start
+    return seconds, {frozenset(d[0:2]) for d in distances}
+
+
+def _reportCalcDistances(names, parameters: List[Tuple[int, int]], chars: bool, minDistance: float, bias: float):
+    stage = "calcDistances." + ("chars" if chars else "tokens")
+    utils.config["useOldCalculation"] = chars
+    exactSeconds, exactPairs = _calcDistances(names, False, minDistance, bias)
+    print(stage, "exact", "", "", "", "", "", "{:.3f}".format(exactSeconds), "1.00", len(exactPairs), "", "",
+          "1.0000", sep=",")
+    for bands, rows in parameters:
+        if chars:
+            utils.config.update(minHashCharBands=bands, minHashCharRows=rows)
+        else:
+            utils.config.update(minHashTokenBands=bands, minHashTokenRows=rows)
+        seconds, pairs = _calcDistances(names, True, minDistance, bias)
+        probability = "{:.3f}".format(minhash.collisionProbability(minDistance, bands, rows))
+        print(stage, *(("", "", bands, rows, "", probability) if chars else (bands, rows, "", "", probability, "")),
+              "{:.3f}".format(seconds), "{:.2f}".format(exactSeconds / seconds), len(pairs), "", "",
+              "{:.4f}".format(len(pairs & exactPairs) / len(exactPairs) if exactPairs else 1.0), sep=",")
+
+
+def report(df: pd.DataFrame, goldPairs: set, tokenParameters: List[Tuple[int, int]],
+           charParameters: List[Tuple[int, int]], names: int = 5000):
+    """Prints the recall versus speed report as csv.
+
+    main.deduplicate runs for every combination of the token and character parameters. clean.calcDistances runs with
+    the token parameters and the cutoff 0.45 and bias 0.5 of clean.py, and with the character parameters and the
+    cutoff 0.65 and bias 0.7 of its old calculation. The collision probabilities are given for the thresholds of the
+    stage, e.g. minTokenDistance 0.5 and minTextDistance 0.9 for main.deduplicate.
+
+    Args:
+        df: a fresh pandas DataFrame
+        goldPairs: the duplicate pairs of the Gold Standard, see evaluation.GoldStandard.pairs
+        tokenParameters: the (bands, rows) of the token LSH to measure
+        charParameters: the (bands, rows) of the character LSH to measure
+        names: the number of unique names used for calcDistances, default = 5000
+    """
+    print("stage,tokenBands,tokenRows,charBands,charRows,p(tokens),p(chars),seconds,speedup,pairs,"
+          "pair_precision,pair_recall,recall_vs_exact")
+    exactSeconds, exactScored, exactPairs = _deduplicate(df, False)
+    metrics = evaluation.pairwiseMetrics(exactPairs, goldPairs)
+    print("deduplicate", "exact", "", "", "", "", "", "{:.3f}".format(exactSeconds), "1.00", exactScored,
+          "{:.4f}".format(metrics[3]), "{:.4f}".format(metrics[4]), "1.0000", sep=",")
+    for tokenBands, tokenRows in tokenParameters:
+        for charBands, charRows in charParameters:
+            utils.config.update(minHashTokenBands=tokenBands, minHashTokenRows=tokenRows,
+                                minHashCharBands=charBands, minHashCharRows=charRows)
+            seconds, scored, pairs = _deduplicate(df, True)
+            metrics = evaluation.pairwiseMetrics(pairs, goldPairs)
+            print("deduplicate", tokenBands, tokenRows, charBands, charRows,
+                  "{:.3f}".format(minhash.collisionProbability(0.5, tokenBands, tokenRows)),
+                  "{:.3f}".format(minhash.collisionProbability(0.9, charBands, charRows)),
+                  "{:.3f}".format(seconds), "{:.2f}".format(exactSeconds / seconds), scored,
+                  "{:.4f}".format(metrics[3]), "{:.4f}".format(metrics[4]),
+                  "{:.4f}".format(len(pairs & exactPairs) / len(exactPairs) if exactPairs else 1.0), sep=",")
+
+    uniqueNames = clean.preProcess(df.copy()).cname.dropna().unique()[:names]
+    _reportCalcDistances(uniqueNames, tokenParameters, False, 0.45, 0.5)
+    _reportCalcDistances(uniqueNames, charParameters, True, 0.65, 0.7)
+
+
+def load(rows: Optional[int], duplicateRate: float) -> Tuple[pd.DataFrame, set]:
+    """Loads restaurants.tsv and its Gold Standard, or a synthetic dataset with the given number of rows."""
+    if rows is None:
+        return pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t'), evaluation.GOLD.pairs
+    import os
+    import benchmark_suite
+    import synthetic
+    directory = os.path.join(utils.PATH_PREFIX, "benchmarks")
+    os.makedirs(directory, exist_ok=True)
+    path = benchmark_suite.dataset(directory, rows, duplicateRate, 0)
+    return pd.read_csv(path, delimiter="\t"), evaluation.GoldStandard(synthetic.goldPath(path)).pairs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compares the recall and speed of the MinHash-LSH approximate mode "
+                                                 "to the exact mode")
+    parser.add_argument("--rows", type=int, help="uses a synthetic dataset with this many rows instead of "
+                                                 "restaurants.tsv")
+    parser.add_argument("--duplicate-rate", type=float, default=0.2, help="share of duplicate rows of the synthetic "
+                                                                          "dataset, default = 0.2")
+    parser.add_argument("--tokens", type=_parameters, nargs="+", default=[(16, 2), (32, 3), (64, 4)],
+                        help="the BANDSxROWS of the token LSH to measure, default = 16x2 32x3 64x4")
+    parser.add_argument("--chars", type=_parameters, nargs="+", default=[(32, 6), (64, 8), (32, 16)],
+                        help="the BANDSxROWS of the character LSH to measure, default = 32x6 64x8 32x16")
+    parser.add_argument("--names", type=int, default=5000,
+                        help="number of unique names used for calcDistances, default = 5000")
+    args = parser.parse_args()
+
+    utils.config["printBlockingStats"] = False
+    report(*load(args.rows, args.duplicate_rate), args.tokens, args.chars, args.names)
@@ -0,0 +1,52 @@
+"""Scaling benchmark of the pairwise matching stage of main.deduplicate and clean.calcDistances.
+
+Usage (from the src directory):
+    python benchmark_parallel.py --copies 4 --workers 1 2 4 8 16
+"""
+import argparse
+import time
+
+import pandas as pd
+
+import clean
+import main
+import utils
+
+
+def replicate(df: pd.DataFrame, copies: int) -> pd.DataFrame:
+    """Concatenates copies of the DataFrame with continuous ids, so the number of pairs grows quadratically."""
+    df = pd.concat([df] * copies, ignore_index=True)
+    df["id"] = df.index + 1
+    return df
+
+
+def benchmark(df: pd.DataFrame, workerCounts, distanceNames: int):
+    print("stage,workers,pairs,seconds,pairsPerSecond")
+    for workers in workerCounts:
+        pairs = len(df) * (len(df) - 1) // 2
+        start = time.perf_counter()
+        main.deduplicate(df.copy(), blockingKeys=None, workers=workers)
+        seconds = time.perf_counter() - start
+        print("deduplicate", workers, pairs, "{:.3f}".format(seconds), "{:.0f}".format(pairs / seconds), sep=",")
+
+    names = clean.preProcess(df.copy()).cname.unique()[:distanceNames]
+    for workers in workerCounts:
+        pairs = len(names) * (len(names) - 1) // 2
+        start = time.perf_counter()
+        clean.calcDistances(names, readFromFile=False, writeToFile=False, workers=workers)
+        seconds = time.perf_counter() - start
+        print("calcDistances", workers, pairs, "{:.3f}".format(seconds), "{:.0f}".format(pairs / seconds), sep=",")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measures the throughput of the matching stage per worker count")
+    parser.add_argument("--copies", type=int, default=4, help="how often restaurants.tsv is replicated, default = 4")
+    parser.add_argument("--names", type=int, default=400,
+                        help="number of unique names used for calcDistances, default = 400")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="the worker counts to measure, default = 1 2 4 8 16")
+    args = parser.parse_args()
+
+    utils.config["printBlockingStats"] = False
+    benchmark(replicate(pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t'), args.copies),
+              args.workers, args.names)
@@ -0,0 +1,77 @@
+"""Benchmark of preprocessing.preProcess against the former chain of Series.str.replace calls.
+
+Usage (from the src directory):
+    python benchmark_preprocessing.py --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import preprocessing
+import utils
+from preprocessing import Regexes
+
+
+def legacyPreProcess(df: pd.DataFrame) -> pd.DataFrame:
+    """The former implementation of main.preProcess and clean.preProcess, only kept as reference."""
+    for k, v in Regexes.ADDRESS_REPLACE_DICT.items():
+        df.address = df.address.str.replace(k, v, case=False, regex=True)
+    for k, v in Regexes.CITY_REPLACE_DICT.items():
+        df.city = df.city.str.replace(k, v, case=False, regex=True)
+    df.type = df.type.fillna("")
+    df.type = df.type.str.replace(Regexes.BRACKETS_REGEX, '', case=False, regex=True) \
+        .str.replace(Regexes.TYPE_REMOVE_REGEX, "", case=False, regex=True)
+    df.phone = df.phone.str.replace(Regexes.NON_ALPHA_REGEX, '', case=False, regex=True)
+    df.name = df.name.str.replace(Regexes.BRACKETS_REGEX, '', case=False, regex=True)
+
+    df["cname"] = df.name.copy()
+    df["caddress"] = df.address.copy()
+    df.cname = df.cname.str.replace(Regexes.NON_ALPHA_OR_SPACE_REGEX, '', case=False, regex=True) \
+        .str.replace('  the$', '', case=False, regex=True)
+    df.caddress = df.caddress.str.replace(Regexes.NON_ALPHA_OR_SPACE_REGEX, '', case=False, regex=True)
+    return df
+
+
+def synthetic(df: pd.DataFrame, rows: int, seed: int = 0) -> pd.DataFrame:
+    """Samples rows of the DataFrame and makes a share of the names, addresses and phones unique, so the number of
+    distinct values grows with the number of rows, like in real feeds."""
+    rand = np.random.RandomState(seed)
+    df = df.sample(rows, replace=True, random_state=rand).reset_index(drop=True)
+    unique = rand.rand(rows) < 0.3
+    suffix = pd.Series(np.arange(rows).astype(str), index=df.index)
+    df.loc[unique, "name"] = df.name[unique] + " " + suffix[unique]
+    df.loc[unique, "address"] = suffix[unique] + " " + df.address[unique]
+    df.loc[unique, "phone"] = df.phone[unique].str[:-4] + suffix[unique].str[-4:].str.zfill(4)
+    df.loc[rand.rand(rows) < 0.01, "type"] = np.nan
+    df["id"] = df.index + 1
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compares the preprocessing pipeline to the former implementation")
+    parser.add_argument("--rows", type=int, default=1000000, help="number of synthetic rows, default = 1000000")
+    args = parser.parse_args()
+
+    df = synthetic(pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t'), args.rows)
+    print("rows:", len(df), "distinct names:", df.name.nunique(), "distinct cities:", df.city.nunique())
+
+    start = time.perf_counter()
+    expected = legacyPreProcess(df.copy())
+    legacySeconds = time.perf_counter() - start
+    print("legacy str.replace chain:   {:.2f}s".format(legacySeconds))
+
+    start = time.perf_counter()
+    actual = preprocessing.preProcess(df.copy(), preprocessing.Pipeline())
+    coldSeconds = time.perf_counter() - start
+    print("pipeline, empty memo:       {:.2f}s ({:.1f}x)".format(coldSeconds, legacySeconds / coldSeconds))
+
+    # the first call fills the memo of the shared pipeline, the second one reuses it
+    preprocessing.preProcess(df.copy())
+    start = time.perf_counter()
+    preprocessing.preProcess(df.copy())
+    warmSeconds = time.perf_counter() - start
+    print("pipeline, reused memo:      {:.2f}s ({:.1f}x)".format(warmSeconds, legacySeconds / warmSeconds))
+
+    print("identical output:", expected.equals(actual))
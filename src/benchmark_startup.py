@@ -0,0 +1,38 @@
+"""Benchmark of the startup time of the command line entry point.
+
+Usage (from any directory):
+    python src/benchmark_startup.py --runs 20 --budget 150
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+
+
+def startupTimes(arguments: List[str], runs: int) -> List[float]:
+    """Runs the cli with the given arguments in a fresh interpreter and returns the wall time of every run in ms."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, CLI] + arguments, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measures the startup time of cli.py")
+    parser.add_argument("--runs", type=int, default=20, help="number of runs per command, default = 20")
+    parser.add_argument("--budget", type=float, default=150, help="maximum median time in ms, default = 150")
+    args = parser.parse_args()
+
+    overBudget = False
+    for arguments in (["--help"], ["dedupe", "--help"], ["evaluate", "--help"]):
+        median = statistics.median(startupTimes(arguments, args.runs))
+        overBudget |= median > args.budget
+        print("{:<20} median {:6.1f}ms (budget {:.0f}ms)".format(" ".join(arguments), median, args.budget))
+    sys.exit(1 if overBudget else 0)
@@ -0,0 +1,176 @@
+"""Benchmark suite of the pipeline stages on synthetic datasets, see synthetic.generate.
+
+Every stage runs in a fresh process, so its peak memory and the warm up of the memos don't influence the other stages.
+The results are appended to data/work/benchmarks/results.csv together with the current git commit, so the runs of
+different commits can be compared.
+
+Usage (from the src directory):
+    python benchmark_suite.py --rows 10000 100000 1000000 --duplicate-rate 0.2 --compare
+"""
+import argparse
+import csv
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+import utils
+from instrumentation import peakRssMb
+
+STAGES = ["preProcess", "deduplicate", "calcDistances", "clean"]
+CSV_HEADER = ["commit", "timestamp", "rows", "duplicateRate", "stage", "items", "unit", "seconds", "itemsPerSecond",
+              "peakRssMb", "precision", "recall"]
+
+
+def _pairwise(duplicates, goldFile: str, ids=None) -> List[float]:
+    import evaluation
+    gold = evaluation.GoldStandard(goldFile).pairs
+    if ids is not None:
+        gold = {pair for pair in gold if pair[0] in ids and pair[1] in ids}
+    return evaluation.pairwiseMetrics(evaluation.pairsOf(duplicates), gold)[3:5]
+
+
+def _runStage(stage: str, dataFile: str, goldFile: str, names: int, cleanRows: int) -> Dict:
+    """Runs a single stage on the dataset, this is executed in a fresh process."""
+    import pandas as pd
+    import clean
+    import main
+
+    utils.config["printBlockingStats"] = False
+    df = pd.read_csv(dataFile, delimiter="\t")
+    precision = recall = float("nan")
+    if stage == "preProcess":
+        items, unit = len(df), "rows"
+        start = time.perf_counter()
+        main.preProcess(df)
+        seconds = time.perf_counter() - start
+    elif stage == "deduplicate":
+        items, unit = len(df), "rows"
+        start = time.perf_counter()
+        _, dupes = main.deduplicate(df)
+        seconds = time.perf_counter() - start
+        precision, recall = _pairwise(dupes, goldFile)
+    elif stage == "calcDistances":
+        strings = clean.preProcess(df).cname.dropna().unique()[:names]
+        items, unit = len(strings) * (len(strings) - 1) // 2, "pairs"
+        start = time.perf_counter()
+        clean.calcDistances(strings, readFromFile=False, writeToFile=False)
+        seconds = time.perf_counter() - start
+    elif stage == "clean":
+        df = df.iloc[:cleanRows]
+        items, unit = len(df), "rows"
+        start = time.perf_counter()
+        cleaned = clean.clean(df, 0.5, 0.45, readFromFile=False, writeToFile=False)
+        seconds = time.perf_counter() - start
+        precision, recall = _pairwise(list(cleaned[cleaned.id.map(len) > 1].id), goldFile, set(df.id))
+    else:
+        raise ValueError("Unknown stage: " + stage)
+    return {"stage": stage, "items": items, "unit": unit, "seconds": seconds,
+            "itemsPerSecond": items / seconds if seconds > 0 else float("nan"), "peakRssMb": peakRssMb(),
+            "precision": precision, "recall": recall}
+
+
+def currentCommit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return commit.stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def dataset(directory: str, rows: int, duplicateRate: float, seed: int) -> str:
+    """Generates the synthetic dataset, unless it already exists in the directory, and returns its path."""
+    import synthetic
+    path = os.path.join(directory, "synthetic-{}-{}-{}.tsv".format(rows, duplicateRate, seed))
+    if not os.path.exists(path) or not os.path.exists(synthetic.goldPath(path)):
+        df, gold = synthetic.generate(rows, duplicateRate, seed)
+        synthetic.writeDataset(df, gold, path)
+    return path
+
+
+def runSuite(rowCounts: List[int], duplicateRate: float = 0.2, stages: List[str] = STAGES, names: int = 1000,
+             cleanRows: int = 1000, seed: int = 0, directory: Optional[str] = None) -> List[Dict]:
+    """Runs every stage on a synthetic dataset of every size.
+
+    Args:
+        rowCounts: the sizes of the synthetic datasets
+        duplicateRate: the share of duplicate rows, default = 0.2
+        stages: the stages to run, default = STAGES
+        names: the number of unique names calcDistances compares, as it is quadratic, default = 1000
+        cleanRows: the number of rows clean uses, as it is quadratic, default = 1000
+        seed: of the synthetic datasets, default = 0
+        directory: where the synthetic datasets are cached, default = PATH_PREFIX/benchmarks
+
+    Returns:
+        a list of dicts with the keys of CSV_HEADER
+    """
+    import synthetic
+    directory = directory or os.path.join(utils.PATH_PREFIX, "benchmarks")
+    os.makedirs(directory, exist_ok=True)
+    commit, timestamp = currentCommit(), time.strftime("%Y-%m-%dT%H:%M:%S")
+    results = []
+    for rows in rowCounts:
+        dataFile = dataset(directory, rows, duplicateRate, seed)
+        for stage in stages:
+            # a new pool for every stage, so the peak memory is measured per stage
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                result = pool.submit(_runStage, stage, dataFile, synthetic.goldPath(dataFile), names,
+                                     cleanRows).result()
+            result.update(commit=commit, timestamp=timestamp, rows=rows, duplicateRate=duplicateRate)
+            results.append(result)
+            print("{rows:>8} rows {stage:<14} {items:>10} {unit:<5} {seconds:8.2f}s {itemsPerSecond:12.0f} {unit}/s "
+                  "{peakRssMb:8.1f} MB".format(**result))
+    return results
+
+
+def saveResults(results: List[Dict], path: str):
+    """Appends the results to the csv file at path."""
+    exists = os.path.exists(path)
+    with open(path, "a", newline="") as file:
+        writer = csv.DictWriter(file, CSV_HEADER)
+        if not exists:
+            writer.writeheader()
+        writer.writerows(results)
+
+
+def compareResults(results: List[Dict], path: str):
+    """Prints the change of the throughput and peak memory of every result against the last run of another commit."""
+    if not os.path.exists(path):
+        return
+    with open(path, newline="") as file:
+        previous = {}
+        for row in csv.DictReader(file):
+            if row["commit"] != results[0]["commit"]:
+                previous[(int(row["rows"]), float(row["duplicateRate"]), row["stage"])] = row
+    for result in results:
+        row = previous.get((result["rows"], result["duplicateRate"], result["stage"]))
+        if row is not None:
+            print("{:>8} rows {:<14} vs {}: throughput {:+.1%}, peak memory {:+.1%}".format(
+                result["rows"], result["stage"], row["commit"],
+                result["itemsPerSecond"] / float(row["itemsPerSecond"]) - 1,
+                result["peakRssMb"] / float(row["peakRssMb"]) - 1))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measures the stages of the pipeline on synthetic datasets")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000],
+                        help="the sizes of the synthetic datasets, default = 10000 100000")
+    parser.add_argument("--duplicate-rate", type=float, default=0.2, help="share of duplicate rows, default = 0.2")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES, help="the stages to run, default = all")
+    parser.add_argument("--names", type=int, default=1000,
+                        help="number of unique names used for calcDistances, default = 1000")
+    parser.add_argument("--clean-rows", type=int, default=1000, help="number of rows used for clean, default = 1000")
+    parser.add_argument("--output", default=os.path.join(utils.PATH_PREFIX, "benchmarks", "results.csv"),
+                        help="the csv file the results are appended to, default = data/work/benchmarks/results.csv")
+    parser.add_argument("--compare", action="store_true",
+                        help="compares the results to the last run of another commit in the output file")
+    args = parser.parse_args()
+
+    suiteResults = runSuite(args.rows, args.duplicate_rate, args.stages, args.names, args.clean_rows)
+    if args.compare:
+        compareResults(suiteResults, args.output)
+    saveResults(suiteResults, args.output)
+    print("Written the results to '" + args.output + "'.")
@@ -0,0 +1,111 @@
+from collections import Counter, defaultdict
+from itertools import combinations
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+
+def streetNumbers(address: str) -> Tuple[int, ...]:
+    """Extracts the street numbers of an address the same way main.areRowsSame compares them.
+
+    Args:
+        address: a preprocessed address (caddress)
+
+    Returns:
+        a tuple of all integer tokens in the address
+    """
+    return tuple(int(s) for s in address.split() if s.isdigit())
+
+
+def phoneKey(df: pd.DataFrame) -> pd.Series:
+    """Blocks rows by their normalized phone number (digits only after preprocessing)."""
+    return df.phone
+
+
+def cityStreetNumber(city: Any, address: Any) -> Optional[Tuple[str, Tuple[int, ...]]]:
+    """The cityStreetNumber key of a single row, None if the city or address is missing."""
+    return (city, streetNumbers(address)) if isinstance(city, str) and isinstance(address, str) else None
+
+
+def cityStreetNumberKey(df: pd.DataFrame) -> pd.Series:
+    """Blocks rows by their city combined with all street numbers found in caddress."""
+    return pd.Series([cityStreetNumber(city, address) for city, address in zip(df.city, df.caddress)],
+                     index=df.index, dtype=object)
+
+
+def rareNameTokensKey(df: pd.DataFrame, maxTokenFrequency: int = 5) -> pd.Series:
+    """Blocks rows by every cname token that occurs in at most maxTokenFrequency rows.
+
+    Args:
+        df: a preprocessed pandas DataFrame
+        maxTokenFrequency: tokens occurring in more rows than this are considered too common to block on
+
+    Returns:
+        a Series containing a list of keys for each row
+    """
+    tokenSets = [set(name.split()) if isinstance(name, str) else set() for name in df.cname]
+    frequency = Counter(t for tokens in tokenSets for t in tokens)
+    return pd.Series([[t for t in sorted(tokens) if frequency[t] <= maxTokenFrequency] for tokens in tokenSets],
+                     index=df.index, dtype=object)
+
+
+BLOCKING_KEYS: Dict[str, Callable[[pd.DataFrame], pd.Series]] = {
+    "phone": phoneKey,
+    "cityStreetNumber": cityStreetNumberKey,
+    "rareNameTokens": rareNameTokensKey,
+}
+
+# phone and city + street numbers together cover every pair main.areRowsSame can accept,
+# so blocking on them does not lose any recall compared to comparing all pairs
+DEFAULT_BLOCKING_KEYS = ("phone", "cityStreetNumber")
+
+# these keys only depend on the row itself and not on the rest of the dataset,
+# so they stay valid when new rows get added (see incremental.ResolvedStore)
+ROW_LOCAL_BLOCKING_KEYS = ("phone", "cityStreetNumber")
+
+# the keys of a single preprocessed row (e.g. a namedtuple) for every row local blocking key, so single rows can be
+# looked up in a blocking index without building a DataFrame (see lookupservice.MatchIndex)
+ROW_KEYS: Dict[str, Callable[[Any], Any]] = {
+    "phone": lambda row: row.phone,
+    "cityStreetNumber": lambda row: cityStreetNumber(row.city, row.caddress),
+}
+
+BlockingKey = Union[str, Callable[[pd.DataFrame], pd.Series]]
+
+
+def keysOf(value: Any) -> List[Hashable]:
+    """Converts a value of a blocking key Series into the list of keys, without None and NaN."""
+    keys = value if isinstance(value, list) else [value]
+    return [key for key in keys if key is not None and key == key]
+
+
+def candidatePairs(df: pd.DataFrame, blockingKeys: Iterable[BlockingKey] = DEFAULT_BLOCKING_KEYS) \
+        -> Tuple[List[Tuple[int, int]], int]:
+    """Generates all candidate pairs that share at least one blocking key.
+
+    Every blocking key is either the name of an entry in BLOCKING_KEYS or a callable, that takes the DataFrame and
+    returns a Series aligned to it. The values of that Series are the keys of the row, which can be a single hashable
+    key, a list of keys or None/NaN if the row should not be blocked by this key.
+
+    Args:
+        df: a preprocessed pandas DataFrame
+        blockingKeys: the blocking keys to use, default = DEFAULT_BLOCKING_KEYS
+
+    Returns:
+        a tuple of (pairs, prunedCount).
+            pairs is a sorted list of (position1, position2) tuples with position1 < position2,
+                the positions refer to the row order in df
+            prunedCount is the number of pairs that were pruned compared to comparing all pairs
+    """
+    pairs = set()
+    for blockingKey in blockingKeys:
+        keyFunction = BLOCKING_KEYS[blockingKey] if isinstance(blockingKey, str) else blockingKey
+        blocks = defaultdict(list)
+        for position, keys in enumerate(keyFunction(df)):
+            for key in keysOf(keys):
+                blocks[key].append(position)
+        for block in blocks.values():
+            pairs.update(combinations(block, 2))
+
+    totalPairs = len(df) * (len(df) - 1) // 2
+    return sorted(pairs), totalPairs - len(pairs)
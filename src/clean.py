@@ -1,29 +1,170 @@
-from typing import List, Any, Set, Tuple
+from typing import List, Any, Optional, Set, Tuple
 
 import pandas as pd
-import textdistance as td
-import json
+import argparse
 from itertools import combinations
+import numpy as np
+import distancecache
+import parallel
+import preprocessing
+import simjoin
 import utils
+from instrumentation import RECORDER
+from preprocessing import Regexes
+from recordstore import TextColumn
+from unionfind import Clusters
+
+
+def _distancesChunk(column: TextColumn, left: np.ndarray, right: np.ndarray, useOldCalculation: bool,
+                    batchSize: int = 65536) -> List[float]:
+    # td.jaccard on the characters or on the tokens, evaluated with the interned features of the TextColumn
+    distances = []
+    for start in range(0, len(left), batchSize):
+        l = left[start:start + batchSize]
+        r = right[start:start + batchSize]
+        batch = column.charJaccard(l, r) if useOldCalculation else column.tokenJaccard(l, r)
+        distances.extend(np.where(l == r, -1, batch).tolist())
+    return distances
+
+
+def _roundUp(distances: np.ndarray) -> np.ndarray:
+    # float32 values that are never below the float64 values, so filtering them by a cutoff keeps the same pairs
+    rounded = distances.astype(np.float32)
+    return np.where(rounded < distances, np.nextafter(rounded, np.float32(np.inf)), rounded)
+
+
+def _topK(owners: np.ndarray, others: np.ndarray, distances: np.ndarray, k: int) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # keeps the k highest distances of every owner, ties are broken by the smaller other, and returns their ranks
+    order = np.lexsort([others, -distances, owners])
+    owners, others, distances = owners[order], others[order], distances[order]
+    starts = np.flatnonzero(np.concatenate([[len(owners) > 0], owners[1:] != owners[:-1]]))
+    ranks = np.arange(len(owners)) - np.repeat(starts, np.diff(np.append(starts, len(owners))))
+    keep = ranks < k
+    return owners[keep], others[keep], distances[keep], ranks[keep]
+
+
+def boundedDistances(strings: Set[str], completelyInsideOtherBias: float = 0.7, doBias: bool = True,
+                     minDistance: Optional[float] = None, topK: Optional[int] = None,
+                     pairsPerBlock: Optional[int] = None) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Calculates the distances of all combinations like calcDistances, but with a bounded amount of memory.
+
+    The unique strings get integer ids and all pairs (i, j) with i < j are scored in blocks of at most pairsPerBlock
+    consecutive pairs. Of every block only the pairs reaching minDistance after the bias are kept as float32. With
+    topK, every block is reduced to the topK highest distances of each string first, which are then merged into a
+    fixed table of the topK best pairs per string, only the rows of the strings in the block are updated. So the memory
+    stays fixed by pairsPerBlock and the number of kept pairs, instead of the n^2 / 2 tuples of calcDistances.
+
+    The float32 distances are rounded up, so filtering them by a cutoff keeps the same pairs as the float64 distances
+    of calcDistances. The distance cache and the workers of calcDistances are not used.
+
+    Args:
+        strings: to calculate the distances for each combination
+        completelyInsideOtherBias: parameter for the bias function, default = 0.7
+        doBias: if the bias function should be applied, default = True
+        minDistance: the minimal distance value of the kept pairs, None keeps all pairs, default = None
+        topK: the number of pairs kept per string, a pair is kept if it is one of the topK of either string,
+            None keeps all pairs reaching minDistance, default = None
+        pairsPerBlock: the number of pairs scored at once, default = utils.config["distancePairsPerBlock"]
+
+    Returns:
+        a tuple (strings, left, right, distances) of the unique strings, the int32 ids of the kept pairs with
+            left < right and their float32 distances, ordered by the distance, the highest first
+    """
+    column = TextColumn(list(set(strings)))
+    uniqueStrings = column.strings.tolist()
+    count = len(uniqueStrings)
+    chars = utils.config["useOldCalculation"]
+    pairsPerBlock = pairsPerBlock or utils.config["distancePairsPerBlock"]
+    # the position of the first pair (i, i + 1) of every row i in the sequence of all pairs
+    rowStarts = np.cumsum(np.concatenate([[0], np.arange(count - 1, 0, -1, dtype=np.int64)]))
+    containedKeys = np.zeros(0, dtype=np.int64)
+    if doBias:
+        containedLeft, containedRight = simjoin.containmentCandidates(uniqueStrings)
+        containedKeys = np.unique(np.minimum(containedLeft, containedRight) * count +
+                                  np.maximum(containedLeft, containedRight))
+
+    keptLeft, keptRight, keptDistances = [], [], []
+    if topK is not None:
+        # the topK best others of every string, ordered by the distance, -1 marks an empty place
+        bestOthers = np.full((count, topK), -1, dtype=np.int64)
+        bestDistances = np.full((count, topK), -np.inf, dtype=np.float32)
+    for start in range(0, count * (count - 1) // 2, pairsPerBlock):
+        pairs = np.arange(start, min(start + pairsPerBlock, count * (count - 1) // 2), dtype=np.int64)
+        left = np.searchsorted(rowStarts, pairs, side="right") - 1
+        right = pairs - rowStarts[left] + left + 1
+        distances = column.charJaccard(left, right) if chars else column.tokenJaccard(left, right)
+        if doBias:
+            distances = distances + np.where(np.isin(left * count + right, containedKeys),
+                                             completelyInsideOtherBias, 0)
+        RECORDER.count("pairsScored", len(left))
+        RECORDER.histogram("distanceBlockPairs", [len(left)])
+        if minDistance is not None:
+            reached = distances >= minDistance
+            left, right, distances = left[reached], right[reached], distances[reached]
+        distances = _roundUp(distances)
+        if topK is not None:
+            # the topK of the block for both strings of every pair, merged with the table rows of these strings
+            owners, others, distances, _ = _topK(np.concatenate([left, right]), np.concatenate([right, left]),
+                                                 np.concatenate([distances, distances]), topK)
+            touched = np.unique(owners)
+            filled = bestOthers[touched] >= 0
+            owners, others, distances, ranks = _topK(
+                np.concatenate([np.repeat(touched, topK).reshape(-1, topK)[filled], owners]),
+                np.concatenate([bestOthers[touched][filled], others]),
+                np.concatenate([bestDistances[touched][filled], distances]), topK)
+            bestOthers[owners, ranks] = others
+            bestDistances[owners, ranks] = distances
+        else:
+            keptLeft.append(left)
+            keptRight.append(right)
+            keptDistances.append(distances)
+
+    if topK is not None:
+        filled = bestOthers >= 0
+        owners = np.repeat(np.arange(count, dtype=np.int64), topK).reshape(-1, topK)[filled]
+        others = bestOthers[filled]
+        keys, first = np.unique(np.minimum(owners, others) * count + np.maximum(owners, others), return_index=True)
+        left, right, distances = keys // count, keys % count, bestDistances[filled][first]
+    else:
+        left = np.concatenate([np.zeros(0, dtype=np.int64)] + keptLeft)
+        right = np.concatenate([np.zeros(0, dtype=np.int64)] + keptRight)
+        distances = np.concatenate([np.zeros(0, dtype=np.float32)] + keptDistances)
+    order = np.argsort(-distances, kind="stable")
+    return uniqueStrings, left[order].astype(np.int32), right[order].astype(np.int32), distances[order]
 
 
 def calcDistances(strings: Set[str], completelyInsideOtherBias: float = 0.7,
-                  algo: str = "jaccard", readFromFile: bool = True, writeToFile: bool = True, doBias: bool = True) \
-        -> List[Tuple[str, str, float]]:
+                  algo: str = "jaccard", readFromFile: bool = True, writeToFile: bool = True, doBias: bool = True,
+                  workers: int = 1, minDistance: Optional[float] = None, approximate: bool = False,
+                  bounded: bool = False, topK: Optional[int] = None) -> List[Tuple[str, str, float]]:
     """Calculates the distanced according to the algorithm in the constant variable algo.
 
     If the constant doBias is set to true, then the bias function is applied with the parameter
-    completelyInsideOtherBias. If the constant readFromFile is set to true, then the algorithm won't execute, but
-    rather load a cached representation from a json file, which will not work for all algorithms, but only those that
-    were cached previously
+    completelyInsideOtherBias. If readFromFile is set to true, then the distances are looked up in a content addressed
+    cache (see distancecache.DistanceCache), which is keyed by the algorithm, the tokenization and the hashes of both
+    strings, so only the missing pairs are calculated. If writeToFile is set to true, the calculated distances are
+    added to that cache.
+
+    If minDistance is given, only the pairs reaching it after the bias are calculated and returned, which equals
+    filtering the full list afterwards. The candidate pairs are found with an exact similarity join, see
+    simjoin.candidatePairs, so the quadratic number of pairs is never generated. With approximate set, the candidates
+    are proposed by a MinHash-LSH instead, see minhash.py, which can miss a few pairs, but scales to millions of names.
+    With bounded set or topK given, all pairs are scored block by block with a fixed amount of memory instead, see
+    boundedDistances, and only the pairs reaching minDistance or the topK of every string are kept.
 
     Args:
         strings: to calculate the distances for each combination
         completelyInsideOtherBias: parameter for the bias function, default = 0.7
         algo: to use for text distance comparison, default = "jaccard"
-        readFromFile: if a cached text distance matrix should be read from a file, default = True
-        writeToFile: if the calculated text distance matrix should be written to a file, default = True
+        readFromFile: if cached distances should be read from the cache, default = True
+        writeToFile: if the calculated distances should be written to the cache, default = True
         doBias: if the bias function should be applied, default = True
+        workers: the number of processes used to calculate the distances, default = 1
+        minDistance: the minimal distance value of the returned pairs, None returns all pairs, default = None
+        approximate: if the candidates of minDistance are proposed by a MinHash-LSH, default = False
+        bounded: if the pairs are scored with a bounded amount of memory, see boundedDistances, default = False
+        topK: the number of pairs kept per string in the bounded mode, None keeps all pairs, default = None
 
     Returns:
         list of tuples with the form (name1: String, name2: String, distanceValue: float)
@@ -35,26 +176,57 @@ def calcDistances(strings: Set[str], completelyInsideOtherBias: float = 0.7,
         else:
             return 0
 
-    stringCombinations = set(map(frozenset, combinations(set(strings), 2)))
-
-    if readFromFile:
-        with open(utils.PATH_PREFIX + "/" + algo + ".json", "r") as file:
-            allDistances = json.loads(file.read())
+    if bounded or topK is not None:
+        uniqueStrings, left, right, distances = boundedDistances(strings, completelyInsideOtherBias, doBias,
+                                                                 minDistance, topK)
+        return [(uniqueStrings[l], uniqueStrings[r], d) for l, r, d in zip(left.tolist(), right.tolist(),
+                                                                           distances.tolist())]
+
+    # only the interned unique strings are shared with the workers, the chunks just contain their positions
+    uniqueStrings = list(set(strings))
+    column = TextColumn(uniqueStrings)
+    if minDistance is None:
+        stringCombinations = set(map(frozenset, combinations(set(strings), 2)))
+        pairs = [tuple(c) for c in stringCombinations]
+        positions = {s: i for i, s in enumerate(uniqueStrings)}
+        left = np.array([positions[s1] for s1, _ in pairs], dtype=np.int64)
+        right = np.array([positions[s2] for _, s2 in pairs], dtype=np.int64)
     else:
-        if utils.config["useOldCalculation"]:
-            allDistances = [(s1, s2, s1 == s2 and -1 or td.jaccard(s1, s2)) for s1, s2 in stringCombinations]
-        else:
-            allDistances = [(s1, s2, s1 == s2 and -1 or td.jaccard(s1.split(), s2.split())) for s1, s2 in
-                            stringCombinations]
-        allDistances.sort(key=lambda x: x[2], reverse=True)
-        if writeToFile:
-            with open(utils.PATH_PREFIX + "/" + algo + ".json", "w+") as file:
-                file.write(json.dumps(allDistances))
+        left, right = simjoin.candidatePairs(column, minDistance, completelyInsideOtherBias if doBias else None,
+                                             utils.config["useOldCalculation"], approximate)
+        pairs = [(uniqueStrings[l], uniqueStrings[r]) for l, r in zip(left.tolist(), right.tolist())]
+
+    distances = np.full(len(pairs), np.nan)
+    missing = np.ones(len(pairs), dtype=bool)
+    if readFromFile or writeToFile:
+        tokenizer = "chars" if utils.config["useOldCalculation"] else "tokens"
+        cache = distancecache.DistanceCache(utils.PATH_PREFIX + "/distance_cache", algo, tokenizer)
+        keys = distancecache.pairKeys(distancecache.stringHashes(uniqueStrings), left, right)
+        if readFromFile:
+            distances, found = cache.lookup(keys)
+            missing = ~found
+
+    RECORDER.count("pairsGenerated", len(pairs))
+    RECORDER.count("pairsScored", int(missing.sum()))
+    RECORDER.count("pairsScored." + algo, int(missing.sum()))
+    chunks = [(l, r, utils.config["useOldCalculation"])
+              for l, r in parallel.splitPairs(left[missing], right[missing],
+                                              parallel.chunkSize(missing.sum(), workers))]
+    calculated = [d for chunk in parallel.mapChunks(_distancesChunk, column, chunks, workers) for d in chunk]
+    distances[missing] = calculated
+    if writeToFile:
+        cache.add(keys[missing], calculated)
+        cache.save()
+
+    allDistances = [(s1, s2, d) for (s1, s2), d in zip(pairs, distances.tolist())]
+    allDistances.sort(key=lambda x: x[2], reverse=True)
 
     if doBias:
         for i in range(len(allDistances)):
             allDistances[i] = (allDistances[i][0], allDistances[i][1],
                                allDistances[i][2] + bias(allDistances[i][0], allDistances[i][1]))
+    if minDistance is not None:
+        allDistances = [d for d in allDistances if d[2] >= minDistance]
     return allDistances
 
 
@@ -73,34 +245,15 @@ def convertToEqualityRings(distanceList: List[Tuple[str, str, float]]) -> List[L
     Returns:
         a list of sets with common elements merged
     """
-    sets = map(lambda x: set(x[0:2]), distanceList)
-    return list(utils.merge_common(sets))
+    return Clusters(distanceList).rings()
 
 
-class Statics:
-    """
-    Class that contains important static values.
-    """
-    CITY_REPLACE_DICT = {
-        r"w. hollywood": "west hollywood",
-        r"new york city": "new york",
-        r"west la": "los angeles",
-        r"la": "los angeles"
-    }
-    ADDRESS_REPLACE_DICT = {
-        r"(ave|av)": "ave",
-        r"(blvd|blv)": "blvd",
-        r"(sts)": "st",
-        r"s\.": "s",
-        r" ?between.*$": ""
-    }
-    BRACKETS_REGEX = r" ?\(.*\)"
-    NON_ALPHA_OR_SPACE_REGEX = r"[^a-zA-Z0-9 ]"
-    NON_ALPHA_REGEX = r"[^a-zA-Z0-9]"
+# the regular expressions are shared with main.py, see preprocessing.Regexes
+Statics = Regexes
 
 
 def preProcess(df: pd.DataFrame) -> pd.DataFrame:
-    """Pre processes the given DataFrame by applying a lot of Regex replacements.
+    """Pre processes the given DataFrame by applying a lot of Regex replacements, see preprocessing.preProcess.
 
     Args:
         df: a pandas DataFrame to pre process
@@ -108,34 +261,7 @@ def preProcess(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         a pre processed pandas DataFrame
     """
-    # reformat the index
-    # df = df.drop(labels=['id'], axis=1)
-    # df.set_index("id", inplace=True)
-
-    for k, v in Statics.ADDRESS_REPLACE_DICT.items():
-        df.address = df.address.str.replace(k, v, case=False, regex=True)
-    for k, v in Statics.CITY_REPLACE_DICT.items():
-        df.city = df.city.str.replace(k, v, case=False, regex=True)
-    df.type = df.type.fillna("")
-    df.type = df.type.str.replace(Statics.BRACKETS_REGEX, '', case=False) \
-        .str.replace(r"^.*[0-9] ?", "", case=False)
-    df.phone = df.phone.str.replace(Statics.NON_ALPHA_REGEX, '', case=False)
-    df.name = df.name.str.replace(Statics.BRACKETS_REGEX, '', case=False)
-
-    df["cname"] = df.name.copy()
-    df["caddress"] = df.address.copy()
-    df.cname = df.cname.str.replace(Statics.NON_ALPHA_OR_SPACE_REGEX, '', case=False) \
-        .str.replace('  the$', '', case=False)
-    df.caddress = df.caddress.str.replace(Statics.NON_ALPHA_OR_SPACE_REGEX, '', case=False)
-    return df
-
-
-def __findClosestEqRingMatch(eqRing: List[List[str]], searchString: str) -> str:
-    for i, ring in enumerate(eqRing):
-        for e in ring:
-            if e == searchString:
-                return ring[0]
-    return searchString
+    return preprocessing.preProcess(df)
 
 
 def dedupe(df: pd.DataFrame, eqRing: List[List[str]]) -> pd.DataFrame:
@@ -148,8 +274,9 @@ def dedupe(df: pd.DataFrame, eqRing: List[List[str]]) -> pd.DataFrame:
     Returns:
         a deduped pandas DataFrame
     """
-    df["tdkey"] = df.cname.copy()
-    df["tdkey"] = df["tdkey"].apply(lambda s: __findClosestEqRingMatch(eqRing, s))
+    # every name in a ring is replaced by the first element of its ring, all other names stay as they are
+    representatives = {e: ring[0] for ring in eqRing for e in ring}
+    df["tdkey"] = df.cname.map(representatives).fillna(df.cname)
     df = df.groupby(["phone", "tdkey"]).agg(set).reset_index()
     return df
 
@@ -159,7 +286,8 @@ eqRing = []
 
 def clean(df: pd.DataFrame, completelyInsideOtherBias: float = 0.7, filterCutoff: float = 0.65,
           algo: str = "jaccard", readFromFile: bool = True, writeToFile: bool = True,
-          doBias: bool = True) -> pd.DataFrame:
+          doBias: bool = True, workers: int = 1, approximate: bool = False, bounded: bool = False,
+          topK: Optional[int] = None) -> pd.DataFrame:
     """Main function to completely clean a restaurant dataset.
 
     Args:
@@ -170,17 +298,32 @@ def clean(df: pd.DataFrame, completelyInsideOtherBias: float = 0.7, filterCutoff
         readFromFile: if a cached text distance matrix should be read from a file, default = True
         writeToFile: if the calculated text distance matrix should be written to a file, default = True
         doBias: if the bias function should be applied, default = True
+        workers: the number of processes used to calculate the distances, default = 1
+        approximate: if the candidate pairs of the names are proposed by a MinHash-LSH, see calcDistances,
+            default = False
+        bounded: if the distances are calculated with a bounded amount of memory, see calcDistances, default = False
+        topK: the number of matches kept per name in the bounded mode, None keeps all matches, default = None
 
     Returns:
         a deduplicated pandas DataFrame
     """
     global eqRing
-    df = preProcess(df)
-
-    distances = calcDistances(df.cname.unique(), completelyInsideOtherBias, algo, readFromFile, writeToFile, doBias)
-    filteredDistances = list(filter(lambda x: x[2] >= filterCutoff, distances))
-    eqRing = convertToEqualityRings(filteredDistances)
-    return dedupe(df, eqRing)
+    with RECORDER.stage("clean"):
+        with RECORDER.stage("preProcess"):
+            df = preProcess(df)
+
+        with RECORDER.stage("calcDistances"):
+            # only the pairs reaching the cutoff are calculated, so the filter below keeps all of them
+            distances = calcDistances(df.cname.unique(), completelyInsideOtherBias, algo, readFromFile, writeToFile,
+                                      doBias, workers, filterCutoff, approximate, bounded, topK)
+        with RECORDER.stage("filter"):
+            filteredDistances = list(filter(lambda x: x[2] >= filterCutoff, distances))
+        RECORDER.count("matches", len(filteredDistances))
+        with RECORDER.stage("equalityRings"):
+            eqRing = convertToEqualityRings(filteredDistances)
+        RECORDER.histogram("clusterSize", map(len, eqRing))
+        with RECORDER.stage("dedupe"):
+            return dedupe(df, eqRing)
 
 
 def __firstOfSet(s: Any) -> Any:
@@ -191,11 +334,24 @@ def __firstOfSet(s: Any) -> Any:
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cleans the restaurants.tsv dataset with the old approach")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes used to calculate the distances, default = 1")
+    parser.add_argument("--approximate", action="store_true",
+                        help="proposes the similar names with a MinHash-LSH instead of the exact join")
+    parser.add_argument("--bounded", action="store_true",
+                        help="scores all pairs block by block with a fixed amount of memory instead of the exact join")
+    parser.add_argument("--top-k", type=int,
+                        help="keeps only the best matches of every name, implies --bounded, default = all matches")
+    args = parser.parse_args()
+
     originalDf = pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t')
     if utils.config["useOldCalculation"]:
-        cleaned = clean(originalDf, 0.7, 0.65, readFromFile=False, writeToFile=False)
+        cleaned = clean(originalDf, 0.7, 0.65, readFromFile=False, writeToFile=False, workers=args.workers,
+                        approximate=args.approximate, bounded=args.bounded, topK=args.top_k)
     else:
-        cleaned = clean(originalDf, 0.5, 0.45, readFromFile=False, writeToFile=False)
+        cleaned = clean(originalDf, 0.5, 0.45, readFromFile=False, writeToFile=False, workers=args.workers,
+                        approximate=args.approximate, bounded=args.bounded, topK=args.top_k)
 
     if utils.config["compareToGold"]:
         a, b, c, d = utils.compareDfToGold(cleaned)
@@ -203,7 +359,7 @@ if __name__ == '__main__':
     if utils.config["prepareUploadJsons"]:
         utils.prepareUploadJsons(cleaned)
 
-# OLD CODE USED FOR GENERATING A HEATMAP CHART
+# OLD CODE USED FOR GENERATING A HEATMAP CHART, use sweep.py instead
 #    bias = 0.7
 #    cutoff = 0.7
 #    allparams = []
@@ -0,0 +1,238 @@
+"""Command line entry point of the deduplication.
+
+Only argparse is imported at startup, pandas, textdistance and the data files are loaded by the subcommand that needs
+them, so `python cli.py --help` stays fast.
+
+Usage (from any directory):
+    python src/cli.py dedupe [--workers N] [--store DIR [--delta new.tsv]] [--stream] [--approximate] [--groups FILE]
+    python src/cli.py sweep [--output FILE] [--algo jaccard] [--workers N]
+    python src/cli.py evaluate [--groups FILE] [--gold FILE] [--non-duplicates FILE]
+    python src/cli.py export [--input FILE] [--groups FILE] [--ndjson [--output DIR] [--shards N] [--diff]]
+
+Every subcommand accepts `--config FILE`, a json object with values for utils.config, `--data DIR`, the directory
+of the data files (default = data/work), and `--report FILE [--profile-stage NAME]`, which writes the time, peak
+memory and counters of every stage as json, see instrumentation.Recorder.
+"""
+import argparse
+import json
+import sys
+from typing import List, Optional, Set
+
+
+def _configure(args: argparse.Namespace):
+    # the config file and the flags take precedence over the defaults in utils.config
+    import utils
+    if args.data is not None:
+        utils.PATH_PREFIX = args.data
+    if args.config is not None:
+        with open(args.config) as file:
+            values = json.load(file)
+        unknown = set(values) - set(utils.config)
+        if unknown:
+            raise ValueError("Unknown config keys: " + ", ".join(sorted(unknown)))
+        utils.config.update(values)
+    for key in ("compareToGold", "printBlockingStats"):
+        if getattr(args, key, None) is False:
+            utils.config[key] = False
+
+
+def _defaultPath(path: Optional[str], fileName: str) -> str:
+    import utils
+    return path if path is not None else utils.PATH_PREFIX + "/" + fileName
+
+
+def _readGroups(path: str) -> List[Set[int]]:
+    """Reads the sets of duplicate ids from a groups file written by the dedupe subcommand."""
+    import pandas as pd
+    groups = pd.read_csv(path, delimiter="\t")
+    groups = groups[groups.group >= 0]
+    return [set(ids) for ids in groups.groupby("group").id.agg(list).tolist()]
+
+
+def dedupe(args: argparse.Namespace):
+    import pandas as pd
+    import main
+    import streaming
+    import utils
+
+    inputPath = _defaultPath(args.input, "restaurants.tsv")
+    if args.stream:
+        dupes = streaming.deduplicateStream(inputPath, chunkSize=args.chunk_size, partitions=args.partitions)
+    elif args.store is None:
+        df = pd.read_csv(inputPath, delimiter="\t")
+        ids = df.id.copy()
+        _, dupes = main.deduplicate(df, workers=args.workers, approximate=args.approximate)
+    else:
+        from incremental import ResolvedStore
+        if args.delta is None:
+            store = ResolvedStore()
+            store.add(pd.read_csv(inputPath, delimiter="\t"), workers=args.workers)
+        else:
+            store = ResolvedStore.load(args.store)
+            store.add(pd.read_csv(args.delta, delimiter="\t"), workers=args.workers)
+        store.save(args.store)
+        _, dupes = store.result()
+        ids = store.rows.id
+
+    groupsPath = _defaultPath(args.groups, "groups.tsv")
+    if args.stream:
+        streaming.writeGroups(inputPath, dupes, groupsPath, chunkSize=args.chunk_size)
+    else:
+        groups = streaming.groupIndex(dupes)
+        pd.DataFrame({"id": ids, "group": [groups.get(i, -i) for i in ids.tolist()]}) \
+            .to_csv(groupsPath, sep="\t", index=False)
+    print("Written the group of every id to '" + groupsPath + "'.")
+
+    if utils.config["compareToGold"]:
+        print("tp,tn,fp,fn,precision,recall,fscore")
+        utils.compareToGold(dupes, printType="csv")
+
+
+def sweep(args: argparse.Namespace):
+    import csv
+
+    import numpy as np
+    import pandas as pd
+    import sweep as sweepModule
+
+    output = _defaultPath(args.output, "results_params.csv")
+    originalDf = pd.read_csv(_defaultPath(args.input, "restaurants.tsv"), delimiter="\t")
+    values = list(np.arange(0.0, 1.1, 0.1))
+    with open(output, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(sweepModule.CSV_HEADER)
+        writer.writerows(sweepModule.sweep(originalDf, values, values, args.algo, workers=args.workers))
+    print("Written the results of the sweep to '" + output + "'.")
+
+
+def evaluate(args: argparse.Namespace):
+    import utils
+    from evaluation import GoldStandard
+
+    groupsPath = _defaultPath(args.groups, "groups.tsv")
+    dupes = _readGroups(groupsPath)
+    gold = GoldStandard(args.gold, args.non_duplicates)
+    truePositive, falseNegative, falsePositive = gold.compare(dupes)
+    fn = sum(len(s) for s in falseNegative)
+    fp = sum(len(s) for s in falsePositive)
+    tp = sum(len(s) for s in truePositive)
+    print("tp,tn,fp,fn,precision,recall,fscore")
+    print(*utils.goldParams(tp, fp, fn, args.total), sep=",")
+    print("pair_tp,pair_fp,pair_fn,pair_precision,pair_recall,pair_fscore")
+    print(*gold.pairwise(dupes), sep=",")
+    if args.non_duplicates is not None:
+        print("known non duplicate pairs:", len(gold.knownNonDuplicates(dupes)))
+
+
+def export(args: argparse.Namespace):
+    import pandas as pd
+    import main
+    import utils
+
+    dupes = _readGroups(_defaultPath(args.groups, "groups.tsv"))
+    inputPath = _defaultPath(args.input, "restaurants.tsv")
+    if args.ndjson:
+        import export as exportModule
+        output = _defaultPath(args.output, "export")
+        counts = exportModule.exportFile(inputPath, dupes, output, chunkSize=args.chunk_size, shards=args.shards,
+                                         diff=args.diff)
+        print("Written the clusters to '{}': {inserted} inserted, {changed} changed, {unchanged} unchanged, "
+              "{deleted} deleted.".format(output, **counts))
+        return
+    df = main.preProcess(pd.read_csv(inputPath, delimiter="\t"))
+    utils.prepareUploadJsons(main.groupDuplicates(df, dupes))
+
+
+def buildParser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", help="json file with values for utils.config")
+    common.add_argument("--data", help="directory of the data files, default = data/work")
+    common.add_argument("--report", help="records the time, peak memory and counters of every stage and writes them "
+                                         "as json into the given file")
+    common.add_argument("--profile-stage", help="profiles the stage with the given name or path, e.g. matchPairs, "
+                                                "with cProfile, requires --report")
+    common.add_argument("--profile", help="the file for the cProfile statistics, default = the --report file + .prof")
+
+    parser = argparse.ArgumentParser(description="Deduplicates the restaurants dataset")
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    subparsers.required = True
+
+    dedupeParser = subparsers.add_parser("dedupe", parents=[common], help="deduplicates a tsv file and writes the "
+                                                                          "group of every id into a groups file")
+    dedupeParser.add_argument("--input", help="the tsv file to deduplicate, default = restaurants.tsv")
+    dedupeParser.add_argument("--groups", help="the groups file to write, default = groups.tsv")
+    dedupeParser.add_argument("--workers", type=int, default=1, help="number of processes used for matching, "
+                                                                     "default = 1")
+    dedupeParser.add_argument("--approximate", action="store_true", help="only evaluates the pairs with the same "
+                                                                         "phone or names proposed by a MinHash-LSH")
+    dedupeParser.add_argument("--store", help="directory of the resolved store, which is created from --input "
+                                              "or updated with the rows of --delta")
+    dedupeParser.add_argument("--delta", help="tsv file with new rows to deduplicate against the resolved store")
+    dedupeParser.add_argument("--stream", action="store_true", help="reads --input in chunks, so it doesn't have "
+                                                                    "to fit into memory")
+    dedupeParser.add_argument("--chunk-size", type=int, default=100000, help="rows read at once, default = 100000")
+    dedupeParser.add_argument("--partitions", type=int, default=64, help="partitions of the blocking store with "
+                                                                         "--stream, default = 64")
+    dedupeParser.add_argument("--no-gold", dest="compareToGold", action="store_false", default=None,
+                              help="doesn't compare the result to the Gold Standard")
+    dedupeParser.add_argument("--no-blocking-stats", dest="printBlockingStats", action="store_false", default=None,
+                              help="doesn't print the number of candidate pairs")
+    dedupeParser.set_defaults(function=dedupe)
+
+    sweepParser = subparsers.add_parser("sweep", parents=[common], help="sweeps the bias and cutoff parameters of "
+                                                                        "clean.py")
+    sweepParser.add_argument("--input", help="the tsv file to clean, default = restaurants.tsv")
+    sweepParser.add_argument("--output", help="the csv file to write, default = results_params.csv")
+    sweepParser.add_argument("--algo", default="jaccard", help="the text distance algorithm, default = jaccard")
+    sweepParser.add_argument("--workers", type=int, default=1, help="number of processes used to calculate the "
+                                                                    "distances, default = 1")
+    sweepParser.set_defaults(function=sweep)
+
+    evaluateParser = subparsers.add_parser("evaluate", parents=[common], help="compares a groups file to the Gold "
+                                                                              "Standard")
+    evaluateParser.add_argument("--groups", help="the groups file to evaluate, default = groups.tsv")
+    evaluateParser.add_argument("--gold", help="the Gold Standard pairs, default = restaurants_DPL.tsv")
+    evaluateParser.add_argument("--non-duplicates", help="known non duplicate pairs, e.g. restaurants_NDPL.tsv")
+    evaluateParser.add_argument("--total", type=int, default=864, help="the total number of records, default = 864")
+    evaluateParser.set_defaults(function=evaluate)
+
+    exportParser = subparsers.add_parser("export", parents=[common], help="writes the json files for the mongodb "
+                                                                          "import from a groups file")
+    exportParser.add_argument("--input", help="the deduplicated tsv file, default = restaurants.tsv")
+    exportParser.add_argument("--groups", help="the groups file, default = groups.tsv")
+    exportParser.add_argument("--ndjson", action="store_true", help="writes newline-delimited json files per cluster "
+                                                                    "in chunks instead of the two json arrays")
+    exportParser.add_argument("--output", help="the directory of the --ndjson export, default = export")
+    exportParser.add_argument("--shards", type=int, default=1, help="number of files per --ndjson export, "
+                                                                    "default = 1")
+    exportParser.add_argument("--diff", action="store_true", help="only writes the clusters, that changed since the "
+                                                                  "previous --ndjson export into the same directory")
+    exportParser.add_argument("--chunk-size", type=int, default=100000, help="rows read at once with --ndjson, "
+                                                                             "default = 100000")
+    exportParser.set_defaults(function=export)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = buildParser()
+    args = parser.parse_args(argv)
+    if args.profile_stage is not None and args.report is None:
+        parser.error("--profile-stage requires --report")
+    _configure(args)
+    if args.report is None:
+        args.function(args)
+        return
+
+    from instrumentation import RECORDER
+    RECORDER.enable(args.profile_stage)
+    try:
+        args.function(args)
+    finally:
+        RECORDER.disable()
+        profilePath = (args.profile or args.report + ".prof") if args.profile_stage is not None else None
+        RECORDER.writeReport(args.report, profilePath)
+        print("Written the instrumentation report to '" + args.report + "'.")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,203 @@
+"""Compares several textdistance algorithms for the name distances of clean.py in a single run.
+
+The names are preprocessed, deduplicated and tokenized once and the candidate pairs are generated once per kind of
+algorithm. All algorithms are scored in the same pool of worker processes, which gets the names only once, and every
+algorithm gets the Gold Standard comparison of the whole bias and cutoff grid from sweep.sweepDistances.
+
+The set based algorithms compare the token multisets of the names, or the character multisets with
+utils.config["useOldCalculation"], just like clean.calcDistances does for td.jaccard. They can only reach a cutoff if
+the names share an element, so only those pairs are scored. The string based algorithms compare the names as strings,
+levenshtein and damerau_levenshtein are normalized to a similarity between 0 and 1.
+
+Usage (from the src directory):
+    python comparison.py --algo jaccard sorensen cosine overlap levenshtein --workers 4
+"""
+import argparse
+import csv
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import textdistance as td
+
+import clean
+import parallel
+import simjoin
+import sweep
+import utils
+from instrumentation import RECORDER
+from recordstore import TextColumn
+
+# name -> (similarity function, if it compares the token or character multisets instead of the strings)
+ALGORITHMS: Dict[str, Tuple[Callable[[Sequence, Sequence], float], bool]] = {
+    "jaccard": (td.jaccard, True),
+    "sorensen": (td.sorensen, True),
+    "cosine": (td.cosine, True),
+    "overlap": (td.overlap, True),
+    "tversky": (td.tversky, True),
+    "tanimoto": (td.tanimoto, True),
+    "levenshtein": (td.levenshtein.normalized_similarity, False),
+    "damerau_levenshtein": (td.damerau_levenshtein.normalized_similarity, False),
+    "jaro_winkler": (td.jaro_winkler, False),
+    "ratcliff_obershelp": (td.ratcliff_obershelp, False),
+}
+
+# upper bounds of the similarity of string based algorithms from the lengths of both strings, so the pairs that can't
+# reach the smallest cutoff are never scored
+LENGTH_BOUNDS: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    # the edit distance is at least the difference of the lengths
+    "levenshtein": lambda l1, l2: np.minimum(l1, l2) / np.maximum(np.maximum(l1, l2), 1),
+    "damerau_levenshtein": lambda l1, l2: np.minimum(l1, l2) / np.maximum(np.maximum(l1, l2), 1),
+    # at most all characters of the shorter string match
+    "ratcliff_obershelp": lambda l1, l2: 2 * np.minimum(l1, l2) / np.maximum(l1 + l2, 1),
+}
+
+# below this threshold simjoin.jaccardCandidates returns all pairs sharing at least one element
+_SHARED_ELEMENT = 1e-9
+
+
+def _scoreChunk(shared: Tuple[List[str], List[Sequence], TextColumn], algo: str, left: np.ndarray,
+                right: np.ndarray) -> np.ndarray:
+    strings, elements, column = shared
+    if algo == "jaccard":
+        # the interned features of the TextColumn give the same values as td.jaccard, see clean.calcDistances
+        return column.charJaccard(left, right) if elements is strings else column.tokenJaccard(left, right)
+    algorithm, onSets = ALGORITHMS[algo]
+    values = elements if onSets else strings
+    return np.array([algorithm(values[i], values[j]) for i, j in zip(left.tolist(), right.tolist())],
+                    dtype=np.float64)
+
+
+def _unique(left: np.ndarray, right: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    keys = np.unique(np.minimum(left, right) * count + np.maximum(left, right))
+    return keys // count, keys % count
+
+
+def candidatePairs(names: List[str], algorithms: Iterable[str], minCutoff: Optional[float],
+                   chars: bool = False) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """Finds the pairs of names every algorithm has to score, so all pairs reaching a cutoff are included.
+
+    The pairs where one name contains the other one get the bias and are always included, all other pairs have to
+    reach the smallest cutoff on their own. The pairs sharing an element are only generated once for all set based
+    algorithms, all pairs only once for the string based ones.
+
+    Args:
+        names: the unique names
+        algorithms: the names of the algorithms, see ALGORITHMS
+        minCutoff: the smallest cutoff, None = all pairs
+        chars: if the set based algorithms compare the characters instead of the tokens, default = False
+
+    Returns:
+        a dict from the algorithm to a tuple (left, right) of the positions of its pairs with left < right
+    """
+    count = max(len(names), 1)
+    contained = simjoin.containmentCandidates(names)
+    allPairs = None
+    sharedPairs = None
+    candidates = {}
+    for algo in algorithms:
+        if ALGORITHMS[algo][1] and minCutoff is not None and minCutoff > 0:
+            # without a common element the similarity of the set based algorithms is 0 (or -inf for tanimoto)
+            if sharedPairs is None:
+                indptr, ranks = simjoin.elementSets(TextColumn(names), chars)
+                left, right = simjoin.jaccardCandidates(indptr, ranks, _SHARED_ELEMENT)
+                sharedPairs = _unique(np.concatenate([left, contained[0]]), np.concatenate([right, contained[1]]),
+                                      count)
+            candidates[algo] = sharedPairs
+            continue
+        if allPairs is None:
+            allPairs = np.triu_indices(len(names), 1)
+        left, right = allPairs
+        if algo in LENGTH_BOUNDS and minCutoff is not None:
+            lengths = np.array([len(s) for s in names], dtype=np.int64)
+            reachable = LENGTH_BOUNDS[algo](lengths[left], lengths[right]) >= minCutoff
+            left, right = _unique(np.concatenate([left[reachable], contained[0]]),
+                                  np.concatenate([right[reachable], contained[1]]), count)
+        candidates[algo] = (left, right)
+    return candidates
+
+
+def compareAlgorithms(df: pd.DataFrame, algorithms: Iterable[str], biases: Iterable[float],
+                      cutoffs: Iterable[float], workers: int = 1) -> List[List]:
+    """Calculates the Gold Standard comparison of clean.clean for every algorithm and combination of bias and cutoff.
+
+    Args:
+        df: a fresh pandas DataFrame
+        algorithms: the names of the algorithms, see ALGORITHMS
+        biases: the values for the completelyInsideOtherBias parameter
+        cutoffs: the values for the filterCutoff parameter
+        workers: the number of processes used to score the pairs of all algorithms, default = 1
+
+    Returns:
+        a list of rows [bias, cutoff, algorithm, tp, tn, fp, fn, precision, recall, fscore], ordered by the
+            algorithm, the bias and the cutoff, see sweep.sweep
+    """
+    algorithms = list(dict.fromkeys(algorithms))
+    unknown = [a for a in algorithms if a not in ALGORITHMS]
+    if unknown:
+        raise ValueError("Unknown algorithms: {}, known algorithms are: {}".format(", ".join(unknown),
+                                                                                    ", ".join(ALGORITHMS)))
+    biases = list(biases)
+    cutoffs = list(cutoffs)
+    total = len(df)
+    chars = utils.config["useOldCalculation"]
+    with RECORDER.stage("compareAlgorithms"):
+        with RECORDER.stage("preProcess"):
+            df = clean.preProcess(df)
+            names = list(df.cname.unique())
+            # td.jaccard compares the characters of strings and the tokens of lists
+            elements = names if chars else [name.split() for name in names]
+        minDistance = sweep.minDistance(biases, cutoffs)
+        with RECORDER.stage("candidatePairs"):
+            candidates = candidatePairs(names, algorithms, min(cutoffs, default=None), chars)
+
+        with RECORDER.stage("score"):
+            chunks = []
+            for algo in algorithms:
+                left, right = candidates[algo]
+                RECORDER.count("pairsScored", len(left))
+                RECORDER.count("pairsScored." + algo, len(left))
+                chunks.extend((algo, l, r)
+                              for l, r in parallel.splitPairs(left, right, parallel.chunkSize(len(left), workers)))
+            scores = parallel.mapChunks(_scoreChunk, (names, elements, TextColumn(names)), chunks, workers)
+
+        results = []
+        with RECORDER.stage("sweep"):
+            for algo in algorithms:
+                chunkScores = [s for (a, _, _), s in zip(chunks, scores) if a == algo]
+                left, right = candidates[algo]
+                distances = np.concatenate([np.zeros(0)] + chunkScores)
+                if minDistance is not None:
+                    reachable = distances >= minDistance
+                    left, right, distances = left[reachable], right[reachable], distances[reachable]
+                results.extend(sweep.sweepDistances(df, names, left, right, distances, biases, cutoffs, algo, total))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compares text distance algorithms for the names of clean.py")
+    parser.add_argument("--algo", nargs="+", default=["jaccard", "sorensen", "cosine", "overlap", "tversky",
+                                                      "levenshtein"],
+                        help="the algorithms to compare, default = jaccard sorensen cosine overlap tversky "
+                             "levenshtein, known algorithms are: " + ", ".join(ALGORITHMS))
+    parser.add_argument("--bias", type=float, nargs="+", default=list(np.arange(0.0, 1.1, 0.1)),
+                        help="the values of the bias, default = 0.0 to 1.0 in steps of 0.1")
+    parser.add_argument("--cutoff", type=float, nargs="+", default=list(np.arange(0.0, 1.1, 0.1)),
+                        help="the values of the cutoff, default = 0.0 to 1.0 in steps of 0.1")
+    parser.add_argument("--output", default=utils.PATH_PREFIX + "/results_algorithms.csv",
+                        help="the csv file to write, default = " + utils.PATH_PREFIX + "/results_algorithms.csv")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes used to score the pairs, default = 1")
+    args = parser.parse_args()
+
+    originalDf = pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t')
+    rows = compareAlgorithms(originalDf, args.algo, args.bias, args.cutoff, args.workers)
+    with open(args.output, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(sweep.CSV_HEADER)
+        writer.writerows(rows)
+    print("algorithm,bias,cutoff,precision,recall,fscore")
+    for algo in dict.fromkeys(row[2] for row in rows):
+        best = max((row for row in rows if row[2] == algo), key=lambda row: row[-1])
+        print(algo, best[0], best[1], *("{:.4f}".format(v) for v in best[-3:]), sep=",")
+    print("Written the comparison of the algorithms to '" + args.output + "'.")
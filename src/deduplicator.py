@@ -0,0 +1,207 @@
+"""A reentrant session of the clean.py approach, which keeps its own config, features, distances and clusters.
+
+clean.clean preprocesses and scores the names again with every call and keeps its result in the module global eqRing,
+so it can't be used for several datasets or parameter sets in one process. A Deduplicator is fitted once to a
+DataFrame and then answers match, clusters and resolve for any bias and cutoff:
+
+    deduplicator = Deduplicator().fit(df)
+    deduplicated = deduplicator.resolve(completelyInsideOtherBias=0.5, filterCutoff=0.45)
+
+The raw jaccard similarities are kept for all pairs reaching the smallest cutoff asked for so far and for all pairs
+containing each other, which covers every pair that can reach the cutoff with any bias. So changing the bias never
+scores a pair again and lowering the cutoff only scores the new pairs.
+
+All methods can be called from several threads, the fitted state is only replaced as a whole under a lock.
+"""
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import clean
+import distancecache
+import parallel
+import preprocessing
+import simjoin
+import utils
+from instrumentation import RECORDER
+from recordstore import TextColumn
+
+
+class _State(NamedTuple):
+    # the preprocessed rows and the features of their unique names
+    df: pd.DataFrame
+    names: List[str]
+    column: TextColumn
+    # the scored pairs of positions in names with left < right, their raw similarity and if they contain each other
+    left: np.ndarray
+    right: np.ndarray
+    raw: np.ndarray
+    inside: np.ndarray
+    # all pairs with a raw similarity of at least floor were scored, None = no pair was scored yet
+    floor: Optional[float]
+
+
+class Deduplicator:
+    """
+    Deduplicates a restaurant dataset by the names like clean.clean, but keeps everything it calculated for the next
+    call, see the module docstring.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, completelyInsideOtherBias: Optional[float] = None,
+                 filterCutoff: Optional[float] = None, workers: int = 1, cacheDir: Optional[str] = None):
+        """
+        Args:
+            config: overrides of utils.config, which is copied, so later changes of utils.config don't apply
+            completelyInsideOtherBias: the default bias, default = 0.7 with useOldCalculation, otherwise 0.5, like
+                clean.py
+            filterCutoff: the default cutoff, default = 0.65 with useOldCalculation, otherwise 0.45, like clean.py
+            workers: the number of processes used to calculate the distances, default = 1
+            cacheDir: directory of a persistent distancecache.DistanceCache shared between sessions, which can also be
+                used by concurrent sessions, default = None, the distances are only kept in memory
+        """
+        self.config = {**utils.config, **(config or {})}
+        old = self.config["useOldCalculation"]
+        self.completelyInsideOtherBias = completelyInsideOtherBias if completelyInsideOtherBias is not None \
+            else (0.7 if old else 0.5)
+        self.filterCutoff = filterCutoff if filterCutoff is not None else (0.65 if old else 0.45)
+        self.workers = workers
+        self.cacheDir = cacheDir
+        # an own Pipeline, so sessions don't share the memo of preprocessing.PIPELINE
+        self.pipeline = preprocessing.Pipeline()
+        self.lock = threading.RLock()
+        self._state: Optional[_State] = None
+        self._rings: Dict[Tuple[float, float], List[List[str]]] = {}
+
+    @property
+    def fitted(self) -> bool:
+        return self._state is not None
+
+    def fit(self, df: pd.DataFrame) -> "Deduplicator":
+        """Preprocesses the given fresh DataFrame and tokenizes its names, it isn't changed.
+
+        The distances and clusters of a previous fit are discarded.
+
+        Returns:
+            the Deduplicator itself
+        """
+        with RECORDER.stage("fit"):
+            df = preprocessing.preProcess(df.copy(), self.pipeline)
+            # missing names are never matched, like in clean.calcDistances
+            column = TextColumn(df.cname.unique())
+            empty = np.zeros(0, dtype=np.int64)
+            state = _State(df, column.strings.tolist(), column, empty, empty, np.zeros(0), np.zeros(0, dtype=bool),
+                           None)
+        with self.lock:
+            self._state = state
+            self._rings = {}
+        return self
+
+    def _params(self, completelyInsideOtherBias: Optional[float], filterCutoff: Optional[float]) \
+            -> Tuple[float, float]:
+        return (self.completelyInsideOtherBias if completelyInsideOtherBias is None else completelyInsideOtherBias,
+                self.filterCutoff if filterCutoff is None else filterCutoff)
+
+    def _score(self, column: TextColumn, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        chars = self.config["useOldCalculation"]
+        distances = np.full(len(left), np.nan)
+        missing = np.ones(len(left), dtype=bool)
+        if self.cacheDir is not None:
+            cache = distancecache.DistanceCache(self.cacheDir, "jaccard", "chars" if chars else "tokens")
+            keys = distancecache.pairKeys(distancecache.stringHashes(column.strings.tolist()), left, right)
+            distances, found = cache.lookup(keys)
+            missing = ~found
+        RECORDER.count("pairsScored", int(missing.sum()))
+        chunks = [(l, r, chars) for l, r in parallel.splitPairs(left[missing], right[missing],
+                                                                 parallel.chunkSize(missing.sum(), self.workers))]
+        calculated = [d for chunk in parallel.mapChunks(clean._distancesChunk, column, chunks, self.workers)
+                      for d in chunk]
+        distances[missing] = calculated
+        if self.cacheDir is not None:
+            cache.add(keys[missing], calculated)
+            cache.save()
+        return distances
+
+    def _scored(self, filterCutoff: float) -> _State:
+        # returns the fitted state with all pairs, that can reach filterCutoff with any bias
+        with self.lock:
+            state = self._state
+            if state is None:
+                raise ValueError("The Deduplicator has to be fitted first, see fit")
+            if state.floor is not None and state.floor <= filterCutoff:
+                return state
+            with RECORDER.stage("calcDistances"):
+                # a bias of 0 adds all pairs containing each other, whatever their similarity is
+                left, right = simjoin.candidatePairs(state.column, filterCutoff, 0.0, self.config["useOldCalculation"])
+                count = max(len(state.names), 1)
+                new = ~np.isin(left * count + right, state.left * count + state.right)
+                left, right = left[new], right[new]
+                inside = np.array([s1 in s2 or s2 in s1 for s1, s2 in zip(state.column.strings[left],
+                                                                          state.column.strings[right])], dtype=bool)
+                state = state._replace(left=np.concatenate([state.left, left]),
+                                       right=np.concatenate([state.right, right]),
+                                       raw=np.concatenate([state.raw, self._score(state.column, left, right)]),
+                                       inside=np.concatenate([state.inside, inside]), floor=filterCutoff)
+            self._state = state
+            return state
+
+    @staticmethod
+    def _matches(state: _State, bias: float, cutoff: float) -> List[Tuple[str, str, float]]:
+        distances = state.raw + np.where(state.inside, bias, 0)
+        reached = np.flatnonzero(distances >= cutoff)
+        reached = reached[np.argsort(-state.raw[reached], kind="stable")]
+        return [(state.names[l], state.names[r], d) for l, r, d in zip(state.left[reached].tolist(),
+                                                                        state.right[reached].tolist(),
+                                                                        distances[reached].tolist())]
+
+    def match(self, completelyInsideOtherBias: Optional[float] = None, filterCutoff: Optional[float] = None) \
+            -> List[Tuple[str, str, float]]:
+        """Returns the pairs of names, whose biased distance reaches the cutoff, like clean.calcDistances.
+
+        Args:
+            completelyInsideOtherBias: parameter for the bias function, default = the one of the Deduplicator
+            filterCutoff: the minimal biased distance, default = the one of the Deduplicator
+
+        Returns:
+            list of tuples with the form (name1: String, name2: String, distanceValue: float), ordered by the
+                distance without the bias, the highest first
+        """
+        bias, cutoff = self._params(completelyInsideOtherBias, filterCutoff)
+        return self._matches(self._scored(cutoff), bias, cutoff)
+
+    def _clusters(self, params: Tuple[float, float]) -> Tuple[_State, List[List[str]]]:
+        state = self._scored(params[1])
+        with self.lock:
+            rings = self._rings.get(params) if self._state.df is state.df else None
+        if rings is None:
+            matches = self._matches(state, *params)
+            with RECORDER.stage("equalityRings"):
+                rings = clean.convertToEqualityRings(matches)
+            RECORDER.count("matches", len(matches))
+            RECORDER.histogram("clusterSize", map(len, rings))
+            with self.lock:
+                # the rings of a state, that was replaced by fit in the meantime, are not kept
+                if self._state.df is state.df:
+                    rings = self._rings.setdefault(params, rings)
+        return state, rings
+
+    def clusters(self, completelyInsideOtherBias: Optional[float] = None, filterCutoff: Optional[float] = None) \
+            -> List[List[str]]:
+        """Returns the equality rings of the matched names, the eqRing of clean.clean, see match."""
+        return self._clusters(self._params(completelyInsideOtherBias, filterCutoff))[1]
+
+    def resolve(self, completelyInsideOtherBias: Optional[float] = None, filterCutoff: Optional[float] = None) \
+            -> pd.DataFrame:
+        """Deduplicates the fitted DataFrame, like clean.clean with the same parameters.
+
+        Args:
+            completelyInsideOtherBias: parameter for the bias function, default = the one of the Deduplicator
+            filterCutoff: the minimal biased distance, default = the one of the Deduplicator
+
+        Returns:
+            a deduplicated pandas DataFrame
+        """
+        state, rings = self._clusters(self._params(completelyInsideOtherBias, filterCutoff))
+        with RECORDER.stage("dedupe"):
+            return clean.dedupe(state.df.copy(), rings)
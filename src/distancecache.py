@@ -0,0 +1,124 @@
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, where only the threads of one process are serialized
+    fcntl = None
+
+import numpy as np
+
+# increase when the computation of the cached values changes, so old cache files aren't used anymore
+CACHE_VERSION = 1
+
+ENTRY_DTYPE = np.dtype([("key", "S16"), ("value", "<f8")])
+
+# cache file -> lock serializing the saves of the threads of this process
+_LOCKS: Dict[str, threading.Lock] = {}
+_LOCKS_LOCK = threading.Lock()
+
+
+@contextmanager
+def _locked(file: str):
+    # serializes the saves into file, between threads with a lock and between processes with a lock file
+    with _LOCKS_LOCK:
+        lock = _LOCKS.setdefault(os.path.abspath(file), threading.Lock())
+    with lock, open(file + ".lock", "a") as lockFile:
+        if fcntl is not None:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+
+def stringHashes(strings: Sequence[str]) -> np.ndarray:
+    """Computes a 64 bit content hash for every string."""
+    return np.array([int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+                     for s in strings], dtype=np.uint64)
+
+
+def pairKeys(hashes: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Computes the 128 bit keys of the string pairs (left[i], right[i]).
+
+    The key is the concatenation of both string hashes, the smaller one first, so it does not depend on the order of
+    the pair. The keys are returned as big endian byte strings, so their byte order equals their numerical order.
+    """
+    h1 = hashes[left]
+    h2 = hashes[right]
+    pairs = np.stack([np.minimum(h1, h2), np.maximum(h1, h2)], axis=1).astype(">u8")
+    return pairs.view("S16").ravel()
+
+
+class DistanceCache:
+    """
+    A content addressed cache of distances between string pairs.
+
+    Every algorithm and tokenizer gets its own file, which contains the entries sorted by their pair key. The file is
+    memory-mapped, so a lookup only reads the pages touched by the binary search instead of parsing the whole file.
+    As the keys are computed from the strings themselves, a cache can never return a distance of a different dataset.
+    """
+
+    def __init__(self, path: str, algo: str, tokenizer: str):
+        self.file = os.path.join(path, "{}-{}-v{}.npy".format(algo, tokenizer, CACHE_VERSION))
+        self.entries = np.load(self.file, mmap_mode="r") if os.path.exists(self.file) \
+            else np.zeros(0, dtype=ENTRY_DTYPE)
+        self.pending = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Looks up the given pair keys.
+
+        Returns:
+            a tuple of (values, found).
+                values contains the cached distance for every key, or NaN if it is not cached
+                found is a boolean mask of the keys that were cached
+        """
+        values = np.full(len(keys), np.nan)
+        if len(self.entries) == 0:
+            return values, np.zeros(len(keys), dtype=bool)
+        cachedKeys = self.entries["key"]
+        positions = np.minimum(np.searchsorted(cachedKeys, keys), len(cachedKeys) - 1)
+        found = cachedKeys[positions] == keys
+        values[found] = self.entries["value"][positions[found]]
+        return values, found
+
+    def add(self, keys: np.ndarray, values: Sequence[float]):
+        """Adds new entries, which are written with the next call of save."""
+        entries = np.zeros(len(keys), dtype=ENTRY_DTYPE)
+        entries["key"] = keys
+        entries["value"] = values
+        self.pending.append(entries)
+
+    def save(self):
+        """Merges the new entries into the cache file.
+
+        Several caches, in the same or in different processes, can save into the same file: the merge is serialized
+        and reads the current file, so the entries saved by the others in the meantime are kept.
+        """
+        if not self.pending:
+            return
+        os.makedirs(os.path.dirname(self.file), exist_ok=True)
+        with _locked(self.file):
+            current = np.load(self.file) if os.path.exists(self.file) else np.zeros(0, dtype=ENTRY_DTYPE)
+            entries = np.concatenate([current] + self.pending)
+            _, first = np.unique(entries["key"], return_index=True)
+            # the entries are kept in memory, the file can't be replaced while it is mapped on every platform
+            self.entries = entries[first]
+            # write into a temporary file and replace the old one, so readers never see a half written cache
+            handle, temporaryFile = tempfile.mkstemp(suffix=".npy", dir=os.path.dirname(self.file))
+            try:
+                with os.fdopen(handle, "wb") as file:
+                    np.save(file, self.entries)
+                os.replace(temporaryFile, self.file)
+            except BaseException:
+                os.remove(temporaryFile)
+                raise
+        self.pending = []
@@ -0,0 +1,109 @@
+from itertools import combinations
+from typing import FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+import utils
+
+Pair = Tuple[int, int]
+
+
+def pairsOf(duplicates: Iterable[Iterable[int]]) -> Set[Pair]:
+    """Returns all pairs of ids inside the given sets of duplicates as sorted tuples."""
+    return {pair for dupeSet in duplicates for pair in combinations(sorted(dupeSet), 2)}
+
+
+def pairwiseMetrics(found: Set[Pair], gold: Set[Pair]) -> List:
+    """Compares the found pairs to the gold pairs.
+
+    Returns:
+        the list [tp, fp, fn, precision, recall, fScore] counted in pairs
+    """
+    tp = len(found & gold)
+    precision = tp / len(found) if found else 0.0
+    recall = tp / len(gold) if gold else 0.0
+    fScore = (2 * precision * recall) / (precision + recall) if precision + recall else 0.0
+    return [tp, len(found) - tp, len(gold) - tp, precision, recall, fScore]
+
+
+class GoldStandard:
+    """
+    The Gold Standard provided by the HPI, which is only read on first use and indexed for hashed lookups.
+
+    The duplicate sets are kept as frozensets, so comparing a result to the Gold Standard is a set intersection, which
+    is linear in the size of the result instead of quadratic.
+    """
+
+    def __init__(self, path: Optional[str] = None, nonDuplicatesPath: Optional[str] = None):
+        """
+        Args:
+            path: of the duplicate pairs, default = PATH_PREFIX/restaurants_DPL.tsv
+            nonDuplicatesPath: of the known non duplicate pairs, e.g. PATH_PREFIX/restaurants_NDPL.tsv, default = None
+        """
+        self.path = path
+        self.nonDuplicatesPath = nonDuplicatesPath
+        self._sets: Optional[List[Set[int]]] = None
+        self._setIndex: Optional[Set[FrozenSet[int]]] = None
+        self._pairs: Optional[Set[Pair]] = None
+        self._nonDuplicatePairs: Optional[Set[Pair]] = None
+
+    @property
+    def sets(self) -> List[Set[int]]:
+        """All duplicate sets of the Gold Standard, every set contains an id1 and all of its id2s."""
+        if self._sets is None:
+            dupeDf = pd.read_csv(self.path or utils.PATH_PREFIX + '/restaurants_DPL.tsv', delimiter='\t')
+            partners = dupeDf.groupby(dupeDf.columns[0], sort=False)[dupeDf.columns[1]].agg(list)
+            self._sets = [{id1, *id2s} for id1, id2s in zip(partners.index.tolist(), partners.tolist())]
+        return self._sets
+
+    @property
+    def ids(self) -> List[int]:
+        """All ids in the Gold Standard."""
+        return [i for dupeSet in self.sets for i in dupeSet]
+
+    @property
+    def setIndex(self) -> Set[FrozenSet[int]]:
+        if self._setIndex is None:
+            self._setIndex = {frozenset(dupeSet) for dupeSet in self.sets}
+        return self._setIndex
+
+    @property
+    def pairs(self) -> Set[Pair]:
+        if self._pairs is None:
+            self._pairs = pairsOf(self.sets)
+        return self._pairs
+
+    @property
+    def nonDuplicatePairs(self) -> Set[Pair]:
+        """The known non duplicate pairs as sorted tuples, empty if no nonDuplicatesPath was given."""
+        if self._nonDuplicatePairs is None:
+            self._nonDuplicatePairs = set()
+            if self.nonDuplicatesPath is not None:
+                pairDf = pd.read_csv(self.nonDuplicatesPath, delimiter='\t')
+                self._nonDuplicatePairs = pairsOf(pairDf.to_numpy().tolist())
+        return self._nonDuplicatePairs
+
+    def compare(self, duplicates: Iterable[Set[int]]) -> Tuple[Set, Set, Set]:
+        """Compares whole duplicate sets to the Gold Standard, only exact matches count as true positive.
+
+        Returns:
+            A Tuple (true_positive, false_negative, false_positive) of sets of frozensets
+        """
+        found = {frozenset(dupeSet) for dupeSet in duplicates}
+        truePositive = found & self.setIndex
+        return truePositive, self.setIndex - truePositive, found - truePositive
+
+    def pairwise(self, duplicates: Iterable[Set[int]]) -> List:
+        """Compares all pairs of ids inside the given duplicate sets to the pairs of the Gold Standard.
+
+        Returns:
+            the list [tp, fp, fn, precision, recall, fScore] counted in pairs
+        """
+        return pairwiseMetrics(pairsOf(duplicates), self.pairs)
+
+    def knownNonDuplicates(self, duplicates: Iterable[Set[int]]) -> Set[Pair]:
+        """Returns the pairs inside the given duplicate sets, that are known non duplicates."""
+        return pairsOf(duplicates) & self.nonDuplicatePairs
+
+
+GOLD = GoldStandard()
@@ -0,0 +1,234 @@
+"""Streaming export of the deduplicated clusters as newline-delimited json for mongoimport.
+
+Every cluster becomes one document in the raw and one in the clean export, identified by its cluster key, the smallest
+id of the cluster. The key stays the same as long as the cluster keeps its smallest id, unlike the group index of
+main.groupDuplicates, which depends on the order of all clusters. So the documents can be upserted by _id:
+
+    mongoimport [...] --collection raw --type json --file raw-0.ndjson --mode upsert
+    mongoimport [...] --collection raw --type json --file deleted.ndjson --mode delete
+
+A manifest with the hash of every exported cluster is kept next to the files, so the diff mode only writes the
+clusters that were inserted or changed since the previous export and the keys of the deleted clusters.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+import main
+import survivorship
+
+# the columns of the documents, all values of a cluster are exported as a sorted list
+EXPORT_COLUMNS = ["id", "name", "address", "city", "phone", "type", "cname", "caddress"]
+# the columns, that the clean export reduces to the value of the canonical record, like utils.prepareUploadJsons
+SINGLE_VALUE_COLUMNS = ["name", "address", "city", "cname", "caddress"]
+MANIFEST_FILE = "manifest.tsv"
+DELETED_FILE = "deleted.ndjson"
+
+
+def clusterKeys(mergedDupeSets: Iterable[Set[int]]) -> Dict[int, int]:
+    """Returns a dict from every id in the given sets of duplicates to the smallest id of its set.
+
+    Ids, that are not in any set, are their own cluster key.
+    """
+    return {i: min(dupeSet) for dupeSet in mergedDupeSets for i in dupeSet}
+
+
+def _values(values: Iterable) -> List:
+    # the distinct values without missing ones, sorted so the documents don't depend on the row order
+    distinct = {v.item() if isinstance(v, np.generic) else v for v in values
+                if not (isinstance(v, float) and np.isnan(v)) and v is not None}
+    return sorted(distinct, key=lambda v: (type(v).__name__, v))
+
+
+def documents(rows: pd.DataFrame) -> Iterator[Tuple[int, str, str]]:
+    """Converts the rows of complete clusters into their raw and clean json documents.
+
+    Args:
+        rows: preprocessed rows with a key column, every cluster has to be complete
+
+    Returns:
+        an iterator of tuples (key, rawLine, cleanLine), ordered by the key
+    """
+    columns = [c for c in EXPORT_COLUMNS if c in rows]
+    # the canonical record of every cluster comes first, see survivorship.sortMembers
+    order, _ = survivorship.sortMembers(rows, rows.key.to_numpy())
+    for key, cluster in rows.iloc[order].groupby("key", sort=True):
+        raw = {"_id": int(key)}
+        raw.update((c, _values(cluster[c].tolist())) for c in columns)
+        clean = dict(raw)
+        for c in SINGLE_VALUE_COLUMNS:
+            if c in clean:
+                # the value of the canonical record, or any value if the canonical record is missing it
+                first = _values(cluster[c].head(1).tolist())
+                clean[c] = first[0] if first else (clean[c][0] if clean[c] else None)
+        yield int(key), json.dumps(raw, sort_keys=True), json.dumps(clean, sort_keys=True)
+
+
+def readManifest(outputDirectory: str) -> Dict[int, str]:
+    """Reads the hash of every cluster of the previous export, empty if there was none."""
+    path = os.path.join(outputDirectory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        next(file)
+        return {int(key): digest for key, digest in (line.rstrip("\n").split("\t") for line in file)}
+
+
+class _ShardWriter:
+    """
+    Writes lines into a set of shard files, buffering at most batchSize lines per file.
+    """
+
+    def __init__(self, outputDirectory: str, prefix: str, shards: int, batchSize: int):
+        self.batchSize = batchSize
+        self.paths = [os.path.join(outputDirectory, "{}-{}.ndjson".format(prefix, shard)) for shard in range(shards)]
+        self.files = [open(path, "w") for path in self.paths]
+        self.buffers: List[List[str]] = [[] for _ in range(shards)]
+
+    def write(self, key: int, line: str):
+        shard = key % len(self.files)
+        self.buffers[shard].append(line + "\n")
+        if len(self.buffers[shard]) >= self.batchSize:
+            self.flush(shard)
+
+    def flush(self, shard: int):
+        self.files[shard].writelines(self.buffers[shard])
+        self.buffers[shard] = []
+
+    def close(self):
+        for shard, file in enumerate(self.files):
+            self.flush(shard)
+            file.close()
+
+
+def writeExport(partitions: Iterable[pd.DataFrame], outputDirectory: str, shards: int = 1, batchSize: int = 10000,
+                diff: bool = False) -> Dict[str, int]:
+    """Writes the raw and clean documents of the clusters into sharded ndjson files and updates the manifest.
+
+    Args:
+        partitions: preprocessed rows with a key column, every cluster has to be complete inside of one partition
+        outputDirectory: of the raw-N.ndjson and clean-N.ndjson shards, the deleted.ndjson and the manifest
+        shards: the number of files per export, a cluster always ends up in the shard key % shards, default = 1
+        batchSize: the number of lines buffered per file, default = 10000
+        diff: if only the clusters inserted or changed since the previous export are written, together with the keys
+            of the deleted clusters in deleted.ndjson, default = False
+
+    Returns:
+        a dict with the number of inserted, changed, unchanged and deleted clusters
+    """
+    os.makedirs(outputDirectory, exist_ok=True)
+    previous = readManifest(outputDirectory)
+    counts = {"inserted": 0, "changed": 0, "unchanged": 0, "deleted": 0}
+    raw = _ShardWriter(outputDirectory, "raw", shards, batchSize)
+    clean = _ShardWriter(outputDirectory, "clean", shards, batchSize)
+    # the new manifest replaces the old one only after all files were written
+    manifest = tempfile.NamedTemporaryFile("w", dir=outputDirectory, suffix=".tmp", delete=False)
+    try:
+        manifest.write("key\thash\n")
+        for partition in partitions:
+            for key, rawLine, cleanLine in documents(partition):
+                # the clean document also depends on the survivorship rules, so a change of them changes the cluster
+                digest = hashlib.sha1((rawLine + "\n" + cleanLine).encode("utf-8")).hexdigest()
+                manifest.write("{}\t{}\n".format(key, digest))
+                previousDigest = previous.pop(key, None)
+                state = "inserted" if previousDigest is None else "unchanged" if previousDigest == digest \
+                    else "changed"
+                counts[state] += 1
+                if not diff or state != "unchanged":
+                    raw.write(key, rawLine)
+                    clean.write(key, cleanLine)
+        with open(os.path.join(outputDirectory, DELETED_FILE), "w") as deleted:
+            if diff:
+                deleted.writelines(json.dumps({"_id": key}) + "\n" for key in sorted(previous))
+        counts["deleted"] = len(previous) if diff else 0
+    except BaseException:
+        manifest.close()
+        os.remove(manifest.name)
+        raise
+    finally:
+        raw.close()
+        clean.close()
+    manifest.close()
+    os.replace(manifest.name, os.path.join(outputDirectory, MANIFEST_FILE))
+    return counts
+
+
+def _partitionFiles(path: str, keys: Dict[int, int], directory: str, delimiter: str, chunkSize: int,
+                    partitions: int) -> List[str]:
+    # every cluster is written into the partition key % partitions, so it is complete inside of that partition
+    files = [os.path.join(directory, "export{}.pkl".format(p)) for p in range(partitions)]
+    handles = [open(file, "wb") for file in files]
+    try:
+        for chunk in pd.read_csv(path, delimiter=delimiter, chunksize=chunkSize):
+            chunk = main.preProcess(chunk.reset_index(drop=True))
+            chunk["key"] = [keys.get(i, i) for i in chunk.id.tolist()]
+            for partition, fragment in chunk.groupby(chunk.key % partitions):
+                pickle.dump(fragment[["key"] + [c for c in EXPORT_COLUMNS if c in fragment]], handles[partition],
+                            protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for handle in handles:
+            handle.close()
+    return files
+
+
+def _readFragments(file: str) -> pd.DataFrame:
+    fragments = []
+    with open(file, "rb") as handle:
+        while True:
+            try:
+                fragments.append(pickle.load(handle))
+            except EOFError:
+                break
+    return pd.concat(fragments, ignore_index=True) if fragments else pd.DataFrame(columns=["key", "id"])
+
+
+def exportFile(path: str, mergedDupeSets: List[Set[int]], outputDirectory: str, delimiter: str = "\t",
+               chunkSize: int = 100000, partitions: int = 16, shards: int = 1, batchSize: int = 10000,
+               diff: bool = False, storePath: Optional[str] = None) -> Dict[str, int]:
+    """Exports the clusters of a tsv/csv file without loading it completely into memory.
+
+    The file is read and preprocessed in chunks and every row is written into the on-disk partition of its cluster,
+    the partitions are then converted into documents one by one. See writeExport for the output.
+
+    Args:
+        path: of the tsv/csv input file
+        mergedDupeSets: the sets of duplicate ids, e.g. of main.deduplicate or streaming.deduplicateStream
+        outputDirectory: of the export, see writeExport
+        delimiter: of the input file, default = tab
+        chunkSize: the number of rows read and preprocessed at once, default = 100000
+        partitions: the number of on-disk partitions, default = 16
+        shards: the number of files per export, default = 1
+        batchSize: the number of lines buffered per file, default = 10000
+        diff: if only the changes since the previous export are written, default = False
+        storePath: directory of the partitions, default = a temporary directory, which is deleted afterwards
+
+    Returns:
+        a dict with the number of inserted, changed, unchanged and deleted clusters
+    """
+    keys = clusterKeys(mergedDupeSets)
+    temporaryDirectory = tempfile.TemporaryDirectory() if storePath is None else None
+    storePath = storePath or temporaryDirectory.name
+    try:
+        files = _partitionFiles(path, keys, storePath, delimiter, chunkSize, partitions)
+        return writeExport((_readFragments(file) for file in files), outputDirectory, shards, batchSize, diff)
+    finally:
+        if temporaryDirectory is not None:
+            temporaryDirectory.cleanup()
+
+
+def exportFrame(df: pd.DataFrame, mergedDupeSets: List[Set[int]], outputDirectory: str, partitions: int = 16,
+                shards: int = 1, batchSize: int = 10000, diff: bool = False) -> Dict[str, int]:
+    """Exports the clusters of an already preprocessed DataFrame, see exportFile.
+
+    The DataFrame isn't changed, the documents are generated for one partition of the clusters at a time.
+    """
+    keys = pd.Series([clusterKeys(mergedDupeSets).get(i, i) for i in df.id.tolist()], index=df.index)
+    rows = df[[c for c in EXPORT_COLUMNS if c in df]].assign(key=keys)
+    return writeExport((group for _, group in rows.groupby(keys % partitions)), outputDirectory, shards, batchSize,
+                       diff)
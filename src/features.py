@@ -0,0 +1,81 @@
+import numpy as np
+
+import minhash
+from recordstore import MISSING, RecordStore, isSame
+
+
+def areRowsSameBatch(store: RecordStore, left: np.ndarray, right: np.ndarray, minTokenDistance=0.5,
+                     minTextDistance=0.9, batchSize: int = 65536) -> np.ndarray:
+    """Evaluates main.areRowsSame with td.jaccard for whole arrays of row pairs at once.
+
+    Args:
+        store: the RecordStore of the preprocessed DataFrame
+        left: positions of the first rows of the pairs
+        right: positions of the second rows of the pairs
+        minTokenDistance: to use, default 0.5
+        minTextDistance: to use, default 0.9
+        batchSize: how many pairs are evaluated at once, bounds the memory used for the character counts
+
+    Returns:
+        a boolean mask, which is True for every pair (left[i], right[i]) that should be considered the same
+    """
+    left = np.asarray(left, dtype=np.int64)
+    right = np.asarray(right, dtype=np.int64)
+    result = np.zeros(len(left), dtype=bool)
+    for start in range(0, len(left), batchSize):
+        l = left[start:start + batchSize]
+        r = right[start:start + batchSize]
+        phoneEqual = isSame(store.phones, l, r)
+        cityEqual = ~phoneEqual & isSame(store.cityCodes, l, r)
+
+        names = store.name
+        candidates = np.flatnonzero((phoneEqual | cityEqual)
+                                    & (names.codes[l] != MISSING) & (names.codes[r] != MISSING))
+        leftNames = names.codes[l[candidates]]
+        rightNames = names.codes[r[candidates]]
+        namesSimilar = names.similar(leftNames, rightNames, minTokenDistance, minTextDistance)
+        same = np.zeros(len(l), dtype=bool)
+
+        # phone branch: similar names or one name contained in the other
+        phoneCandidates = phoneEqual[candidates]
+        same[candidates[phoneCandidates & namesSimilar]] = True
+        for i, n1, n2 in zip(candidates[phoneCandidates & ~namesSimilar],
+                             names.strings[leftNames[phoneCandidates & ~namesSimilar]],
+                             names.strings[rightNames[phoneCandidates & ~namesSimilar]]):
+            same[i] = n1 in n2 or n2 in n1
+
+        # city branch: similar names, similar addresses and equal street numbers
+        cityCandidates = candidates[~phoneCandidates & namesSimilar]
+        cityCandidates = cityCandidates[isSame(store.numberCodes, l[cityCandidates], r[cityCandidates])]
+        same[cityCandidates] = store.address.similar(store.address.codes[l[cityCandidates]],
+                                                     store.address.codes[r[cityCandidates]],
+                                                     minTokenDistance, minTextDistance)
+        result[start:start + batchSize] = same
+    return result
+
+
+def minHashCandidates(store: RecordStore, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Selects the pairs, whose names are proposed as similar by the token or character MinHash-LSH of minhash.py.
+
+    Rows with the same phone are always selected, as they are also the same if one name contains the other one.
+    Without the same phone areRowsSameBatch only accepts similar names, so it only has to evaluate the selected pairs,
+    but misses the similar names that don't share a bucket.
+
+    Args:
+        store: the RecordStore of the preprocessed DataFrame
+        left: positions of the first rows of the pairs
+        right: positions of the second rows of the pairs
+
+    Returns:
+        a boolean mask, which is True for every pair (left[i], right[i]) that has to be evaluated
+    """
+    left = np.asarray(left, dtype=np.int64)
+    right = np.asarray(right, dtype=np.int64)
+    names = store.name
+    selected = isSame(store.phones, left, right) | isSame(names.codes, left, right)
+    candidates = np.flatnonzero(~selected & (names.codes[left] != MISSING) & (names.codes[right] != MISSING))
+    leftNames = names.codes[left[candidates]]
+    rightNames = names.codes[right[candidates]]
+    selected[candidates] = minhash.sharesBucket(names, leftNames, rightNames) \
+        | minhash.sharesBucket(names, leftNames, rightNames, chars=True)
+    return selected
@@ -0,0 +1,236 @@
+"""Geocoding stage, which only sends the addresses to the geocoding backend that were never geocoded before.
+
+The addresses are normalized with the address and city rules of preprocessing.py, so the rows of the same restaurant
+with e.g. "blv." and "blvd" share a single lookup. The responses are kept in an append-only cache file keyed by the
+normalized address and only the misses are sent to the backend, by a bounded pool of threads with a shared rate limit
+and retries.
+
+A backend is any callable taking the query "address, city" and returning the list of results, like the geocode
+method of googlemaps.Client. ReplayBackend replays restaurants_geocoded.csv, so the stage runs offline.
+
+Usage (from the src directory):
+    python geocoding.py --replay ../data/work/restaurants_geocoded.csv --latency 0.05 --workers 16 --rate 100
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from instrumentation import RECORDER
+from preprocessing import PIPELINE, Pipeline
+
+Backend = Callable[[str], List[Dict[str, Any]]]
+CACHE_FILE = "geocode_cache.ndjson"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def query(address: Any, city: Any) -> str:
+    """The query of a row, which is sent to the backend, just like the notebooks did."""
+    return "{}, {}".format(address, city)
+
+
+def normalizedAddress(address: Any, city: Any, pipeline: Pipeline = PIPELINE) -> str:
+    """The cache key of a row, the address and city normalized by the rules of preProcess and lower cased."""
+    values = [pipeline.normalizeValue(column, value) for column, value in (("address", address), ("city", city))]
+    return ", ".join(_WHITESPACE.sub(" ", v).strip().lower() if isinstance(v, str) else "" for v in values)
+
+
+class GeocodeCache:
+    """
+    The persistent responses of the backend keyed by the normalized address.
+
+    The cache is an append-only ndjson file, so saving only writes the new entries. A line, that was only partially
+    written when a run was killed, is ignored when the cache is loaded.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: directory of the cache file, default = None, the cache is only kept in memory
+        """
+        self.file = os.path.join(path, CACHE_FILE) if path is not None else None
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self.pending: List[str] = []
+        if self.file is not None and os.path.exists(self.file):
+            with open(self.file, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["address"]] = entry["results"]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, address: str) -> bool:
+        return address in self.entries
+
+    def get(self, address: str) -> Optional[List[Dict[str, Any]]]:
+        return self.entries.get(address)
+
+    def add(self, address: str, results: List[Dict[str, Any]]):
+        """Adds a response, which is written with the next call of save."""
+        self.entries[address] = results
+        self.pending.append(address)
+
+    def save(self):
+        """Appends the new entries to the cache file."""
+        if self.file is None or not self.pending:
+            self.pending = []
+            return
+        os.makedirs(os.path.dirname(self.file), exist_ok=True)
+        with open(self.file, "a", encoding="utf-8") as file:
+            file.writelines(json.dumps({"address": a, "results": self.entries[a]}, sort_keys=True) + "\n"
+                            for a in self.pending)
+        self.pending = []
+
+
+class RateLimiter:
+    """
+    Spaces the calls of all threads at least 1 / rate seconds apart.
+    """
+
+    def __init__(self, rate: Optional[float]):
+        """
+        Args:
+            rate: the maximum number of calls per second, None or 0 doesn't limit the calls
+        """
+        self.interval = 1 / rate if rate else 0.0
+        self.next = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next, now)
+            self.next = slot + self.interval
+        # sleeping outside of the lock, so the following threads can already reserve their slots
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ReplayBackend:
+    """
+    An offline backend, which replays the responses of a geocoded csv file, e.g. restaurants_geocoded.csv.
+
+    Unknown queries get an empty response, just like Google returns for addresses it can't find.
+    """
+
+    def __init__(self, path: str, latency: float = 0.0):
+        """
+        Args:
+            path: of the geocoded csv file with the columns address, city and google_geocode
+            latency: seconds every call sleeps to simulate the network, default = 0.0
+        """
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+        data = pd.read_csv(path)
+        self.responses: Dict[str, str] = dict(zip(map(query, data.address.tolist(), data.city.tolist()),
+                                                  data.google_geocode.tolist()))
+
+    def __call__(self, address: str) -> List[Dict[str, Any]]:
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        response = self.responses.get(address)
+        return json.loads(response) if isinstance(response, str) else []
+
+
+def _lookup(backend: Backend, limiter: RateLimiter, address: str, retries: int, backoff: float) \
+        -> Tuple[Optional[List[Dict[str, Any]]], int]:
+    # returns the results, or None if every attempt failed, and the number of retries
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            return backend(address), attempt
+        except Exception:
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+    return None, retries
+
+
+def geocode(df: pd.DataFrame, backend: Backend, cache: Optional[GeocodeCache] = None, workers: int = 8,
+            rate: Optional[float] = 50.0, retries: int = 3, backoff: float = 0.5,
+            column: str = "google_geocode") -> pd.DataFrame:
+    """Geocodes every row of the given raw DataFrame, looking up every normalized address only once.
+
+    Args:
+        df: a raw pandas DataFrame with the columns address and city, it isn't changed
+        backend: called with the query of the first row of every normalized address, that is not in the cache
+        cache: the GeocodeCache, which is saved afterwards, default = None, a new in-memory cache
+        workers: the maximum number of concurrent backend calls, default = 8
+        rate: the maximum number of backend calls per second, default = 50.0, None doesn't limit the calls
+        retries: how often a failed call is repeated, with an exponential backoff, default = 3
+        backoff: seconds before the first retry, every further retry waits twice as long, default = 0.5
+        column: the column of the json responses, default = google_geocode, like restaurants_geocoded.csv
+
+    Returns:
+        a copy of the DataFrame with the response of every row as a json string, NaN if every attempt failed
+    """
+    cache = cache if cache is not None else GeocodeCache()
+    with RECORDER.stage("geocode"):
+        keys = [normalizedAddress(a, c) for a, c in zip(df.address.tolist(), df.city.tolist())]
+        queries = dict(zip(reversed(keys), map(query, reversed(df.address.tolist()), reversed(df.city.tolist()))))
+        misses = [key for key in dict.fromkeys(keys) if key not in cache]
+        RECORDER.count("geocodeAddresses", len(queries))
+        RECORDER.count("geocodeCacheHits", len(queries) - len(misses))
+        limiter = RateLimiter(rate)
+        failed = 0
+        try:
+            with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+                lookups = executor.map(lambda key: _lookup(backend, limiter, queries[key], retries, backoff), misses)
+                for key, (results, retried) in zip(misses, lookups):
+                    RECORDER.count("geocodeRetries", retried)
+                    if results is None:
+                        failed += 1
+                    else:
+                        cache.add(key, results)
+        finally:
+            # the successful lookups are kept, even if the run is interrupted
+            cache.save()
+        RECORDER.count("geocodeRequests", len(misses))
+        RECORDER.count("geocodeFailures", failed)
+        responses = {key: json.dumps(cache.get(key)) for key in queries if key in cache}
+        return df.assign(**{column: [responses.get(key, float("nan")) for key in keys]})
+
+
+if __name__ == '__main__':
+    import utils
+
+    parser = argparse.ArgumentParser(description="Geocodes a tsv file, by default offline with the replay backend")
+    parser.add_argument("--input", default=utils.PATH_PREFIX + "/restaurants.tsv",
+                        help="the tsv file to geocode, default = restaurants.tsv")
+    parser.add_argument("--output", help="the csv file the geocoded rows are written to, default = not written")
+    parser.add_argument("--replay", default=utils.PATH_PREFIX + "/restaurants_geocoded.csv",
+                        help="the geocoded csv file, that the replay backend answers from, "
+                             "default = restaurants_geocoded.csv")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds every call of the replay backend takes, default = 0")
+    parser.add_argument("--cache", help="directory of the geocode cache, default = no persistent cache")
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent calls, default = 8")
+    parser.add_argument("--rate", type=float, default=50.0, help="maximum calls per second, default = 50, 0 = "
+                                                                 "unlimited")
+    args = parser.parse_args()
+
+    replay = ReplayBackend(args.replay, args.latency)
+    start = time.perf_counter()
+    RECORDER.enable()
+    geocoded = geocode(pd.read_csv(args.input, delimiter="\t"), replay, GeocodeCache(args.cache), args.workers,
+                       args.rate)
+    counters = RECORDER.counters
+    print("{} rows, {} addresses, {} cache hits, {} backend calls, {} failures in {:.2f} s".format(
+        len(geocoded), counters["geocodeAddresses"], counters["geocodeCacheHits"], replay.calls,
+        counters["geocodeFailures"], time.perf_counter() - start))
+    if args.output is not None:
+        geocoded.to_csv(args.output, index=False)
@@ -0,0 +1,343 @@
+"""Compact geocode store and in-process spatial index of the restaurants.
+
+The geocoded csv files contain the complete Google geocoding response of every row as a json string. convert extracts
+the coordinates, place id, formatted address and postal code once into a directory of .npy columns, which are memory
+mapped when loaded. SpatialIndex answers radius and k-nearest queries over one point per deduplicated restaurant from
+a grid of cells, without a database.
+
+Usage (from the src directory):
+    python geostore.py --input ../data/work/restaurants_geocoded.csv --output ../data/work/geocodes
+    python geostore.py --output ../data/work/geocodes --groups ../data/work/groups.tsv --near 34.07 -118.38 --k 5
+"""
+import argparse
+import ast
+import json
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+# the string columns are stored as utf-8 bytes and the offsets of every value into them
+STRING_COLUMNS = ["placeId", "formattedAddress", "postalCode"]
+
+
+def parseGeocode(value: Any) -> Dict[str, Any]:
+    """Extracts lat, lng, placeId, formattedAddress and postalCode of the first result of a geocoding response.
+
+    The response is a json list of results, the older files contain the repr of the python list instead. Rows without
+    a result get NaN coordinates and empty strings.
+    """
+    parsed = {"lat": np.nan, "lng": np.nan, "placeId": "", "formattedAddress": "", "postalCode": ""}
+    if not isinstance(value, str):
+        return parsed
+    try:
+        results = json.loads(value)
+    except ValueError:
+        results = ast.literal_eval(value)
+    if not results:
+        return parsed
+    # the first result is the best match of Google
+    result = results[0]
+    location = result.get("geometry", {}).get("location", {})
+    parsed.update(lat=float(location.get("lat", np.nan)), lng=float(location.get("lng", np.nan)),
+                  placeId=result.get("place_id", ""), formattedAddress=result.get("formatted_address", ""))
+    for component in result.get("address_components", []):
+        if "postal_code" in component.get("types", []):
+            parsed["postalCode"] = component.get("long_name", "")
+    return parsed
+
+
+def _packStrings(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.cumsum([0] + [len(e) for e in encoded], dtype=np.int64)
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def haversineKm(lat1: Any, lng1: Any, lat2: Any, lng2: Any) -> np.ndarray:
+    """The great circle distances in km between the points (lat1, lng1) and (lat2, lng2) in degrees."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeocodeStore:
+    """
+    The extracted geocodes of all rows in a columnar layout: int64 ids, float64 coordinates and the string columns
+    as utf-8 bytes with int64 offsets. Saved as one .npy file per array, which are memory-mapped by load, so opening
+    the store doesn't parse or even read the whole file.
+    """
+
+    def __init__(self, ids: np.ndarray, lat: np.ndarray, lng: np.ndarray, strings: Dict[str, Tuple[np.ndarray,
+                                                                                                     np.ndarray]]):
+        self.ids = ids
+        self.lat = lat
+        self.lng = lng
+        # column -> (offsets, bytes)
+        self.strings = strings
+        self._positions: Optional[Dict[int, int]] = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.ids, self.lat, self.lng)) \
+            + sum(offsets.nbytes + data.nbytes for offsets, data in self.strings.values())
+
+    @staticmethod
+    def fromRecords(ids: Sequence[int], geocodes: Iterable[Dict[str, Any]]) -> "GeocodeStore":
+        """Builds the store from the ids and the parsed geocodes of parseGeocode."""
+        geocodes = list(geocodes)
+        return GeocodeStore(np.asarray(ids, dtype=np.int64),
+                            np.array([g["lat"] for g in geocodes], dtype=np.float64),
+                            np.array([g["lng"] for g in geocodes], dtype=np.float64),
+                            {c: _packStrings([g[c] for g in geocodes]) for c in STRING_COLUMNS})
+
+    @staticmethod
+    def convert(path: str, column: Optional[str] = None, chunkSize: int = 10000) -> "GeocodeStore":
+        """Reads a geocoded csv file in chunks and extracts the geocodes of every row.
+
+        Args:
+            path: of the csv file, e.g. PATH_PREFIX/restaurants_geocoded.csv
+            column: of the geocoding responses, default = google_geocode or geocode, whichever exists
+            chunkSize: the number of rows read at once, default = 10000
+
+        Returns:
+            the GeocodeStore of all rows
+        """
+        import pandas as pd
+        ids = []
+        geocodes = []
+        for chunk in pd.read_csv(path, chunksize=chunkSize):
+            source = column or ("google_geocode" if "google_geocode" in chunk else "geocode")
+            ids.extend(chunk.id.tolist())
+            geocodes.extend(parseGeocode(value) for value in chunk[source].tolist())
+        return GeocodeStore.fromRecords(ids, geocodes)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        arrays = {"ids": self.ids, "lat": self.lat, "lng": self.lng}
+        for column, (offsets, data) in self.strings.items():
+            arrays[column + "Offsets"] = offsets
+            arrays[column + "Bytes"] = data
+        for name, array in arrays.items():
+            # write into a temporary file and replace the old one, so readers never see a half written column
+            np.save(os.path.join(path, name + ".tmp.npy"), np.asarray(array))
+            os.replace(os.path.join(path, name + ".tmp.npy"), os.path.join(path, name + ".npy"))
+
+    @staticmethod
+    def load(path: str) -> "GeocodeStore":
+        def column(name: str) -> np.ndarray:
+            return np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+
+        return GeocodeStore(column("ids"), column("lat"), column("lng"),
+                            {c: (column(c + "Offsets"), column(c + "Bytes")) for c in STRING_COLUMNS})
+
+    def string(self, column: str, position: int) -> str:
+        """Decodes the value of a string column of the row at position."""
+        offsets, data = self.strings[column]
+        return bytes(data[offsets[position]:offsets[position + 1]]).decode("utf-8")
+
+    def position(self, rowId: int) -> int:
+        """The position of the row with the given id, raises a KeyError if it doesn't exist."""
+        if self._positions is None:
+            self._positions = {i: p for p, i in enumerate(self.ids.tolist())}
+        return self._positions[rowId]
+
+    def record(self, rowId: int) -> Dict[str, Any]:
+        """All extracted values of the row with the given id."""
+        p = self.position(rowId)
+        record = {"id": rowId, "lat": float(self.lat[p]), "lng": float(self.lng[p])}
+        record.update((c, self.string(c, p)) for c in STRING_COLUMNS)
+        return record
+
+
+class SpatialIndex:
+    """
+    A grid index over points, which are sorted by their cell, so every cell is a contiguous slice of the coordinate
+    arrays. A query only computes the exact distances to the points of the cells around it.
+
+    The cells are cellDegrees wide in latitude and longitude, the grid doesn't wrap around the antimeridian.
+    """
+
+    def __init__(self, keys: Sequence[int], lat: Sequence[float], lng: Sequence[float], cellDegrees: float = 0.02):
+        """
+        Args:
+            keys: of the points, e.g. the cluster keys of the restaurants
+            lat: of the points in degrees, points with NaN coordinates are left out
+            lng: of the points in degrees
+            cellDegrees: the size of a grid cell, default = 0.02 (about 2 km)
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        valid = ~(np.isnan(lat) | np.isnan(lng))
+        self.cellDegrees = cellDegrees
+        rows = np.floor(lat[valid] / cellDegrees).astype(np.int64)
+        columns = np.floor(lng[valid] / cellDegrees).astype(np.int64)
+        order = np.lexsort((columns, rows))
+        self.keys = keys[valid][order]
+        self.lat = lat[valid][order]
+        self.lng = lng[valid][order]
+        rows, columns = rows[order], columns[order]
+        changes = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+        # the first point starts a cell, unless there are no points at all
+        starts = np.flatnonzero(np.concatenate([[len(rows) > 0], changes]))
+        ends = np.append(starts[1:], len(rows))
+        # (row, column) of the cell -> (start, end) of its points
+        self.cells: Dict[Tuple[int, int], Tuple[int, int]] = {
+            (r, c): (s, e) for r, c, s, e in zip(rows[starts].tolist(), columns[starts].tolist(), starts.tolist(),
+                                                 ends.tolist())}
+        self.rowRange = (int(rows.min()), int(rows.max())) if len(rows) else (0, -1)
+        self.columnRange = (int(columns.min()), int(columns.max())) if len(columns) else (0, -1)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def fromStore(store: GeocodeStore, mergedDupeSets: Optional[Iterable[Set[int]]] = None,
+                  cellDegrees: float = 0.02) -> "SpatialIndex":
+        """Indexes one point per deduplicated restaurant.
+
+        Every cluster gets the coordinates of its smallest id with a geocode and the key of export.clusterKeys, the
+        smallest id of the cluster, so the results can be looked up in the ndjson export.
+
+        Args:
+            store: the geocodes of all rows
+            mergedDupeSets: the sets of duplicate ids, default = None, every row is its own restaurant
+            cellDegrees: the size of a grid cell, see __init__
+        """
+        ids = np.asarray(store.ids, dtype=np.int64)
+        keyOf = {i: min(dupeSet) for dupeSet in (mergedDupeSets or []) for i in dupeSet}
+        rowKeys = np.array([keyOf.get(i, i) for i in ids.tolist()], dtype=np.int64)
+        lat = np.asarray(store.lat)
+        lng = np.asarray(store.lng)
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lng)))
+        # the first valid row of every cluster by id
+        valid = valid[np.lexsort((ids[valid], rowKeys[valid]))]
+        _, first = np.unique(rowKeys[valid], return_index=True)
+        chosen = valid[first]
+        return SpatialIndex(rowKeys[chosen], lat[chosen], lng[chosen], cellDegrees)
+
+    def _cellOf(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cellDegrees), math.floor(lng / self.cellDegrees)
+
+    def _points(self, cells: Iterable[Tuple[int, int]]) -> np.ndarray:
+        slices = [self.cells[cell] for cell in cells if cell in self.cells]
+        if not slices:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(s, e) for s, e in slices])
+
+    def _sorted(self, positions: np.ndarray, distances: np.ndarray) -> List[Tuple[int, float]]:
+        order = np.lexsort((self.keys[positions], distances))
+        return list(zip(self.keys[positions[order]].tolist(), distances[order].tolist()))
+
+    def within(self, lat: float, lng: float, radiusKm: float) -> List[Tuple[int, float]]:
+        """Finds all points within radiusKm of (lat, lng).
+
+        Returns:
+            a list of (key, distanceKm), sorted by the distance
+        """
+        row, column = self._cellOf(lat, lng)
+        rowSpan = math.ceil(radiusKm / (KM_PER_DEGREE * self.cellDegrees))
+        # two points at most at the latitude phi and dLng apart are at least 2R asin(cos(phi) sin(dLng / 2)) apart,
+        # so the circle spans the longitudes that reach radiusKm at the farthest latitude of the circle
+        cosine = math.cos(math.radians(min(abs(lat) + radiusKm / KM_PER_DEGREE, 90.0)))
+        sine = math.sin(min(radiusKm / (2 * EARTH_RADIUS_KM), math.pi / 2))
+        if sine < cosine:
+            columnSpan = math.ceil(math.degrees(2 * math.asin(sine / cosine)) / self.cellDegrees)
+        else:
+            columnSpan = self.columnRange[1] - self.columnRange[0] + 1
+        rows = range(max(row - rowSpan, self.rowRange[0]), min(row + rowSpan, self.rowRange[1]) + 1)
+        columns = range(max(column - columnSpan, self.columnRange[0]), min(column + columnSpan,
+                                                                            self.columnRange[1]) + 1)
+        if len(rows) * len(columns) > len(self.cells):
+            candidates = self._points(self.cells)
+        else:
+            candidates = self._points((r, c) for r in rows for c in columns)
+        distances = haversineKm(lat, lng, self.lat[candidates], self.lng[candidates])
+        inside = distances <= radiusKm
+        return self._sorted(candidates[inside], distances[inside])
+
+    def _ringBoundKm(self, lat: float, ring: int) -> float:
+        # every point outside of the searched rings is at least ring cells away in latitude, or in longitude while
+        # being at most ring + 1 cells away in latitude, see within for the bound of the longitude
+        degrees = ring * self.cellDegrees
+        cosine = math.cos(math.radians(min(abs(lat) + (ring + 1) * self.cellDegrees, 90.0)))
+        longitudeBound = 2 * EARTH_RADIUS_KM * math.asin(min(cosine * math.sin(math.radians(min(degrees, 180.0)) / 2),
+                                                             1.0))
+        return min(degrees * KM_PER_DEGREE, longitudeBound)
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> List[Tuple[int, float]]:
+        """Finds the k points closest to (lat, lng).
+
+        The rings of cells around the cell of the query are searched until the k-th closest point found so far is
+        closer than every cell that wasn't searched yet.
+
+        Returns:
+            a list of (key, distanceKm) of at most k points, sorted by the distance
+        """
+        k = min(k, len(self.keys))
+        if k <= 0:
+            return []
+        row, column = self._cellOf(lat, lng)
+        maximumRing = max(abs(row - self.rowRange[0]), abs(row - self.rowRange[1]),
+                          abs(column - self.columnRange[0]), abs(column - self.columnRange[1]))
+        positions = [np.zeros(0, dtype=np.int64)]
+        distances = [np.zeros(0)]
+        for ring in range(maximumRing + 1):
+            if ring == 0:
+                cells = [(row, column)]
+            else:
+                cells = [(row + dr, column + dc) for dr in range(-ring, ring + 1)
+                         for dc in ((-ring, ring) if abs(dr) != ring else range(-ring, ring + 1))]
+            found = self._points(cells)
+            positions.append(found)
+            distances.append(haversineKm(lat, lng, self.lat[found], self.lng[found]))
+            count = sum(len(p) for p in positions)
+            if count >= k:
+                allDistances = np.concatenate(distances)
+                kth = np.partition(allDistances, k - 1)[k - 1]
+                if kth <= self._ringBoundKm(lat, ring):
+                    break
+        positions = np.concatenate(positions)
+        distances = np.concatenate(distances)
+        return self._sorted(positions, distances)[:k]
+
+
+if __name__ == '__main__':
+    import time
+
+    import utils
+    from cli import _readGroups
+
+    parser = argparse.ArgumentParser(description="Converts a geocoded csv file into a geocode store and queries it")
+    parser.add_argument("--input", help="the geocoded csv file to convert, e.g. restaurants_geocoded.csv")
+    parser.add_argument("--output", default=utils.PATH_PREFIX + "/geocodes",
+                        help="the directory of the geocode store, default = data/work/geocodes")
+    parser.add_argument("--groups", help="the groups file of the dedupe subcommand of cli.py, so every restaurant "
+                                         "is only indexed once")
+    parser.add_argument("--near", type=float, nargs=2, metavar=("LAT", "LNG"), help="the location to query")
+    parser.add_argument("--radius", type=float, help="finds all restaurants within this many km of --near")
+    parser.add_argument("--k", type=int, default=5, help="finds the k closest restaurants to --near, default = 5")
+    args = parser.parse_args()
+
+    if args.input is not None:
+        converted = GeocodeStore.convert(args.input)
+        converted.save(args.output)
+        print("Written the geocodes of {} rows ({} bytes) to '{}'.".format(len(converted), converted.nbytes,
+                                                                           args.output))
+    if args.near is not None:
+        geocodes = GeocodeStore.load(args.output)
+        index = SpatialIndex.fromStore(geocodes, _readGroups(args.groups) if args.groups else None)
+        start = time.perf_counter()
+        results = index.within(*args.near, args.radius) if args.radius is not None \
+            else index.nearest(*args.near, args.k)
+        seconds = time.perf_counter() - start
+        for key, distance in results:
+            print("{:>8} {:8.3f} km  {}".format(key, distance, geocodes.string("formattedAddress",
+                                                                                geocodes.position(key))))
+        print("{} results in {:.1f} us".format(len(results), seconds * 1e6))
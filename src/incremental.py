@@ -0,0 +1,202 @@
+import bisect
+import glob
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+import textdistance as td
+
+import blocking
+import main
+import utils
+from instrumentation import RECORDER
+
+
+class ResolvedStore:
+    """
+    The resolved clusters of all rows deduplicated so far, together with the per row match features
+    (the preprocessed rows) and the blocking index, so new rows only have to be compared to the rows
+    sharing a blocking key with them.
+
+    Adding all rows at once gives the same result as main.deduplicate, adding them in several batches
+    gives the same result as a single main.deduplicate run on the combined rows.
+
+    The work of an add only depends on the size of the delta and the rows and clusters it touches, not on the size of
+    the store: the rows are kept in one segment per add, every id knows its cluster and the clusters are kept ordered
+    by the position of their first row. The store is saved as an append-only list of segments, each with its rows and
+    the duplicate pairs found when it was added.
+    """
+    META_FILE = "resolved_store.json"
+    SEGMENT_FILES = "resolved_segment_{:06d}.pkl"
+    # the single files of stores saved by former versions, which can still be loaded
+    ROWS_FILE = "resolved_rows.pkl"
+    CLUSTERS_FILE = "resolved_clusters.json"
+
+    def __init__(self, blockingKeys: Iterable[str] = blocking.DEFAULT_BLOCKING_KEYS):
+        blockingKeys = tuple(blockingKeys)
+        for blockingKey in blockingKeys:
+            if blockingKey not in blocking.ROW_LOCAL_BLOCKING_KEYS:
+                raise ValueError("Blocking key '{}' depends on the whole dataset and can't be used incrementally"
+                                 .format(blockingKey))
+        self.blockingKeys = blockingKeys
+        # the preprocessed rows in segments with their first positions and the duplicate pairs found by every add
+        self.segments: List[pd.DataFrame] = []
+        self.offsets: List[int] = []
+        self.segmentPairs: List[List[Tuple[int, int]]] = []
+        # the first position of the rows of every add, the segments are concatenated when rows is read
+        self.segmentStarts: List[int] = []
+        self.size = 0
+        # blocking key name -> key -> positions of the rows with that key
+        self.index: Dict[str, Dict[Any, List[int]]] = {k: {} for k in blockingKeys}
+        self.positions: Dict[int, int] = {}
+        # disjoint sets of ids keyed by the position of their first row, the keys in ascending order and the key of
+        # the cluster of every id, which isn't a singleton
+        self.clusterSets: Dict[int, Set[int]] = {}
+        self.clusterOrder: List[int] = []
+        self.clusterOf: Dict[int, int] = {}
+        self._rows: Optional[pd.DataFrame] = None
+        # the directory and the number of segments last saved there
+        self._saved: Tuple[Optional[str], int] = (None, 0)
+
+    @property
+    def rows(self) -> pd.DataFrame:
+        """All stored rows, concatenated when they are read the first time after an add."""
+        if self._rows is None:
+            self._rows = pd.concat(self.segments, ignore_index=True) if self.segments else pd.DataFrame()
+            self.segments = [self._rows]
+            self.offsets = [0]
+        return self._rows
+
+    @property
+    def clusters(self) -> List[Set[int]]:
+        """The disjoint sets of ids, ordered by the position of their first row, just like main.deduplicate."""
+        return [self.clusterSets[key] for key in self.clusterOrder]
+
+    def _append(self, delta: pd.DataFrame) -> List[Tuple[int, int]]:
+        # stores the rows of a new segment and returns the pairs of positions sharing a blocking key with them
+        offset = self.size
+        pairs = set()
+        for blockingKey in self.blockingKeys:
+            blocks = self.index[blockingKey]
+            for position, keys in enumerate(blocking.BLOCKING_KEYS[blockingKey](delta), offset):
+                for key in blocking.keysOf(keys):
+                    block = blocks.setdefault(key, [])
+                    pairs.update((other, position) for other in block)
+                    block.append(position)
+        self.segments.append(delta)
+        self.offsets.append(offset)
+        self.segmentStarts.append(offset)
+        self.size += len(delta)
+        self._rows = None
+        self.positions.update((rowId, position) for position, rowId in enumerate(delta.id.tolist(), offset))
+        return sorted(pairs)
+
+    def _gather(self, positions: np.ndarray) -> pd.DataFrame:
+        # the rows at the given ascending positions, only the segments containing them are read
+        segments = np.searchsorted(np.array(self.offsets), positions, side="right") - 1
+        pieces = [self.segments[s].iloc[positions[segments == s] - self.offsets[s]] for s in np.unique(segments)]
+        RECORDER.count("storeRowsGathered", len(positions))
+        return pd.concat(pieces, ignore_index=True) if pieces else self.segments[-1].iloc[:0]
+
+    def _merge(self, newDupeSets: List[Set[int]]):
+        # merges the new pairs with the clusters they touch, all other clusters stay as they are
+        touched = {i for dupeSet in newDupeSets for i in dupeSet}
+        affected = {self.clusterOf[i] for i in touched if i in self.clusterOf}
+        RECORDER.count("storeClustersMerged", len(affected))
+        merged = [set(c) for c in utils.merge_common([self.clusterSets[key] for key in affected] + newDupeSets)]
+        for key in affected:
+            del self.clusterSets[key]
+            del self.clusterOrder[bisect.bisect_left(self.clusterOrder, key)]
+        for cluster in merged:
+            key = min(self.positions[i] for i in cluster)
+            self.clusterSets[key] = cluster
+            bisect.insort(self.clusterOrder, key)
+            self.clusterOf.update((i, key) for i in cluster)
+
+    def add(self, df: pd.DataFrame, distanceAlgorithm=td.jaccard, minTokenDistance=0.5, minTextDistance=0.9,
+            workers: int = 1) -> int:
+        """Deduplicates the given new rows against themselves and all stored rows and updates the clusters.
+
+        Args:
+            df: a fresh pandas DataFrame with the new rows, their ids have to continue the ids of the stored rows
+            distanceAlgorithm: to use, default td.jaccard
+            minTokenDistance: to use, default 0.5
+            minTextDistance: to use, default 0.9
+            workers: the number of processes used to evaluate the pairs, only used with td.jaccard, default = 1
+
+        Returns:
+            the number of new duplicate pairs that were found
+        """
+        delta = main.preProcess(df.reset_index(drop=True))
+        pairs = self._append(delta)
+        if utils.config["printBlockingStats"]:
+            print("Blocking generated {} candidate pairs for {} new rows".format(len(pairs), len(delta)))
+
+        # only the rows that are part of a candidate pair are needed for matching
+        involved = np.unique(np.array(pairs, dtype=np.int64).reshape(-1, 2))
+        left = np.searchsorted(involved, np.array([i for i, _ in pairs], dtype=np.int64))
+        right = np.searchsorted(involved, np.array([j for _, j in pairs], dtype=np.int64))
+        subset = self._gather(involved)
+        same = main.matchPairs(subset, left, right, distanceAlgorithm, minTokenDistance, minTextDistance, workers)
+        ids = subset.id.tolist()
+        newPairs = [(ids[i], ids[j]) for i, j in zip(left[same].tolist(), right[same].tolist())]
+        self.segmentPairs.append(newPairs)
+        self._merge([set(p) for p in newPairs])
+        return len(newPairs)
+
+    def result(self) -> Tuple[pd.DataFrame, List[Set[int]]]:
+        """Returns the same tuple (df, recognizedDupeSets) as main.deduplicate for all stored rows."""
+        clusters = self.clusters
+        return main.groupDuplicates(self.rows.copy(), clusters), [set(c) for c in clusters]
+
+    def save(self, path: str):
+        """Saves the store into the directory path, only the segments added since the last save to it are written."""
+        os.makedirs(path, exist_ok=True)
+        savedPath, saved = self._saved
+        if savedPath != os.path.abspath(path):
+            saved = 0
+            for file in glob.glob(os.path.join(path, "resolved_segment_*.pkl")):
+                os.remove(file)
+            with open(os.path.join(path, ResolvedStore.META_FILE), "w") as file:
+                file.write(json.dumps({"blockingKeys": list(self.blockingKeys)}))
+        for number in range(saved, len(self.segmentPairs)):
+            pd.to_pickle({"rows": self._segmentRows(number), "pairs": self.segmentPairs[number]},
+                         os.path.join(path, ResolvedStore.SEGMENT_FILES.format(number)))
+        self._saved = (os.path.abspath(path), len(self.segmentPairs))
+
+    def _segmentRows(self, number: int) -> pd.DataFrame:
+        # the rows of the number-th add, which may already be part of a concatenated segment
+        start = self.segmentStarts[number]
+        end = self.segmentStarts[number + 1] if number + 1 < len(self.segmentStarts) else self.size
+        return self._gather(np.arange(start, end, dtype=np.int64))
+
+    @staticmethod
+    def load(path: str) -> "ResolvedStore":
+        """Loads a store previously saved into the directory path."""
+        if not os.path.exists(os.path.join(path, ResolvedStore.META_FILE)):
+            return ResolvedStore._loadSingleFiles(path)
+        with open(os.path.join(path, ResolvedStore.META_FILE), "r") as file:
+            store = ResolvedStore(json.loads(file.read())["blockingKeys"])
+        for file in sorted(glob.glob(os.path.join(path, "resolved_segment_*.pkl"))):
+            segment = pd.read_pickle(file)
+            store._replay(segment["rows"], segment["pairs"])
+        store._saved = (os.path.abspath(path), len(store.segmentPairs))
+        return store
+
+    def _replay(self, rows: pd.DataFrame, pairs: List[Tuple[int, int]]):
+        # adds a saved segment without matching its rows again
+        self._append(rows)
+        self.segmentPairs.append([tuple(p) for p in pairs])
+        self._merge([set(p) for p in pairs])
+
+    @staticmethod
+    def _loadSingleFiles(path: str) -> "ResolvedStore":
+        saved = pd.read_pickle(os.path.join(path, ResolvedStore.ROWS_FILE))
+        with open(os.path.join(path, ResolvedStore.CLUSTERS_FILE), "r") as file:
+            clusters = [set(c) for c in json.loads(file.read())]
+        store = ResolvedStore(saved["blockingKeys"])
+        # every cluster is given by the pairs of its smallest id with all other ids
+        store._replay(saved["rows"], [(min(c), i) for c in clusters for i in sorted(c) if i != min(c)])
+        return store
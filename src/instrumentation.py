@@ -0,0 +1,185 @@
+import cProfile
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, the peak memory is not measured there
+    resource = None
+
+
+def peakRssMb() -> float:
+    """Returns the peak resident set size of the current process in megabytes, or NaN if it can't be measured.
+
+    This is the high-water mark of the whole lifetime of the process, the memory of its worker processes
+    (RUSAGE_CHILDREN) is not included.
+    """
+    if resource is None:
+        return float("nan")
+    # ru_maxrss is in kilobytes on linux and in bytes on macOS
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxRss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def currentRssMb() -> float:
+    """Returns the current resident set size of this process in megabytes, or NaN if it can't be measured."""
+    try:
+        # only available on linux, the second field is the resident set size in pages
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return float("nan")
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _maximum(recorded: float, value: float) -> float:
+    # the memory is NaN, if it can't be measured on this platform
+    return value if math.isnan(value) else max(recorded, value)
+
+
+class _NullStage:
+    """The stage returned while the recorder is disabled, entering and leaving it does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Recorder:
+    """
+    Records the wall time and memory of the stages of the pipeline, counters and histograms.
+
+    The memory of a stage is measured relative to its entry, as the largest value over all of its calls:
+        rssIncreaseMb: the resident set size at the exit minus the one at the entry, the memory the stage kept
+        peakRssIncreaseMb: how much the stage raised the peak resident set size of the process, 0 if its peak stayed
+            below the peak of an earlier stage
+    Only the memory of this process is measured, the memory used by worker processes is not included.
+
+    Stages can be nested, their name in the report is the path of all enclosing stages joined by "/", e.g.
+    "deduplicate/matchPairs". While the recorder is disabled, stage returns a shared no-op context manager and count
+    and histogram return immediately, so the instrumentation costs a single attribute lookup per call.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.profileStage: Optional[str] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """Forgets everything recorded so far."""
+        with self._lock:
+            self.stages: Dict[str, Dict[str, float]] = {}
+            self.counters: Counter = Counter()
+            self.histograms: Dict[str, Counter] = defaultdict(Counter)
+            self.profile: Optional[cProfile.Profile] = None
+
+    def enable(self, profileStage: Optional[str] = None):
+        """Enables the recording.
+
+        Args:
+            profileStage: the name or path of a stage, which is profiled with cProfile whenever it runs, default = None
+        """
+        self.enabled = True
+        self.profileStage = profileStage
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, name: str):
+        """Returns a context manager, that records the wall time and memory of the enclosed code as stage name."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name: str):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(name)
+        path = "/".join(stack)
+        profile = self._startProfile(name, path)
+        startRss = currentRssMb()
+        startPeakRss = peakRssMb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            stack.pop()
+            rssIncrease = currentRssMb() - startRss
+            peakRssIncrease = peakRssMb() - startPeakRss
+            with self._lock:
+                stage = self.stages.setdefault(path, {"calls": 0, "seconds": 0.0, "rssIncreaseMb": 0.0,
+                                                      "peakRssIncreaseMb": 0.0})
+                stage["calls"] += 1
+                stage["seconds"] += seconds
+                stage["rssIncreaseMb"] = _maximum(stage["rssIncreaseMb"], rssIncrease)
+                stage["peakRssIncreaseMb"] = _maximum(stage["peakRssIncreaseMb"], peakRssIncrease)
+
+    def _startProfile(self, name: str, path: str) -> Optional[cProfile.Profile]:
+        if self.profileStage not in (name, path):
+            return None
+        with self._lock:
+            if self.profile is None:
+                self.profile = cProfile.Profile()
+            profile = self.profile
+        try:
+            profile.enable()
+        except ValueError:
+            # another thread or an enclosing stage with the same name is already being profiled
+            return None
+        return profile
+
+    def count(self, name: str, value: int = 1):
+        """Adds value to the counter name."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += int(value)
+
+    def histogram(self, name: str, values: Iterable[int]):
+        """Adds every value to the histogram name, e.g. the sizes of all clusters."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.histograms[name].update(int(v) for v in values)
+
+    def report(self) -> Dict:
+        """Returns everything recorded so far as a json serializable dict."""
+        with self._lock:
+            return {
+                "stages": {path: dict(stage) for path, stage in self.stages.items()},
+                "counters": dict(self.counters),
+                "histograms": {name: {str(k): v for k, v in sorted(histogram.items())}
+                               for name, histogram in self.histograms.items()},
+                "peakRssMb": peakRssMb(),
+            }
+
+    def writeReport(self, path: str, profilePath: Optional[str] = None):
+        """Writes the report as json to path and the cProfile statistics of the profiled stage to profilePath."""
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=2)
+        if profilePath is not None and self.profile is not None:
+            self.profile.dump_stats(profilePath)
+
+
+# the recorder used by main.py, clean.py and utils.py, it is disabled unless it is enabled explicitly
+RECORDER = Recorder()
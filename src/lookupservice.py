@@ -0,0 +1,263 @@
+"""Long-running service, which answers if incoming restaurant listings match one of the resolved clusters.
+
+MatchIndex keeps the preprocessed rows of a incremental.ResolvedStore in memory together with its phone and city +
+street number blocking index, so a listing is only compared to the few rows sharing a key with it, by the rules of
+main.areRowsSame. These two keys cover every pair areRowsSame can accept, so a lookup finds the same matches as adding
+the listing to the store would.
+
+MatchService serves the index over HTTP with asyncio. Concurrent requests are queued and matched together in
+micro-batches, so the listings of a batch are preprocessed and blocked at once:
+
+    POST /match  {"name": ..., "address": ..., "city": ..., "phone": ...}  or  [{...}, {...}]
+    GET /health
+
+Usage (from the src directory):
+    python lookupservice.py --store ../data/work/store --port 8080
+"""
+import argparse
+import asyncio
+import json
+from collections import Counter, namedtuple
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import textdistance as td
+
+import blocking
+import main
+import preprocessing
+from incremental import ResolvedStore
+from instrumentation import RECORDER
+
+# the raw columns of a listing, missing ones are NaN
+QUERY_COLUMNS = ["id", "name", "address", "city", "phone", "type"]
+
+
+class MatchIndex:
+    """
+    The preprocessed rows of the resolved clusters and their blocking index, read-only after it was built.
+    """
+
+    def __init__(self, store: ResolvedStore, distanceAlgorithm=td.jaccard, minTokenDistance=0.5,
+                 minTextDistance=0.9):
+        """
+        Args:
+            store: the resolved store, its rows, index and clusters are shared, not copied
+            distanceAlgorithm: to use, default td.jaccard
+            minTokenDistance: to use, default 0.5
+            minTextDistance: to use, default 0.9
+        """
+        self.blockingKeys = store.blockingKeys
+        self.index = store.index
+        self.rows = list(store.rows.itertuples(index=False))
+        self.Listing = namedtuple("Listing", list(store.rows.columns) if len(store.rows.columns)
+                                  else QUERY_COLUMNS + ["cname", "caddress"])
+        # the service sees new values with every listing, the memo of the pipeline is bounded by its memoLimit
+        self.pipeline = preprocessing.Pipeline()
+        self.ids = store.rows.id.tolist() if len(store.rows) else []
+        # the cluster key of every id is the smallest id of its cluster, like export.clusterKeys
+        self.clusterOf = {i: min(cluster) for cluster in store.clusters for i in cluster}
+        self.distanceAlgorithm = distanceAlgorithm
+        self.minTokenDistance = minTokenDistance
+        self.minTextDistance = minTextDistance
+
+    def __len__(self):
+        return len(self.rows)
+
+    @staticmethod
+    def fromFrame(df: pd.DataFrame) -> "MatchIndex":
+        """Deduplicates the given fresh DataFrame into a new ResolvedStore and indexes it."""
+        store = ResolvedStore()
+        store.add(df)
+        return MatchIndex(store)
+
+    def normalize(self, record: Dict[str, Any]) -> Any:
+        """Preprocesses a raw listing like main.preProcess, into a namedtuple like the stored rows."""
+        # None is missing just like NaN, so two missing phones are never equal
+        values = {c: np.nan if record.get(c) is None else record.get(c) for c in QUERY_COLUMNS}
+        values.update((column, self.pipeline.normalizeValue(column, values[source]))
+                      for column, (source, _, _, _) in self.pipeline.columns.items())
+        return self.Listing(**{c: values.get(c, np.nan) for c in self.Listing._fields})
+
+    def _same(self, r1: Any, r2: Any) -> bool:
+        # main.areRowsSame compares the names with the string methods, rows without a name never match, like
+        # features.areRowsSameBatch treats them
+        if not isinstance(r1.cname, str) or not isinstance(r2.cname, str):
+            return False
+        return main.areRowsSame(r1, r2, self.distanceAlgorithm, self.minTokenDistance, self.minTextDistance)
+
+    def match(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Matches the given raw listings against the stored rows.
+
+        Args:
+            records: dicts with the raw values of the listings, missing columns and None values are NaN
+
+        Returns:
+            a list with a dict for every listing:
+                matched is True if the listing matches at least one stored row
+                clusters are the sorted cluster keys of the matched rows, more than one if the listing would merge
+                    several clusters
+                ids are the sorted ids of the matched rows
+                candidates is the number of stored rows the listing was compared to
+        """
+        candidates: List[set] = []
+        queries = [self.normalize(record) for record in records]
+        for query in queries:
+            positions = set()
+            for blockingKey in self.blockingKeys:
+                for key in blocking.keysOf(blocking.ROW_KEYS[blockingKey](query)):
+                    positions.update(self.index[blockingKey].get(key, ()))
+            candidates.append(positions)
+        results = []
+        for query, positions in zip(queries, candidates):
+            ids = sorted(self.ids[p] for p in positions if self._same(self.rows[p], query))
+            results.append({"matched": bool(ids), "clusters": sorted({self.clusterOf.get(i, i) for i in ids}),
+                            "ids": ids, "candidates": len(positions)})
+        RECORDER.count("lookupQueries", len(records))
+        RECORDER.count("lookupCandidates", sum(map(len, candidates)))
+        return results
+
+
+class MatchService:
+    """
+    Serves a MatchIndex over HTTP/1.1 with keep-alive.
+
+    The handlers of the connections only parse the requests and put them into a queue. A single batcher takes all
+    queued requests, up to maxBatch listings, matches them at once and resolves the futures of their handlers.
+    """
+
+    def __init__(self, index: MatchIndex, maxBatch: int = 256):
+        """
+        Args:
+            index: to match the listings against
+            maxBatch: the maximum number of listings matched at once, bounds the latency a batch adds, default = 256
+        """
+        self.index = index
+        self.maxBatch = maxBatch
+        self.queue: Optional[asyncio.Queue] = None
+        self._batcherTask: Optional[asyncio.Future] = None
+        self.batchSizes: Counter = Counter()
+
+    async def match(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Queues the listings for the next batch and waits for their results."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((records, future))
+        return await future
+
+    async def _batcher(self):
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            while size < self.maxBatch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                size += len(batch[-1][0])
+            self.batchSizes[size] += 1
+            try:
+                results = self.index.match([r for records, _ in batch for r in records])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            start = 0
+            for records, future in batch:
+                if not future.done():
+                    future.set_result(results[start:start + len(records)])
+                start += len(records)
+
+    def _respond(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        # returns the status and the json of the response, or a coroutine of the json for the queued matches
+        if method == "GET" and path == "/health":
+            return 200, {"rows": len(self.index), "clusters": len(set(self.index.clusterOf.values()))}
+        if method != "POST" or path != "/match":
+            return 404, {"error": "unknown endpoint {} {}".format(method, path)}
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError as e:
+            return 400, {"error": "invalid json: {}".format(e)}
+        single = isinstance(payload, dict)
+        records = [payload] if single else payload
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            return 400, {"error": "expected a listing or a list of listings"}
+
+        async def matched():
+            results = await self.match(records)
+            return results[0] if single else results
+
+        return 200, matched()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine:
+                    break
+                method, path, version = requestLine.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, response = self._respond(method, path, body)
+                if asyncio.iscoroutine(response):
+                    try:
+                        response = await response
+                    except Exception as e:
+                        status, response = 500, {"error": str(e)}
+                data = json.dumps(response).encode("utf-8")
+                keepAlive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                             "Connection: {}\r\n\r\n".format(status, {200: "OK", 400: "Bad Request",
+                                                                     404: "Not Found"}.get(status, "Error"),
+                                                             len(data), "keep-alive" if keepAlive else "close")
+                             .encode("latin-1") + data)
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.AbstractServer:
+        """Starts the batcher and the server in the running event loop, port 0 picks a free port."""
+        self.queue = asyncio.Queue()
+        self._batcherTask = asyncio.ensure_future(self._batcher())
+        return await asyncio.start_server(self._handle, host, port)
+
+
+def loadIndex(storePath: Optional[str] = None, inputPath: Optional[str] = None) -> MatchIndex:
+    """Loads the resolved store of main.py --store, or deduplicates the given tsv file, default = restaurants.tsv."""
+    if storePath is not None:
+        return MatchIndex(ResolvedStore.load(storePath))
+    import utils
+    return MatchIndex.fromFrame(pd.read_csv(inputPath or utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t'))
+
+
+if __name__ == '__main__':
+    import utils
+
+    parser = argparse.ArgumentParser(description="Serves match lookups of single listings against the resolved "
+                                                 "clusters")
+    parser.add_argument("--store", help="directory of the resolved store of main.py --store, default = the clusters "
+                                        "of --input are resolved at startup")
+    parser.add_argument("--input", help="the tsv file resolved at startup without --store, default = restaurants.tsv")
+    parser.add_argument("--host", default="127.0.0.1", help="default = 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="default = 8080")
+    parser.add_argument("--max-batch", type=int, default=256, help="listings matched at once, default = 256")
+    args = parser.parse_args()
+
+    utils.config["printBlockingStats"] = False
+    service = MatchService(loadIndex(args.store, args.input), args.max_batch)
+
+    async def serve():
+        server = await service.start(args.host, args.port)
+        print("Serving {} rows on http://{}:{}".format(len(service.index), args.host, args.port))
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
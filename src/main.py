@@ -1,37 +1,23 @@
-from itertools import combinations
-from typing import List, Set, Tuple
+import argparse
+from typing import Iterable, List, Optional, Set, Tuple
 
+import numpy as np
 import pandas as pd
 import textdistance as td
 
+import blocking
+import features
+import parallel
+import preprocessing
+import survivorship
 import utils
-
-
-class Regexes:
-    """
-    Class that contains all regular expressions used in the data pre processing.
-    """
-    CITY_REPLACE_DICT = {
-        r"w. hollywood": "west hollywood",
-        r"new york city": "new york",
-        r"west la": "los angeles",
-        r"la": "los angeles"
-    }
-    ADDRESS_REPLACE_DICT = {
-        r"(ave|av)": "ave",
-        r"(blvd|blv)": "blvd",
-        r"(sts)": "st",
-        r"s\.": "s",
-        r" ?between.*$": ""
-    }
-    TYPE_REMOVE_REGEX = r"^.*[0-9] ?"
-    BRACKETS_REGEX = r" ?\(.*\)"
-    NON_ALPHA_OR_SPACE_REGEX = r"[^a-zA-Z0-9 ]"
-    NON_ALPHA_REGEX = r"[^a-zA-Z0-9]"
+from instrumentation import RECORDER
+from preprocessing import Regexes
+from recordstore import RecordStore
 
 
 def preProcess(df: pd.DataFrame) -> pd.DataFrame:
-    """Pre processes the given DataFrame by applying a lot of Regex replacements.
+    """Pre processes the given DataFrame by applying a lot of Regex replacements, see preprocessing.preProcess.
 
     Args:
         df: a pandas DataFrame to pre process
@@ -39,23 +25,7 @@ def preProcess(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         a pre processed pandas DataFrame
     """
-
-    for k, v in Regexes.ADDRESS_REPLACE_DICT.items():
-        df.address = df.address.str.replace(k, v, case=False, regex=True)
-    for k, v in Regexes.CITY_REPLACE_DICT.items():
-        df.city = df.city.str.replace(k, v, case=False, regex=True)
-    df.type = df.type.fillna("")
-    df.type = df.type.str.replace(Regexes.BRACKETS_REGEX, '', case=False) \
-        .str.replace(Regexes.TYPE_REMOVE_REGEX, "", case=False)
-    df.phone = df.phone.str.replace(Regexes.NON_ALPHA_REGEX, '', case=False)
-    df.name = df.name.str.replace(Regexes.BRACKETS_REGEX, '', case=False)
-
-    df["cname"] = df.name.copy()
-    df["caddress"] = df.address.copy()
-    df.cname = df.cname.str.replace(Regexes.NON_ALPHA_OR_SPACE_REGEX, '', case=False) \
-        .str.replace('  the$', '', case=False)
-    df.caddress = df.caddress.str.replace(Regexes.NON_ALPHA_OR_SPACE_REGEX, '', case=False)
-    return df
+    return preprocessing.preProcess(df)
 
 
 def areRowsSame(r1, r2, distanceAlgorithm=td.jaccard, minTokenDistance=0.5, minTextDistance=0.9) -> bool:
@@ -93,7 +63,61 @@ def areRowsSame(r1, r2, distanceAlgorithm=td.jaccard, minTokenDistance=0.5, minT
         return False
 
 
-def deduplicate(df: pd.DataFrame, distanceAlgorithm=td.jaccard, minTokenDistance=0.5, minTextDistance=0.9) \
+def matchPairs(df: pd.DataFrame, left: np.ndarray, right: np.ndarray, distanceAlgorithm=td.jaccard,
+               minTokenDistance=0.5, minTextDistance=0.9, workers: int = 1,
+               store: Optional[RecordStore] = None) -> np.ndarray:
+    """Evaluates areRowsSame for the given pairs of row positions.
+
+    Args:
+        df: a preprocessed pandas DataFrame
+        left: positions of the first rows of the pairs
+        right: positions of the second rows of the pairs
+        distanceAlgorithm: to use, default td.jaccard
+        minTokenDistance: to use, default 0.5
+        minTextDistance: to use, default 0.9
+        workers: the number of processes used to evaluate the pairs, only used with td.jaccard, default = 1
+        store: the already built RecordStore of df, only used with td.jaccard, default = None
+
+    Returns:
+        a boolean mask, which is True for every pair (left[i], right[i]) that should be considered the same
+    """
+    RECORDER.count("pairsScored", len(left))
+    # the scored pairs per algorithm, named after the function or, for algorithm objects like td.jaccard, their class
+    algo = getattr(distanceAlgorithm, "__name__", type(distanceAlgorithm).__name__)
+    RECORDER.count("pairsScored." + algo.lower(), len(left))
+    if distanceAlgorithm is td.jaccard:
+        if store is None:
+            store = RecordStore(df)
+        # the rules for td.jaccard can be evaluated for all pairs at once, split into chunks for the workers
+        chunks = [(l, r, minTokenDistance, minTextDistance)
+                  for l, r in parallel.splitPairs(left, right, parallel.chunkSize(len(left), workers))]
+        return np.concatenate([np.zeros(0, dtype=bool)] + parallel.mapChunks(
+            features.areRowsSameBatch, store, chunks, workers))
+    else:
+        rows = list(df.itertuples())
+        return np.array([areRowsSame(rows[i], rows[j], distanceAlgorithm, minTokenDistance, minTextDistance)
+                         for i, j in zip(left, right)], dtype=bool)
+
+
+def groupDuplicates(df: pd.DataFrame, mergedDupeSets: List[Set[int]]) -> pd.DataFrame:
+    """Labels the rows of the given preprocessed DataFrame by the sets of duplicate ids and flags the canonical record
+    of every group, see survivorship.survive.
+
+    Args:
+        df: a preprocessed pandas DataFrame, it isn't changed
+        mergedDupeSets: disjoint sets of ids, the position in the list is used as group identifier
+
+    Returns:
+        the members view, every row with its group and a canonical flag, ordered by the group. The canonical view is
+        df[df.canonical]
+    """
+    members, _ = survivorship.survive(df, mergedDupeSets)
+    return members
+
+
+def deduplicate(df: pd.DataFrame, distanceAlgorithm=td.jaccard, minTokenDistance=0.5, minTextDistance=0.9,
+                blockingKeys: Optional[Iterable[blocking.BlockingKey]] = blocking.DEFAULT_BLOCKING_KEYS,
+                workers: int = 1, approximate: bool = False) \
         -> Tuple[pd.DataFrame, List[Set[int]]]:
     """Deduplicates the given pandas DataFrame completely
 
@@ -102,35 +126,60 @@ def deduplicate(df: pd.DataFrame, distanceAlgorithm=td.jaccard, minTokenDistance
         distanceAlgorithm: to use, default td.jaccard
         minTokenDistance: to use, default 0.5
         minTextDistance: to use, default 0.9
+        blockingKeys: the keys used to generate candidate pairs, see blocking.candidatePairs.
+            If None, all pairs are compared. default = blocking.DEFAULT_BLOCKING_KEYS
+        workers: the number of processes used to evaluate the pairs, only used with td.jaccard, default = 1
+        approximate: if only the candidate pairs with the same phone or names proposed as similar by a MinHash-LSH
+            are evaluated, see features.minHashCandidates. Only used with td.jaccard, default = False
 
     Returns:
         a tuple of (df: DataFrame, recognizedDupeSets: List[Set[int]]).
-            df is the cleaned DataFrame, grouped and aggregated.
+            df is the cleaned DataFrame, with the group of every row and its canonical records flagged,
+                see groupDuplicates.
             recognizedDupeSets is a list of sets that contain the ids.
     """
-    df = preProcess(df)
-    recognizedDupeSets = []
-    for twoRows in combinations(df.itertuples(), 2):
-        row1 = twoRows[0]
-        row2 = twoRows[1]
-        if areRowsSame(row1, row2, distanceAlgorithm, minTokenDistance, minTextDistance):
-            recognizedDupeSets.append({row1.id, row2.id})
-
-    # merge common elements, isn't needed, but to make it future-proof
-    mergedDupeSets = list(utils.merge_common(recognizedDupeSets))
-    # convert back to a list of sets
-    mergedDupeSets = list(map(lambda x: set(x), mergedDupeSets))
-
-    # give every row a unique negative identifier
-    df["group"] = df["id"].copy().apply(lambda x: -x)
-    for idx, dupeset in enumerate(mergedDupeSets):
-        # assign each set of duplicates a new unique positive identifier
-        for di in dupeset:
-            df.at[di-1, "group"] = idx
-
-    # group by the identifier
-    df = df.groupby(["group"]).agg(set).reset_index()
-    return df, mergedDupeSets
+    with RECORDER.stage("deduplicate"):
+        with RECORDER.stage("preProcess"):
+            df = preProcess(df)
+        with RECORDER.stage("candidatePairs"):
+            if blockingKeys is None:
+                left, right = np.triu_indices(len(df), 1)
+                prunedCount = 0
+            else:
+                pairs, prunedCount = blocking.candidatePairs(df, blockingKeys)
+                if utils.config["printBlockingStats"]:
+                    print("Blocking generated {} candidate pairs, pruned {} of {} pairs"
+                          .format(len(pairs), prunedCount, len(pairs) + prunedCount))
+                left = np.array([i for i, _ in pairs], dtype=np.int64)
+                right = np.array([j for _, j in pairs], dtype=np.int64)
+        RECORDER.count("pairsGenerated", len(left))
+        RECORDER.count("pairsPruned", prunedCount)
+
+        store = None
+        if approximate and distanceAlgorithm is td.jaccard:
+            with RECORDER.stage("minHash"):
+                store = RecordStore(df)
+                selected = features.minHashCandidates(store, left, right)
+                left, right = left[selected], right[selected]
+            RECORDER.count("pairsPrunedMinHash", int((~selected).sum()))
+
+        with RECORDER.stage("matchPairs"):
+            same = matchPairs(df, left, right, distanceAlgorithm, minTokenDistance, minTextDistance, workers,
+                              store)
+        ids = df.id.tolist()
+        recognizedDupeSets = [{ids[i], ids[j]} for i, j in zip(left[same], right[same])]
+        RECORDER.count("matches", len(recognizedDupeSets))
+
+        with RECORDER.stage("mergeCommon"):
+            # merge common elements, isn't needed, but to make it future-proof
+            mergedDupeSets = list(utils.merge_common(recognizedDupeSets))
+            # convert back to a list of sets
+            mergedDupeSets = list(map(lambda x: set(x), mergedDupeSets))
+        RECORDER.histogram("clusterSize", map(len, mergedDupeSets))
+
+        with RECORDER.stage("groupDuplicates"):
+            grouped = groupDuplicates(df, mergedDupeSets)
+    return grouped, mergedDupeSets
 
 
 def simpleCompareToGold(dupes):
@@ -143,14 +192,54 @@ def simpleCompareToGold(dupes):
 
 
 if __name__ == '__main__':
-    originalDf = pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t')
-    cleaned, dupes = deduplicate(originalDf)
+    parser = argparse.ArgumentParser(description="Deduplicates the restaurants.tsv dataset")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes used for matching, default = 1")
+    parser.add_argument("--approximate", action="store_true",
+                        help="only evaluates the pairs with the same phone or names proposed by a MinHash-LSH")
+    parser.add_argument("--store", help="directory of the resolved store, which is created from restaurants.tsv "
+                                        "or updated with the rows of --delta")
+    parser.add_argument("--delta", help="tsv file with new rows to deduplicate against the resolved store")
+    parser.add_argument("--stream", metavar="FILE", help="deduplicates the given tsv file in chunks and writes the group "
+                                                         "of every id into data/work/groups.tsv")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows read at once with --stream, "
+                                                                       "default = 100000")
+    parser.add_argument("--partitions", type=int, default=64, help="partitions of the blocking store with --stream, "
+                                                                   "default = 64")
+    args = parser.parse_args()
+
+    if args.stream is not None:
+        import streaming
+        dupes = streaming.deduplicateStream(args.stream, chunkSize=args.chunk_size, partitions=args.partitions)
+        streaming.writeGroups(args.stream, dupes, utils.PATH_PREFIX + '/groups.tsv', chunkSize=args.chunk_size)
+        # the full rows are never in memory, so the clusters are exported in chunks as ndjson, see export.py
+        if utils.config["prepareUploadJsons"]:
+            import export
+            export.exportFile(args.stream, dupes, utils.PATH_PREFIX + '/export', chunkSize=args.chunk_size)
+            print("Written the clusters as ndjson to '" + utils.PATH_PREFIX + "/export'.")
+        cleaned = None
+    elif args.store is None:
+        originalDf = pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t')
+        cleaned, dupes = deduplicate(originalDf, workers=args.workers, approximate=args.approximate)
+    else:
+        from incremental import ResolvedStore
+        if args.delta is None:
+            store = ResolvedStore()
+            store.add(pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t'), workers=args.workers)
+        else:
+            store = ResolvedStore.load(args.store)
+            store.add(pd.read_csv(args.delta, delimiter='\t'), workers=args.workers)
+        store.save(args.store)
+        cleaned, dupes = store.result()
 
     if utils.config["compareToGold"]:
         print("tp,tn,fp,fn,precision,recall,fscore")
         utils.compareToGold(dupes, printType="csv")
+    if utils.config["comparePairwiseToGold"]:
+        from evaluation import GOLD
+        print("pair_tp,pair_fp,pair_fn,pair_precision,pair_recall,pair_fscore")
+        print(*GOLD.pairwise(dupes), sep=",")
 
-    if utils.config["prepareUploadJsons"]:
+    if utils.config["prepareUploadJsons"] and cleaned is not None:
         utils.prepareUploadJsons(cleaned)
 
     # simpleCompareToGold(dupes)
@@ -0,0 +1,153 @@
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+import utils
+from recordstore import TextColumn
+from simjoin import elementSets
+
+# the hash functions are the upper 32 bits of (a * element + b) modulo 2^64 (multiply-shift hashing)
+_SHIFT = np.uint64(32)
+# the minimum of an empty set, so all empty sets land in the same buckets, like td.jaccard considers them identical
+EMPTY = np.uint64(1 << 32)
+# combines the minima of the rows of a band into one key, collisions only add candidates that are checked exactly
+_BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def parameters(chars: bool = False) -> Tuple[int, int]:
+    """Returns the configured (bands, rows) of the token or character LSH, see utils.config."""
+    if chars:
+        return utils.config["minHashCharBands"], utils.config["minHashCharRows"]
+    return utils.config["minHashTokenBands"], utils.config["minHashTokenRows"]
+
+
+def collisionProbability(similarity: float, bands: int, rows: int) -> float:
+    """The probability, that two sets with the given jaccard similarity share at least one bucket."""
+    return 1 - (1 - similarity ** rows) ** bands
+
+
+def bandKeys(indptr: np.ndarray, elements: np.ndarray, bands: int, rows: int, seed: int = 0) \
+        -> Iterator[np.ndarray]:
+    """Computes the MinHash signature of every set band by band and combines the rows of each band into a key.
+
+    Only the hashes of a single band exist at once, so the memory is bounded by rows times the number of elements,
+    no matter how many bands are used.
+
+    Args:
+        indptr: of the sets in CSR layout, see simjoin.elementSets
+        elements: the elements of every set
+        bands: the number of bands
+        rows: the number of hash functions per band
+        seed: of the random hash functions, default = 0
+
+    Returns:
+        an iterator over the bands, yielding an uint64 array with the key of every set
+    """
+    rand = np.random.RandomState(seed)
+    coefficients = rand.randint(0, 1 << 62, size=(bands, rows, 2), dtype=np.int64).astype(np.uint64)
+    # odd multipliers, so every multiplier is a permutation of the elements modulo 2^64
+    coefficients[:, :, 0] |= np.uint64(1)
+    elements = elements.astype(np.uint64)
+    starts = indptr[:-1]
+    empty = starts == indptr[1:]
+    # reduceat needs valid start positions, the minima of the empty sets are replaced afterwards
+    starts = np.minimum(starts, max(len(elements) - 1, 0))
+    for band in range(bands):
+        key = np.zeros(len(starts), dtype=np.uint64)
+        for a, b in coefficients[band]:
+            if len(elements):
+                minima = np.minimum.reduceat((a * elements + b) >> _SHIFT, starts)
+            else:
+                minima = np.zeros(len(starts), dtype=np.uint64)
+            minima[empty] = EMPTY
+            key = key * _BAND_MULTIPLIER + minima
+        yield key
+
+
+def bucketPairs(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns all pairs of positions with equal keys as (left, right) with left < right."""
+    order = np.argsort(keys, kind="stable")
+    sortedKeys = keys[order]
+    runStarts = np.flatnonzero(np.concatenate([[True], sortedKeys[1:] != sortedKeys[:-1]]))
+    runEnds = np.append(runStarts[1:], len(keys))
+    ends = np.repeat(runEnds, runEnds - runStarts)
+    # every position is paired with all following positions of its run
+    counts = ends - np.arange(len(keys)) - 1
+    firsts = np.repeat(np.arange(len(keys)), counts)
+    seconds = firsts + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    left, right = order[firsts], order[seconds]
+    return np.minimum(left, right), np.maximum(left, right)
+
+
+def lshCandidates(indptr: np.ndarray, elements: np.ndarray, bands: int, rows: int, seed: int = 0) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """Finds the pairs of sets, that share a bucket in at least one band of the MinHash-LSH.
+
+    Two sets with the jaccard similarity s are found with the probability collisionProbability(s, bands, rows).
+
+    Returns:
+        a tuple (left, right) of the positions of the candidate pairs with left < right, sorted by left and right
+    """
+    count = max(len(indptr) - 1, 1)
+    keys = [np.zeros(0, dtype=np.int64)]
+    for bandKey in bandKeys(indptr, elements, bands, rows, seed):
+        left, right = bucketPairs(bandKey)
+        keys.append(np.unique(left * count + right))
+    keys = np.unique(np.concatenate(keys))
+    return keys // count, keys % count
+
+
+def candidatePairs(column: TextColumn, chars: bool = False, bands: Optional[int] = None, rows: Optional[int] = None,
+                   seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Finds the pairs of distinct values of the column, whose token or character jaccard similarity is probably high.
+
+    The signatures are computed on the same multisets as td.jaccard, see simjoin.elementSets, so the collision
+    probability of two values only depends on their td.jaccard similarity.
+
+    Args:
+        column: the TextColumn of the values
+        chars: if the characters instead of the tokens are used, default = False
+        bands: the number of bands, default = the configured value of parameters
+        rows: the number of hash functions per band, default = the configured value of parameters
+        seed: of the random hash functions, default = 0
+
+    Returns:
+        a tuple (left, right) of the positions of the distinct values of the candidate pairs with left < right
+    """
+    defaultBands, defaultRows = parameters(chars)
+    indptr, elements = elementSets(column, chars)
+    return lshCandidates(indptr, elements, bands or defaultBands, rows or defaultRows, seed)
+
+
+def sharesBucket(column: TextColumn, left: np.ndarray, right: np.ndarray, chars: bool = False,
+                 bands: Optional[int] = None, rows: Optional[int] = None, seed: int = 0) -> np.ndarray:
+    """Checks for every pair of distinct values (left[i], right[i]), if they share a bucket in at least one band.
+
+    This equals checking if the pair is one of candidatePairs, but the keys of every band are only compared for the
+    given pairs, so the pairs of large buckets are never generated.
+
+    Args:
+        column: the TextColumn of the values
+        left: positions of the first distinct values of the pairs
+        right: positions of the second distinct values of the pairs
+        chars: if the characters instead of the tokens are used, default = False
+        bands: the number of bands, default = the configured value of parameters
+        rows: the number of hash functions per band, default = the configured value of parameters
+        seed: of the random hash functions, default = 0
+
+    Returns:
+        a boolean mask
+    """
+    defaultBands, defaultRows = parameters(chars)
+    indptr, elements = elementSets(column, chars)
+    # only the signatures of the values inside of the pairs are computed
+    values, positions = np.unique(np.concatenate([left, right]), return_inverse=True)
+    lengths = indptr[values + 1] - indptr[values]
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    elements = elements[np.repeat(indptr[values], lengths) + offsets]
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    left, right = positions[:len(left)], positions[len(left):]
+    shared = np.zeros(len(left), dtype=bool)
+    for bandKey in bandKeys(indptr, elements, bands or defaultBands, rows or defaultRows, seed):
+        shared |= bandKey[left] == bandKey[right]
+    return shared
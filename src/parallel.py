@@ -0,0 +1,61 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Sequence, Tuple
+
+import numpy as np
+
+# the smallest number of pairs per chunk, smaller chunks cost more to send to a worker than to evaluate
+MIN_CHUNK_SIZE = 4096
+
+# the read-only data shared with every worker process, set once per worker by _initWorker
+_shared: Any = None
+
+
+def _initWorker(shared: Any):
+    global _shared
+    _shared = shared
+
+
+def _callWithShared(task: Tuple[Callable, Sequence[Any]]) -> Any:
+    function, chunk = task
+    return function(_shared, *chunk)
+
+
+def splitPairs(left: np.ndarray, right: np.ndarray, chunkSize: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Splits the pair space given as two position arrays into consecutive chunks.
+
+    Args:
+        left: positions of the first elements of the pairs
+        right: positions of the second elements of the pairs
+        chunkSize: the maximum number of pairs per chunk
+
+    Returns:
+        a list of (left, right) tuples, in the same order as the given pairs
+    """
+    return [(left[start:start + chunkSize], right[start:start + chunkSize])
+            for start in range(0, len(left), max(chunkSize, 1))]
+
+
+def chunkSize(pairs: int, workers: int) -> int:
+    """The number of pairs per chunk, so every worker gets about four chunks, but at least MIN_CHUNK_SIZE pairs."""
+    return max(pairs // (max(workers, 1) * 4) + 1, MIN_CHUNK_SIZE)
+
+
+def mapChunks(function: Callable, shared: Any, chunks: List[Sequence[Any]], workers: int = 1) -> List[Any]:
+    """Calls function(shared, *chunk) for every chunk, optionally in a pool of worker processes.
+
+    The shared data is only sent once to every worker process, when it starts, and not once per chunk. The results
+    are returned in the order of the chunks, so they are deterministic and identical to the serial execution.
+
+    Args:
+        function: a module level function (so it can be pickled) taking the shared data and the chunk elements
+        shared: read-only data, that is needed for every chunk
+        chunks: the chunks to process
+        workers: the number of worker processes, 1 or less executes everything in this process, default = 1
+
+    Returns:
+        a list with the result of every chunk
+    """
+    if workers <= 1 or len(chunks) <= 1:
+        return [function(shared, *chunk) for chunk in chunks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(shared,)) as executor:
+        return list(executor.map(_callWithShared, [(function, chunk) for chunk in chunks]))
@@ -0,0 +1,152 @@
+import re
+from typing import Any, Dict, Hashable, List, Optional, Pattern, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class Regexes:
+    """
+    Class that contains all regular expressions used in the data pre processing.
+    """
+    CITY_REPLACE_DICT = {
+        r"w. hollywood": "west hollywood",
+        r"new york city": "new york",
+        r"west la": "los angeles",
+        r"la": "los angeles"
+    }
+    ADDRESS_REPLACE_DICT = {
+        r"(ave|av)": "ave",
+        r"(blvd|blv)": "blvd",
+        r"(sts)": "st",
+        r"s\.": "s",
+        r" ?between.*$": ""
+    }
+    TYPE_REMOVE_REGEX = r"^.*[0-9] ?"
+    BRACKETS_REGEX = r" ?\(.*\)"
+    NON_ALPHA_OR_SPACE_REGEX = r"[^a-zA-Z0-9 ]"
+    NON_ALPHA_REGEX = r"[^a-zA-Z0-9]"
+
+
+Rules = List[Tuple[Pattern, str]]
+# the number of normalized values a Pipeline remembers by default, before its memo is cleared
+MEMO_LIMIT = 1000000
+# the marker of values missing from a memo, None and NaN are valid normalized values
+_MISSING = object()
+
+
+# column -> (source column, column whose normalized value is the input or None, value for missing values or None,
+# (pattern, replacement) rules)
+COLUMNS: Dict[str, Tuple[str, Optional[str], Optional[str], List[Tuple[str, str]]]] = {
+    "address": ("address", None, None, list(Regexes.ADDRESS_REPLACE_DICT.items())),
+    "city": ("city", None, None, list(Regexes.CITY_REPLACE_DICT.items())),
+    "type": ("type", None, "", [(Regexes.BRACKETS_REGEX, ""), (Regexes.TYPE_REMOVE_REGEX, "")]),
+    "phone": ("phone", None, None, [(Regexes.NON_ALPHA_REGEX, "")]),
+    "name": ("name", None, None, [(Regexes.BRACKETS_REGEX, "")]),
+    "cname": ("name", "name", None, [(Regexes.NON_ALPHA_OR_SPACE_REGEX, ""), ("  the$", "")]),
+    "caddress": ("address", "address", None, [(Regexes.NON_ALPHA_OR_SPACE_REGEX, "")]),
+}
+
+
+def _compile(rules: Sequence[Tuple[str, str]]) -> Rules:
+    # Series.str.replace(pattern, replacement, case=False) compiles the pattern with re.IGNORECASE
+    return [(re.compile(pattern, flags=re.IGNORECASE), replacement) for pattern, replacement in rules]
+
+
+class Pipeline:
+    """
+    The compiled normalization rules of preProcess, which are only applied to the distinct values of each column.
+
+    The normalized values are remembered in a memo per column, so the same Pipeline can be reused for several runs
+    (or chunks of the same dataset) and every distinct value is only normalized once. The memo of all columns holds
+    at most memoLimit values, it is cleared when it is full, so long-running callers don't grow without a bound.
+    """
+
+    def __init__(self, memoLimit: Optional[int] = MEMO_LIMIT):
+        """
+        Args:
+            memoLimit: the maximum number of values in the memo of all columns, None = no limit, default = MEMO_LIMIT
+        """
+        self.columns: Dict[str, Tuple[str, Optional[str], Optional[str], Rules]] = {
+            column: (source, base, missing, _compile(rules))
+            for column, (source, base, missing, rules) in COLUMNS.items()
+        }
+        self.memo: Dict[str, Dict[Hashable, Any]] = {column: {} for column in self.columns}
+        self.memoLimit = memoLimit
+        self.memoSize = 0
+        # the number of values found in and missing from the memo
+        self.hits = 0
+        self.misses = 0
+
+    def clearMemo(self):
+        """Forgets all normalized values."""
+        # cleared in place, so a normalizeValue of a derived column still holds a valid memo
+        for memo in self.memo.values():
+            memo.clear()
+        self.memoSize = 0
+
+    def normalizeValue(self, column: str, value: Any) -> Any:
+        """Normalizes a single raw value of the source column of column."""
+        memo = self.memo[column]
+        # a single lookup, a memo cleared by another thread in between can't raise a KeyError
+        normalized = memo.get(value, _MISSING)
+        if normalized is not _MISSING:
+            self.hits += 1
+            return normalized
+        self.misses += 1
+        _, base, missing, rules = self.columns[column]
+        normalized = value if base is None else self.normalizeValue(base, value)
+        if missing is not None and not isinstance(normalized, str) and pd.isna(normalized):
+            normalized = missing
+        if isinstance(normalized, str):
+            for regex, replacement in rules:
+                normalized = regex.sub(replacement, normalized)
+        else:
+            # just like the .str accessor, everything that is not a string becomes NaN
+            normalized = np.nan
+        if self.memoLimit is not None and self.memoSize >= self.memoLimit:
+            self.clearMemo()
+        memo[value] = normalized
+        self.memoSize += 1
+        return normalized
+
+    def normalize(self, df: pd.DataFrame) -> Dict[str, pd.Series]:
+        """Normalizes all columns of the given DataFrame.
+
+        Every source column is factorized once into categorical codes and distinct values, only the distinct values
+        are normalized and the results are expanded back through the codes.
+
+        Returns:
+            a dict from the column name to the normalized Series
+        """
+        normalized = {}
+        for source in dict.fromkeys(source for source, _, _, _ in self.columns.values()):
+            codes, uniques = pd.factorize(df[source])
+            for column, (columnSource, _, _, _) in self.columns.items():
+                if columnSource != source:
+                    continue
+                # the code -1 marks missing values, which take the last element
+                values = np.empty(len(uniques) + 1, dtype=object)
+                values[:] = [self.normalizeValue(column, value) for value in uniques] \
+                    + [self.normalizeValue(column, np.nan)]
+                normalized[column] = pd.Series(values[codes], index=df.index, name=column)
+        return normalized
+
+
+PIPELINE = Pipeline()
+
+
+def preProcess(df: pd.DataFrame, pipeline: Pipeline = PIPELINE) -> pd.DataFrame:
+    """Pre processes the given DataFrame by applying a lot of Regex replacements.
+
+    Args:
+        df: a pandas DataFrame to pre process
+        pipeline: the pipeline with the rules and the memo to use, default = PIPELINE, which is shared by all calls
+
+    Returns:
+        a pre processed pandas DataFrame
+    """
+    normalized = pipeline.normalize(df)
+    for column in pipeline.columns:
+        df[column] = normalized[column]
+    return df
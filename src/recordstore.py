@@ -0,0 +1,203 @@
+import re
+from collections import Counter
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from blocking import streetNumbers
+
+# the code of missing values in all code arrays, it never equals another code when compared with isSame
+MISSING = -1
+
+
+def _jaccard(intersection: np.ndarray, length1: np.ndarray, length2: np.ndarray) -> np.ndarray:
+    """Computes the jaccard similarity of multisets the same way textdistance does.
+
+    Two empty sequences are identical and therefore have a similarity of 1, while exactly one empty sequence
+    results in a similarity of 0.
+    """
+    union = length1 + length2 - intersection
+    with np.errstate(divide="ignore", invalid="ignore"):
+        similarity = intersection / union
+    return np.where(union == 0, 1.0, similarity)
+
+
+def _gatherRows(indptr: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Gathers the CSR entries of the given rows.
+
+    Returns:
+        a tuple of (pairIndex, entryIndex).
+            pairIndex contains for every gathered entry the position of its row inside rows
+            entryIndex contains the positions of the gathered entries in the CSR data arrays
+    """
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    pairIndex = np.repeat(np.arange(len(rows)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return pairIndex, np.repeat(starts, lengths) + offsets
+
+
+def _smallestUnsigned(maximum: int) -> np.dtype:
+    return np.dtype(np.uint8) if maximum <= np.iinfo(np.uint8).max else np.dtype(np.uint16) \
+        if maximum <= np.iinfo(np.uint16).max else np.dtype(np.uint32)
+
+
+def isSame(codes: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Compares the codes of the pairs (left[i], right[i]), missing values never equal anything, just like NaN."""
+    return (codes[left] == codes[right]) & (codes[left] != MISSING)
+
+
+class Vocabulary:
+    """
+    Interns strings to consecutive integer ids, which can be shared by several columns.
+    """
+
+    def __init__(self):
+        self.ids: Dict[Hashable, int] = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def intern(self, value: Hashable) -> int:
+        return self.ids.setdefault(value, len(self.ids))
+
+
+class TextColumn:
+    """
+    A text column, whose distinct values are tokenized once into a CSR layout of interned token ids and character
+    counts, so td.jaccard on characters and on tokens can be computed for whole batches of pairs with NumPy.
+
+    Every row only holds the int32 code of its value, the features exist once per distinct value. All similarity
+    methods take the positions of distinct values, see codes.
+    """
+
+    def __init__(self, values: Sequence, vocabulary: Optional[Vocabulary] = None):
+        """
+        Args:
+            values: the values of the rows, missing values get the code MISSING
+            vocabulary: to intern the tokens with, can be shared with other columns, default = a new Vocabulary
+        """
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+        self.codes = codes.astype(np.int32)
+        self.strings = np.asarray(uniques, dtype=object)
+
+        charIndex = {c: i for i, c in enumerate(sorted(set("".join(self.strings))))}
+        # a count never exceeds the length of its string, so the smallest dtype is known before the counts are
+        self.charLengths = np.array([len(s) for s in self.strings], dtype=np.int32)
+        self.charCounts = np.zeros((len(self.strings), len(charIndex)),
+                                   dtype=_smallestUnsigned(self.charLengths.max(initial=0)))
+        indptr = [0]
+        tokenIds = []
+        tokenCounts = []
+        for i, s in enumerate(self.strings):
+            for c, count in Counter(s).items():
+                self.charCounts[i, charIndex[c]] = count
+            for t, count in Counter(s.split()).items():
+                tokenIds.append(self.vocabulary.intern(t))
+                tokenCounts.append(count)
+            indptr.append(len(tokenIds))
+
+        self.tokenIndptr = np.array(indptr, dtype=np.int64)
+        self.tokenIds = np.array(tokenIds, dtype=np.int32)
+        self.tokenCounts = np.array(tokenCounts, dtype=_smallestUnsigned(max(tokenCounts, default=0)))
+        self.tokenLengths = np.bincount(np.repeat(np.arange(len(self.strings)), np.diff(self.tokenIndptr)),
+                                        weights=self.tokenCounts, minlength=len(self.strings)).astype(np.int32)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes of all arrays, without the distinct strings themselves."""
+        return sum(a.nbytes for a in (self.codes, self.charCounts, self.charLengths, self.tokenIndptr, self.tokenIds,
+                                      self.tokenCounts, self.tokenLengths))
+
+    def charJaccard(self, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        """Equals td.jaccard(s1, s2) for every pair of distinct values (left[i], right[i])."""
+        intersection = np.minimum(self.charCounts[left], self.charCounts[right]).sum(axis=1, dtype=np.int64)
+        return _jaccard(intersection, self.charLengths[left], self.charLengths[right])
+
+    def tokenJaccard(self, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        """Equals td.jaccard(s1.split(), s2.split()) for every pair of distinct values (left[i], right[i])."""
+        tokenCount = max(len(self.vocabulary), 1)
+        leftPairs, leftEntries = _gatherRows(self.tokenIndptr, left)
+        rightPairs, rightEntries = _gatherRows(self.tokenIndptr, right)
+        # every token occurs at most once per value, so a key occurs at most twice: once for each side of the pair
+        keys = np.concatenate([leftPairs * tokenCount + self.tokenIds[leftEntries],
+                               rightPairs * tokenCount + self.tokenIds[rightEntries]])
+        counts = np.concatenate([self.tokenCounts[leftEntries], self.tokenCounts[rightEntries]]).astype(np.int64)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        counts = counts[order]
+        common = np.flatnonzero(keys[1:] == keys[:-1])
+        intersection = np.bincount(keys[common] // tokenCount, weights=np.minimum(counts[common], counts[common + 1]),
+                                   minlength=len(left)).astype(np.int64)
+        return _jaccard(intersection, self.tokenLengths[left], self.tokenLengths[right])
+
+    def similar(self, left: np.ndarray, right: np.ndarray, minTokenDistance: float, minTextDistance: float) \
+            -> np.ndarray:
+        """Equals stringsSimilar of main.areRowsSame with td.jaccard for every pair of distinct values."""
+        return (self.tokenJaccard(left, right) >= minTokenDistance) \
+            | (self.charJaccard(left, right) >= minTextDistance)
+
+
+_PHONE_NUMBER = re.compile(r"[1-9][0-9]{0,14}")
+
+
+def phoneNumbers(phones: pd.Series) -> np.ndarray:
+    """Converts preprocessed phone numbers into int64.
+
+    Phone numbers consisting of up to 15 digits without a leading zero are stored as their number, all other values
+    get a unique negative code below MISSING, and missing values get MISSING. So two values are equal exactly if
+    their strings are equal, without depending on the other rows like categorical codes do.
+    """
+    phones = pd.Series(phones, dtype=object)
+    isNumber = np.array([isinstance(p, str) and _PHONE_NUMBER.fullmatch(p) is not None for p in phones], dtype=bool)
+    result = np.full(len(phones), MISSING, dtype=np.int64)
+    result[isNumber] = phones[isNumber].astype(np.int64).to_numpy()
+    otherCodes, _ = pd.factorize(phones.where(~isNumber))
+    result[otherCodes >= 0] = MISSING - 1 - otherCodes[otherCodes >= 0]
+    return result
+
+
+class RecordStore:
+    """
+    A compact columnar representation of the match columns of a preprocessed DataFrame.
+
+    Phones are stored as int64, cities and types as categorical codes and the names and addresses as TextColumns,
+    which share one Vocabulary of interned tokens. The street numbers are extracted once per distinct address into a
+    CSR layout of int64 numbers, numberCodes gives every row a code of its street numbers.
+    """
+
+    def __init__(self, df: pd.DataFrame, vocabulary: Optional[Vocabulary] = None):
+        """
+        Args:
+            df: a preprocessed pandas DataFrame with the columns phone, city, cname and caddress, and optionally type
+            vocabulary: to intern the tokens of the names and addresses with, default = a new Vocabulary
+        """
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        self.phones = phoneNumbers(df.phone)
+        cityCodes, self.cities = pd.factorize(df.city)
+        self.cityCodes = cityCodes.astype(np.int32)
+        typeCodes, self.types = pd.factorize(df["type"] if "type" in df else pd.Series(np.nan, index=df.index))
+        self.typeCodes = typeCodes.astype(np.int32)
+        self.name = TextColumn(df.cname, self.vocabulary)
+        self.address = TextColumn(df.caddress, self.vocabulary)
+
+        numbers = [streetNumbers(a) for a in self.address.strings]
+        self.numberIndptr = np.cumsum([0] + [len(n) for n in numbers], dtype=np.int64)
+        self.numberValues = np.array([i for n in numbers for i in n], dtype=np.int64)
+        valueCodes, _ = pd.factorize(pd.Series(numbers, dtype=object))
+        self.numberCodes = np.where(self.address.codes == MISSING, MISSING,
+                                    np.append(valueCodes, MISSING)[self.address.codes]).astype(np.int32)
+
+    def __len__(self):
+        return len(self.phones)
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes of all arrays, without the distinct strings themselves."""
+        return sum(a.nbytes for a in (self.phones, self.cityCodes, self.typeCodes, self.numberIndptr,
+                                      self.numberValues, self.numberCodes)) + self.name.nbytes + self.address.nbytes
@@ -0,0 +1,180 @@
+from collections import defaultdict
+from itertools import combinations
+from math import ceil
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from recordstore import TextColumn
+
+# the bounds of the filters are loosened by this, so rounding errors can only add candidates but never lose pairs
+EPSILON = 1e-9
+# the length of the character grams, that index the values for the containment candidates
+GRAM_LENGTH = 3
+
+
+def elementSets(column: TextColumn, chars: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Converts the token or character multiset of every distinct value of the column into a set of element ranks.
+
+    The k-th occurrence of a token becomes the element (token, k), so the jaccard similarity of the element sets equals
+    the multiset jaccard similarity of td.jaccard. The elements are ranked by their ascending frequency, so the
+    prefixes of the sets consist of their rarest elements.
+
+    Args:
+        column: the TextColumn of the values
+        chars: if the characters instead of the tokens are used, default = False
+
+    Returns:
+        a tuple (indptr, ranks) in CSR layout, the ranks of every value are sorted ascending
+    """
+    if chars:
+        rows, symbols = np.nonzero(column.charCounts)
+        counts = column.charCounts[rows, symbols].astype(np.int64)
+    else:
+        rows = np.repeat(np.arange(len(column.strings)), np.diff(column.tokenIndptr))
+        symbols = column.tokenIds.astype(np.int64)
+        counts = column.tokenCounts.astype(np.int64)
+    entries = np.repeat(np.arange(len(rows)), counts)
+    occurrences = np.arange(len(entries)) - np.repeat(np.cumsum(counts) - counts, counts)
+    rows = rows[entries]
+    _, elements = np.unique(symbols[entries] * (counts.max(initial=0) + 1) + occurrences, return_inverse=True)
+    frequencies = np.bincount(elements)
+    rankOf = np.empty(len(frequencies), dtype=np.int64)
+    rankOf[np.argsort(frequencies, kind="stable")] = np.arange(len(frequencies))
+    ranks = rankOf[elements]
+    order = np.lexsort((ranks, rows))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(column.strings)))])
+    return indptr.astype(np.int64), ranks[order]
+
+
+def _allPairs(values: Sequence[int]) -> List[Tuple[int, int]]:
+    return list(combinations(values, 2))
+
+
+def jaccardCandidates(indptr: np.ndarray, ranks: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Finds all pairs of sets, whose jaccard similarity can be at least threshold, with a PPJoin style self join.
+
+    The sets are processed by ascending size and only the prefix of length |x| - ceil(threshold * |x|) + 1 of every
+    set is probed and added to an inverted index, as two sets reaching the threshold must share an element in their
+    prefixes. Indexed sets smaller than threshold * |x| are skipped (size filter) and a pair is dropped as soon as
+    the elements left after the common element can't reach the required overlap anymore (positional filter).
+
+    Args:
+        indptr: of the sets in CSR layout, see elementSets
+        ranks: the elements of every set in ascending order
+        threshold: the minimal jaccard similarity
+
+    Returns:
+        a tuple (left, right) of the positions of the candidate pairs, a superset of the pairs reaching the threshold
+    """
+    sizes = np.diff(indptr).tolist()
+    if threshold <= 0:
+        # every pair reaches the threshold, even without a common element
+        pairs = _allPairs(range(len(sizes)))
+    else:
+        ranks = ranks.tolist()
+        indptr = indptr.tolist()
+        ratio = threshold / (1 + threshold)
+        index: Dict[int, List[Tuple[int, int, int]]] = defaultdict(list)
+        starts: Dict[int, int] = defaultdict(int)
+        pairs = []
+        empty = []
+        for x in np.argsort(sizes, kind="stable").tolist():
+            size = sizes[x]
+            if size == 0:
+                empty.append(x)
+                continue
+            elements = ranks[indptr[x]:indptr[x + 1]]
+            minSize = threshold * size - EPSILON
+            prefix = min(size - ceil(threshold * size - EPSILON) + 1, size)
+            overlaps: Dict[int, int] = {}
+            for i in range(prefix):
+                element = elements[i]
+                postings = index[element]
+                # the sets are processed by ascending size, so too small sets stay too small for all following sets
+                start = starts[element]
+                while start < len(postings) and postings[start][2] < minSize:
+                    start += 1
+                starts[element] = start
+                for y, j, ySize in postings[start:]:
+                    overlap = overlaps.get(y, 0)
+                    if overlap < 0:
+                        continue
+                    required = ceil(ratio * (size + ySize) - EPSILON)
+                    if overlap + 1 + min(size - i - 1, ySize - j - 1) >= required:
+                        overlaps[y] = overlap + 1
+                    else:
+                        overlaps[y] = -1
+            pairs.extend((y, x) for y, overlap in overlaps.items() if overlap > 0)
+            for i in range(prefix):
+                index[elements[i]].append((x, i, size))
+        if threshold <= 1:
+            # two empty sets are identical
+            pairs.extend(_allPairs(empty))
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def containmentCandidates(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Finds all pairs of strings, where one string is a substring of the other one.
+
+    Every string is indexed by its character grams of length GRAM_LENGTH, the superstrings of a string are searched
+    in the postings of its rarest gram only. Strings shorter than a gram are compared to all strings.
+
+    Args:
+        strings: distinct strings
+
+    Returns:
+        a tuple (left, right) of the positions of the pairs, strings[left[i]] is a substring of strings[right[i]]
+    """
+    index: Dict[str, List[int]] = defaultdict(list)
+    for i, s in enumerate(strings):
+        for gram in {s[k:k + GRAM_LENGTH] for k in range(len(s) - GRAM_LENGTH + 1)}:
+            index[gram].append(i)
+    everything = range(len(strings))
+    pairs = []
+    for i, s in enumerate(strings):
+        if len(s) < GRAM_LENGTH:
+            candidates = everything
+        else:
+            candidates = min((index[s[k:k + GRAM_LENGTH]] for k in range(len(s) - GRAM_LENGTH + 1)), key=len)
+        pairs.extend((i, j) for j in candidates if j != i and s in strings[j])
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def candidatePairs(column: TextColumn, minDistance: float, completelyInsideOtherBias: Optional[float] = None,
+                   chars: bool = False, approximate: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Finds all pairs of distinct values, whose (biased) jaccard similarity can be at least minDistance.
+
+    Pairs without the bias need a jaccard similarity of at least minDistance, so they are found with
+    jaccardCandidates. Pairs where one value contains the other one get the bias, which lowers their required
+    similarity to minDistance - completelyInsideOtherBias, they are found separately with containmentCandidates.
+
+    In the approximate mode the pairs without the bias are proposed by the MinHash-LSH of minhash.candidatePairs
+    instead, which can miss some of them, but doesn't depend on the prefix filter being selective.
+
+    Args:
+        column: the TextColumn of the values
+        minDistance: the minimal (biased) similarity
+        completelyInsideOtherBias: the bias of the values containing each other, None if no bias is applied
+        chars: if the jaccard similarity of the characters instead of the tokens is used, default = False
+        approximate: if the MinHash-LSH is used instead of the exact join, default = False
+
+    Returns:
+        a tuple (left, right) of the positions of the distinct values of the candidate pairs with left < right,
+        sorted by left and right
+    """
+    if approximate:
+        # imported here, as minhash builds on the element sets of this module
+        import minhash
+        left, right = minhash.candidatePairs(column, chars)
+    else:
+        left, right = jaccardCandidates(*elementSets(column, chars), minDistance)
+    if completelyInsideOtherBias is not None and minDistance - completelyInsideOtherBias <= 1:
+        containedLeft, containedRight = containmentCandidates(column.strings.tolist())
+        left = np.concatenate([left, containedLeft])
+        right = np.concatenate([right, containedRight])
+    count = max(len(column.strings), 1)
+    keys = np.unique(np.minimum(left, right) * count + np.maximum(left, right))
+    return keys // count, keys % count
@@ -0,0 +1,260 @@
+import hashlib
+import math
+import os
+import pickle
+import tempfile
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+import textdistance as td
+
+import blocking
+import main
+import preprocessing
+from instrumentation import RECORDER
+from recordstore import RecordStore
+from unionfind import Clusters
+
+# the only columns needed for matching, everything else stays in the input file
+MATCH_COLUMNS = ["position", "id", "phone", "city", "cname", "caddress"]
+# the maximum number of entries of a partition, that is matched at once, larger partitions are split further
+PARTITION_SIZE = 500000
+
+
+def _partitionOf(key: str, partitions: int) -> int:
+    # crc32 instead of hash(), so the partitioning does not depend on the hash seed of the process
+    return zlib.crc32(key.encode("utf-8")) % partitions
+
+
+def _subPartitionOf(key: str, level: int, partitions: int) -> int:
+    # crc32 is linear, so a salted crc32 would be correlated with the first partitioning, blake2b isn't
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8, salt=level.to_bytes(16, "little")).digest()
+    return int.from_bytes(digest, "little") % partitions
+
+
+def writeBlockingStore(path: str, storePath: str, delimiter: str = "\t", chunkSize: int = 100000,
+                       partitions: int = 64, blockingKeys: Iterable[str] = blocking.DEFAULT_BLOCKING_KEYS) -> int:
+    """Reads the input file in chunks and writes the match columns of every row into the partitions of the blocking
+    store, once for every blocking key of the row. All rows with the same key end up in the same partition.
+
+    The chunks are preprocessed by their own Pipeline, whose memo holds at most the values of one chunk, so the memory
+    doesn't grow with the number of distinct values of the whole file.
+
+    Args:
+        path: of the tsv/csv input file
+        storePath: directory of the blocking store
+        delimiter: of the input file, default = tab
+        chunkSize: the number of rows read and preprocessed at once, default = 100000
+        partitions: the number of partition files, default = 64
+        blockingKeys: the row local blocking keys to use, see blocking.ROW_LOCAL_BLOCKING_KEYS
+
+    Returns:
+        the number of rows read
+    """
+    pipeline = preprocessing.Pipeline(memoLimit=chunkSize * len(preprocessing.COLUMNS))
+    os.makedirs(storePath, exist_ok=True)
+    files = [open(os.path.join(storePath, "partition{}.pkl".format(p)), "wb") for p in range(partitions)]
+    rows = 0
+    try:
+        for chunk in pd.read_csv(path, delimiter=delimiter, chunksize=chunkSize):
+            chunk = preprocessing.preProcess(chunk.reset_index(drop=True), pipeline)
+            RECORDER.histogram("streamMemoSize", [pipeline.memoSize])
+            chunk["position"] = np.arange(rows, rows + len(chunk))
+            rows += len(chunk)
+            records = chunk[MATCH_COLUMNS]
+            entries = [[] for _ in range(partitions)]
+            for blockingKey in blockingKeys:
+                for position, keys in enumerate(blocking.BLOCKING_KEYS[blockingKey](chunk)):
+                    for key in blocking.keysOf(keys):
+                        key = blockingKey + ":" + repr(key)
+                        entries[_partitionOf(key, partitions)].append((key, position))
+            for partition, partitionEntries in enumerate(entries):
+                if partitionEntries:
+                    keys, positions = zip(*partitionEntries)
+                    fragment = records.iloc[list(positions)].reset_index(drop=True)
+                    fragment.insert(0, "key", keys)
+                    pickle.dump(fragment, files[partition], protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for file in files:
+            file.close()
+    return rows
+
+
+def _fragments(file: str) -> Iterator[pd.DataFrame]:
+    with open(file, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _readPartition(file: str) -> pd.DataFrame:
+    fragments = list(_fragments(file))
+    if not fragments:
+        return pd.DataFrame(columns=["key"] + MATCH_COLUMNS)
+    return pd.concat(fragments, ignore_index=True)
+
+
+def splitPartition(file: str, partitionSize: int = PARTITION_SIZE, level: int = 1) -> List[str]:
+    """Splits a partition of the blocking store with more than partitionSize entries into smaller partitions.
+
+    The entries are distributed by their key with another hash for every level, so all rows with the
+    same key still end up in the same partition. A key with more than partitionSize entries can't be split, its
+    partition stays larger. The fragments are read one by one, so the partition is never loaded completely.
+
+    Args:
+        file: of the partition, it is replaced by the new partition files
+        partitionSize: the maximum number of entries of a partition, default = PARTITION_SIZE
+        level: the number of times the entries were split already, salts the hash, default = 1
+
+    Returns:
+        the files of the partitions, just the given file if it is small enough
+    """
+    entries = sum(len(fragment) for fragment in _fragments(file))
+    if entries <= partitionSize:
+        return [file]
+    parts = max(math.ceil(entries / partitionSize), 2)
+    files = ["{}.{}".format(file, part) for part in range(parts)]
+    sizes = [0] * parts
+    outputs = [open(f, "wb") for f in files]
+    try:
+        for fragment in _fragments(file):
+            subPartitions = np.array([_subPartitionOf(key, level, parts) for key in fragment.key.tolist()])
+            for part, subFragment in fragment.groupby(subPartitions, sort=True):
+                pickle.dump(subFragment.reset_index(drop=True), outputs[part], protocol=pickle.HIGHEST_PROTOCOL)
+                sizes[part] += len(subFragment)
+    finally:
+        for output in outputs:
+            output.close()
+    os.remove(file)
+    result = []
+    for f, size in zip(files, sizes):
+        if size == 0:
+            os.remove(f)
+        elif size == entries:
+            # all entries share a key or a hash, splitting again wouldn't make the partition smaller
+            result.append(f)
+        else:
+            result.extend(splitPartition(f, partitionSize, level + 1))
+    return result
+
+
+def _blockPairs(blocks: Iterable[np.ndarray], batchSize: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yields all pairs inside every block in batches of about batchSize pairs."""
+    lefts, rights, size = [], [], 0
+    for block in blocks:
+        for i in range(len(block) - 1):
+            partners = block[i + 1:]
+            lefts.append(np.full(len(partners), block[i], dtype=np.int64))
+            rights.append(partners)
+            size += len(partners)
+            if size >= batchSize:
+                yield np.concatenate(lefts), np.concatenate(rights)
+                lefts, rights, size = [], [], 0
+    if size:
+        yield np.concatenate(lefts), np.concatenate(rights)
+
+
+def matchPartition(file: str, distanceAlgorithm=td.jaccard, minTokenDistance=0.5, minTextDistance=0.9,
+                   batchSize: int = 65536) -> List[Tuple[int, int, int, int]]:
+    """Matches all rows sharing a blocking key inside one partition of the blocking store.
+
+    Returns:
+        a list of (position1, id1, position2, id2) tuples of the rows that should be considered the same
+    """
+    entries = _readPartition(file)
+    RECORDER.histogram("streamPartitionEntries", [len(entries)])
+    records = entries.drop_duplicates("position").sort_values("position").reset_index(drop=True)
+    positions = records.position.to_numpy()
+    local = np.searchsorted(positions, entries.position.to_numpy())
+    keyCodes, _ = pd.factorize(entries.key)
+    order = np.argsort(keyCodes, kind="stable")
+    blocks = [np.sort(block) for block in np.split(local[order], np.flatnonzero(np.diff(keyCodes[order])) + 1)
+              if len(block) > 1]
+
+    recordStore = RecordStore(records) if distanceAlgorithm is td.jaccard else None
+    ids = records.id.tolist()
+    matches = []
+    for left, right in _blockPairs(blocks, batchSize):
+        same = main.matchPairs(records, left, right, distanceAlgorithm, minTokenDistance, minTextDistance,
+                               store=recordStore)
+        matches.extend((positions[i], ids[i], positions[j], ids[j]) for i, j in zip(left[same], right[same]))
+    return matches
+
+
+def deduplicateStream(path: str, delimiter: str = "\t", chunkSize: int = 100000, partitions: int = 64,
+                      batchSize: int = 65536, storePath: Optional[str] = None, distanceAlgorithm=td.jaccard,
+                      minTokenDistance=0.5, minTextDistance=0.9,
+                      blockingKeys: Iterable[str] = blocking.DEFAULT_BLOCKING_KEYS,
+                      partitionSize: int = PARTITION_SIZE) -> List[Set[int]]:
+    """Deduplicates a tsv/csv file without loading it completely into memory.
+
+    The file is read and preprocessed in chunks, only the match columns are written into an on-disk blocking store,
+    which is then matched partition by partition. Partitions with more than partitionSize entries are split further
+    before they are matched, so the peak memory is bounded by the chunk size, the partition size and the batch size,
+    not by the size of the file. Only a single blocking key shared by more than partitionSize rows exceeds it.
+
+    Args:
+        path: of the tsv/csv input file
+        delimiter: of the input file, default = tab
+        chunkSize: the number of rows read and preprocessed at once, default = 100000
+        partitions: the number of partitions of the blocking store, default = 64
+        batchSize: the number of pairs evaluated at once, default = 65536
+        storePath: directory of the blocking store, default = a temporary directory, which is deleted afterwards
+        distanceAlgorithm: to use, default td.jaccard
+        minTokenDistance: to use, default 0.5
+        minTextDistance: to use, default 0.9
+        blockingKeys: the row local blocking keys to use, see blocking.ROW_LOCAL_BLOCKING_KEYS
+        partitionSize: the maximum number of entries of a partition matched at once, default = PARTITION_SIZE
+
+    Returns:
+        the list of sets of duplicate ids, in the same order as main.deduplicate returns them
+    """
+    blockingKeys = tuple(blockingKeys)
+    for blockingKey in blockingKeys:
+        if blockingKey not in blocking.ROW_LOCAL_BLOCKING_KEYS:
+            raise ValueError("Blocking key '{}' depends on the whole dataset and can't be used for streaming"
+                             .format(blockingKey))
+    temporaryDirectory = tempfile.TemporaryDirectory() if storePath is None else None
+    storePath = storePath or temporaryDirectory.name
+    try:
+        writeBlockingStore(path, storePath, delimiter, chunkSize, partitions, blockingKeys)
+        matches = []
+        for partition in range(partitions):
+            for file in splitPartition(os.path.join(storePath, "partition{}.pkl".format(partition)), partitionSize):
+                matches.extend(matchPartition(file, distanceAlgorithm, minTokenDistance, minTextDistance, batchSize))
+    finally:
+        if temporaryDirectory is not None:
+            temporaryDirectory.cleanup()
+
+    firstPositions = {}
+    for position1, id1, position2, id2 in matches:
+        firstPositions[id1] = position1
+        firstPositions[id2] = position2
+    rings = Clusters([(id1, id2) for _, id1, _, id2 in matches]).rings()
+    # main.deduplicate orders the sets by the position of their first row
+    rings.sort(key=lambda ring: min(firstPositions[i] for i in ring))
+    return [set(ring) for ring in rings]
+
+
+def groupIndex(mergedDupeSets: List[Set[int]]) -> Dict[int, int]:
+    """Returns a dict from every id in the given sets of duplicates to the index of its set."""
+    return {i: group for group, dupeSet in enumerate(mergedDupeSets) for i in dupeSet}
+
+
+def writeGroups(path: str, mergedDupeSets: List[Set[int]], outputPath: str, delimiter: str = "\t",
+                chunkSize: int = 100000):
+    """Reads the input file in chunks again and writes the group of every id into a tsv file.
+
+    The group is the index of the set of duplicates the id belongs to, or its negative id, just like the group
+    column of main.deduplicate.
+    """
+    groups = groupIndex(mergedDupeSets)
+    header = True
+    for chunk in pd.read_csv(path, delimiter=delimiter, chunksize=chunkSize, usecols=["id"]):
+        chunk["group"] = [groups.get(i, -i) for i in chunk.id.tolist()]
+        chunk.to_csv(outputPath, sep="\t", index=False, header=header, mode="w" if header else "a")
+        header = False
@@ -0,0 +1,142 @@
+"""Vectorized cluster labelling and survivorship of the deduplicated rows.
+
+Every row gets the group of its cluster and one canonical record is selected per cluster by a list of rules, which
+are applied in order: the first rule that prefers a record decides, the remaining ties are broken by the smallest id.
+A single sort of all rows by (group, rules, id) produces both views at once, the members view with every raw row of a
+cluster and the canonical view with one row per cluster.
+
+The rules are given as "rule" or "rule:column", e.g. ["mostComplete", "mostFrequent:name", "longest:name"]:
+    mostComplete: the record with the most non-missing values
+    mostFrequent:column: the record whose value of column occurs most often in its cluster, default column = name
+    longest:column: the record with the longest value of column, default column = name
+    preferredSource:column: the record whose source is listed first in utils.config["preferredSources"], default
+        column = source
+All records are equal for a rule, if its column doesn't exist.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+# the columns, that mostComplete counts, if they exist
+RECORD_COLUMNS = ["name", "address", "city", "phone", "type"]
+
+
+def clusterLabels(ids: Sequence[int], mergedDupeSets: List[Set[int]]) -> np.ndarray:
+    """Returns the group of every id, the index of its set of duplicates or its negative id, see streaming.writeGroups.
+
+    Unlike the former loop over df.at[id - 1, "group"], the ids don't have to equal the row positions plus one.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    members = np.fromiter((i for dupeSet in mergedDupeSets for i in dupeSet), dtype=np.int64,
+                          count=sum(map(len, mergedDupeSets)))
+    groups = np.repeat(np.arange(len(mergedDupeSets), dtype=np.int64), [len(s) for s in mergedDupeSets])
+    order = np.argsort(members, kind="stable")
+    members, groups = members[order], groups[order]
+    positions = np.minimum(np.searchsorted(members, ids), max(len(members) - 1, 0))
+    found = members[positions] == ids if len(members) else np.zeros(len(ids), dtype=bool)
+    return np.where(found, groups[positions] if len(members) else 0, -ids)
+
+
+def _missing(values: pd.Series) -> np.ndarray:
+    # NaN, None and empty strings are missing
+    return (values.isna() | (values.astype(str) == "")).to_numpy()
+
+
+def mostComplete(df: pd.DataFrame, labels: np.ndarray, column: Optional[str] = None) -> np.ndarray:
+    columns = [c for c in RECORD_COLUMNS if c in df] if column is None else [c for c in [column] if c in df]
+    return len(columns) - sum((_missing(df[c]).astype(np.int64) for c in columns), np.zeros(len(df), dtype=np.int64))
+
+
+def mostFrequent(df: pd.DataFrame, labels: np.ndarray, column: Optional[str] = None) -> np.ndarray:
+    if (column or "name") not in df:
+        return np.zeros(len(df), dtype=np.int64)
+    values = df[column or "name"]
+    codes, uniques = pd.factorize(values)
+    _, groups = np.unique(labels, return_inverse=True)
+    # the number of rows with the same group and value, missing values are never frequent
+    _, inverse, counts = np.unique(groups.ravel() * (len(uniques) + 1) + codes + 1, return_inverse=True,
+                                   return_counts=True)
+    return np.where(_missing(values), 0, counts[inverse.ravel()])
+
+
+def longest(df: pd.DataFrame, labels: np.ndarray, column: Optional[str] = None) -> np.ndarray:
+    if (column or "name") not in df:
+        return np.zeros(len(df), dtype=np.int64)
+    values = df[column or "name"]
+    return np.where(_missing(values), -1, values.astype(str).str.len().to_numpy())
+
+
+def preferredSource(df: pd.DataFrame, labels: np.ndarray, column: Optional[str] = None) -> np.ndarray:
+    column = column or "source"
+    if column not in df:
+        return np.zeros(len(df), dtype=np.int64)
+    sources = list(utils.config["preferredSources"])
+    # the first preferred source gets the highest score, all other sources the lowest one
+    ranks = {source: len(sources) - rank for rank, source in enumerate(sources)}
+    return df[column].map(ranks).fillna(0).to_numpy(dtype=np.int64)
+
+
+RULES: Dict[str, Callable[[pd.DataFrame, np.ndarray, Optional[str]], np.ndarray]] = {
+    "mostComplete": mostComplete,
+    "mostFrequent": mostFrequent,
+    "longest": longest,
+    "preferredSource": preferredSource,
+}
+
+
+def _scores(df: pd.DataFrame, labels: np.ndarray, rules: Iterable[str]) -> List[np.ndarray]:
+    scores = []
+    for rule in rules:
+        name, _, column = rule.partition(":")
+        if name not in RULES:
+            raise ValueError("Unknown survivorship rule '{}', known rules are: {}".format(name, ", ".join(RULES)))
+        scores.append(np.asarray(RULES[name](df, labels, column or None)))
+    return scores
+
+
+def sortMembers(df: pd.DataFrame, labels: np.ndarray, rules: Optional[Iterable[str]] = None) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """Sorts the rows by their group, the rows of a group by the rules and their id.
+
+    Args:
+        df: a preprocessed pandas DataFrame with an id column
+        labels: the group of every row, e.g. of clusterLabels
+        rules: the survivorship rules, see the module docstring, default = utils.config["survivorshipRules"]
+
+    Returns:
+        a tuple of (order, canonical).
+            order are the positions of the rows in the sorted order
+            canonical is a boolean mask in the sorted order, which is True for the first row of every group
+    """
+    labels = np.asarray(labels)
+    scores = _scores(df, labels, utils.config["survivorshipRules"] if rules is None else rules)
+    # lexsort sorts by the last key first, the scores are negated so higher scores come first
+    order = np.lexsort([df.id.to_numpy()] + [-s for s in reversed(scores)] + [labels])
+    sortedLabels = labels[order]
+    return order, np.concatenate([[True], sortedLabels[1:] != sortedLabels[:-1]])[:len(order)]
+
+
+def survive(df: pd.DataFrame, mergedDupeSets: List[Set[int]], rules: Optional[Iterable[str]] = None) \
+        -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Labels the clusters of the given rows and selects the canonical record of every cluster.
+
+    Args:
+        df: a preprocessed pandas DataFrame with an id column, it isn't changed
+        mergedDupeSets: disjoint sets of ids, the position in the list is used as group identifier
+        rules: the survivorship rules, see the module docstring, default = utils.config["survivorshipRules"]
+
+    Returns:
+        a tuple of (members, canonical).
+            members contains every row with its group and a canonical flag, ordered by the group, the rows of a
+                group are ordered by the rules, so the canonical record comes first
+            canonical contains the canonical record of every group, ordered by the group
+    """
+    labels = clusterLabels(df.id.to_numpy(), mergedDupeSets)
+    order, canonical = sortMembers(df, labels, rules)
+    members = df.drop(columns=["group", "canonical"], errors="ignore").iloc[order].reset_index(drop=True)
+    members.insert(0, "group", labels[order])
+    members["canonical"] = canonical
+    return members, members[canonical].drop(columns="canonical").reset_index(drop=True)
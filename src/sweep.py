@@ -0,0 +1,180 @@
+"""Sweeps the bias and cutoff parameters of clean.clean in a single pass and writes the results as csv.
+
+Usage (from the src directory):
+    python sweep.py --output ../data/work/results_params.csv
+"""
+import argparse
+import csv
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+import clean
+import utils
+from unionfind import UnionFind
+
+CSV_HEADER = ["bias", "cutoff", "algorithm", "tp", "tn", "fp", "fn", "precision", "recall", "fscore"]
+
+
+class _GoldCounter:
+    """
+    Keeps the element counts of the found duplicate sets, that are in the Gold Standard and that are not,
+    up to date while groups get merged.
+    """
+
+    def __init__(self, goldSets: Iterable[Set[int]]):
+        self.goldSets = {frozenset(s) for s in goldSets}
+        self.goldTotal = sum(len(s) for s in self.goldSets)
+        self.inGold = 0
+        self.notInGold = 0
+
+    def add(self, group: FrozenSet[int], sign: int = 1):
+        # only groups with more than one element are duplicates
+        if len(group) > 1:
+            if group in self.goldSets:
+                self.inGold += sign * len(group)
+            else:
+                self.notInGold += sign * len(group)
+
+    def params(self, total: int) -> List:
+        return utils.goldParams(self.inGold, self.notInGold, self.goldTotal - self.inGold, total)
+
+
+def sweep(df: pd.DataFrame, biases: Iterable[float], cutoffs: Iterable[float], algo: str = "jaccard",
+          readFromFile: bool = False, writeToFile: bool = False, workers: int = 1) -> List[List]:
+    """Calculates the Gold Standard comparison of clean.clean for every combination of bias and cutoff.
+
+    The preprocessing, the raw distances and the substring flags of the bias function are only calculated once, and
+    only for the pairs that can reach a cutoff with some bias.
+    For every bias the edges are sorted once and the cutoffs are processed in descending order, so every edge is
+    only added once to a union-find structure over the names. The duplicate groups of clean.dedupe, which are the rows
+    with the same phone and connected names, and the Gold Standard counts are updated whenever two names get connected.
+
+    Args:
+        df: a fresh pandas DataFrame
+        biases: the values for the completelyInsideOtherBias parameter
+        cutoffs: the values for the filterCutoff parameter
+        algo: to use for text distance comparison, default = "jaccard"
+        readFromFile: if cached distances should be read from the cache, default = False
+        writeToFile: if the calculated distances should be written to the cache, default = False
+        workers: the number of processes used to calculate the distances, default = 1
+
+    Returns:
+        a list of rows [bias, cutoff, algorithm, tp, tn, fp, fn, precision, recall, fscore],
+            ordered by bias and then by cutoff, like the nested loops over both parameters would produce them
+    """
+    biases = list(biases)
+    cutoffs = list(cutoffs)
+    total = len(df)
+    df = clean.preProcess(df)
+    names = list(df.cname.unique())
+    nameIds = {name: i for i, name in enumerate(names)}
+
+    distances = clean.calcDistances(names, algo=algo, readFromFile=readFromFile, writeToFile=writeToFile,
+                                    doBias=False, workers=workers, minDistance=minDistance(biases, cutoffs))
+    left = np.array([nameIds[s1] for s1, _, _ in distances], dtype=np.int64)
+    right = np.array([nameIds[s2] for _, s2, _ in distances], dtype=np.int64)
+    rawDistances = np.array([d for _, _, d in distances], dtype=np.float64)
+    return sweepDistances(df, names, left, right, rawDistances, biases, cutoffs, algo, total)
+
+
+def minDistance(biases: Iterable[float], cutoffs: Iterable[float]) -> Optional[float]:
+    """The smallest raw distance, that can reach a cutoff of the grid with some bias, None for an empty grid."""
+    cutoffs = list(cutoffs)
+    return min(cutoffs) - max(max(biases, default=0), 0) if cutoffs else None
+
+
+def sweepDistances(df: pd.DataFrame, names: List[str], left: np.ndarray, right: np.ndarray,
+                   rawDistances: np.ndarray, biases: Iterable[float], cutoffs: Iterable[float], algo: str,
+                   total: Optional[int] = None) -> List[List]:
+    """Calculates the Gold Standard comparison of clean.clean for every combination of bias and cutoff from the
+    already calculated raw distances of the name pairs, see sweep.
+
+    Args:
+        df: a preprocessed pandas DataFrame
+        names: the unique cnames of df
+        left: positions in names of the first names of the pairs
+        right: positions in names of the second names of the pairs
+        rawDistances: the distance of every pair without the bias, the pairs not given have a distance below every
+            cutoff, even with the bias
+        biases: the values for the completelyInsideOtherBias parameter
+        cutoffs: the values for the filterCutoff parameter
+        algo: the name of the algorithm of the distances, which is written into the results
+        total: the total number of records, default = the number of rows of df
+
+    Returns:
+        a list of rows [bias, cutoff, algorithm, tp, tn, fp, fn, precision, recall, fscore], see sweep
+    """
+    biases = list(biases)
+    cutoffs = list(cutoffs)
+    total = len(df) if total is None else total
+    nameIds = {name: i for i, name in enumerate(names)}
+    inside = np.array([s1 in s2 or s2 in s1 for s1, s2 in zip((names[i] for i in left.tolist()),
+                                                              (names[j] for j in right.tolist()))], dtype=bool)
+
+    # rows without a phone are dropped by the groupby in clean.dedupe
+    rows = df[df.phone.notna()]
+    initialGroups: Dict[int, Dict[str, Set[int]]] = {}
+    for rowId, phone, name in zip(rows.id.tolist(), rows.phone.tolist(), rows.cname.tolist()):
+        initialGroups.setdefault(nameIds[name], {}).setdefault(phone, set()).add(rowId)
+
+    results = {}
+    for bias in biases:
+        biasedDistances = rawDistances + np.where(inside, bias, 0)
+        order = np.argsort(-biasedDistances, kind="stable")
+        sortedDistances = biasedDistances[order].tolist()
+        sortedLeft = left[order].tolist()
+        sortedRight = right[order].tolist()
+
+        unionFind = UnionFind(len(names))
+        groups = {nameId: {phone: frozenset(ids) for phone, ids in phones.items()}
+                  for nameId, phones in initialGroups.items()}
+        counter = _GoldCounter(utils.GOLD_DUPE_SETS)
+        for phones in groups.values():
+            for group in phones.values():
+                counter.add(group)
+
+        position = 0
+        components = len(names)
+        for cutoff in sorted(cutoffs, reverse=True):
+            # once all names are connected, the remaining edges can't change anything anymore
+            while components > 1 and position < len(sortedDistances) and sortedDistances[position] >= cutoff:
+                root1 = unionFind.find(sortedLeft[position])
+                root2 = unionFind.find(sortedRight[position])
+                position += 1
+                root = unionFind.union(root1, root2)
+                if root == -1:
+                    continue
+                components -= 1
+                absorbed = root2 if root == root1 else root1
+                target = groups.setdefault(root, {})
+                for phone, group in groups.pop(absorbed, {}).items():
+                    if phone in target:
+                        counter.add(target[phone], -1)
+                        counter.add(group, -1)
+                        group = target[phone] | group
+                        counter.add(group)
+                    target[phone] = group
+            results[(bias, cutoff)] = [bias, cutoff, algo, *counter.params(total)]
+
+    return [results[(bias, cutoff)] for bias in biases for cutoff in cutoffs]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sweeps the bias and cutoff parameters of clean.py")
+    parser.add_argument("--output", default=utils.PATH_PREFIX + "/results_params.csv",
+                        help="the csv file to write, default = " + utils.PATH_PREFIX + "/results_params.csv")
+    parser.add_argument("--algo", default="jaccard", help="the text distance algorithm, default = jaccard")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes used to calculate the distances, default = 1")
+    args = parser.parse_args()
+
+    originalDf = pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t')
+    # the same grid as the heatmap chart, which used nested loops over clean.clean
+    values = list(np.arange(0.0, 1.1, 0.1))
+    with open(args.output, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(sweep(originalDf, values, values, args.algo, workers=args.workers))
+    print("Written the results of the sweep to '" + args.output + "'.")
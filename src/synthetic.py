@@ -0,0 +1,145 @@
+"""Generator of synthetic restaurant datasets with known duplicates, built from restaurants.tsv and its Gold Standard.
+
+Usage (from the src directory):
+    python synthetic.py --rows 100000 --duplicate-rate 0.2 --output ../data/work/synthetic.tsv
+"""
+import argparse
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+# the different ways the phone numbers are written in restaurants.tsv
+PHONE_FORMATS = ["{}/{}-{}", "{}-{}-{}", "{}/ {}-{}"]
+# (regex, replacement) pairs of address spellings, each one is applied to a share of the duplicates
+ADDRESS_VARIANTS = [(r"\bblvd\.", "blv."), (r"\bave\.", "av."), (r"\bst\.$", "sts."), (r"\bs\. ", "s ")]
+BETWEEN_SUFFIXES = [" between 1st and 2nd", " (between 5th and 6th aves.)", " between main st. and broadway"]
+CITY_ALIASES = {"los angeles": ["la", "west la"], "new york": ["new york city"], "west hollywood": ["w. hollywood"]}
+
+
+def _formatPhones(digits: pd.Series, formats: np.ndarray) -> pd.Series:
+    parts = [digits.str[:3], digits.str[3:6], digits.str[6:]]
+    phones = pd.Series(np.empty(len(digits), dtype=object), index=digits.index)
+    for f, phoneFormat in enumerate(PHONE_FORMATS):
+        mask = formats == f
+        phones[mask] = [phoneFormat.format(*p) for p in zip(*(part[mask] for part in parts))]
+    return phones
+
+
+def loadCorpus(path: str = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Loads the base rows, that are no duplicates of each other, and their duplicate partners from the Gold Standard.
+
+    Returns:
+        a tuple (base, partners).
+            base contains all rows of restaurants.tsv, that are not the second id of a Gold Standard pair
+            partners contains the second row of every Gold Standard pair, indexed by the id of the first row
+    """
+    df = pd.read_csv((path or utils.PATH_PREFIX) + '/restaurants.tsv', delimiter='\t')
+    gold = pd.read_csv((path or utils.PATH_PREFIX) + '/restaurants_DPL.tsv', delimiter='\t')
+    gold = gold.drop_duplicates(gold.columns[0])
+    partners = df.set_index("id").loc[gold.iloc[:, 1].to_numpy()].set_index(gold.iloc[:, 0].to_numpy())
+    base = df[~df.id.isin(gold.iloc[:, 1])].reset_index(drop=True)
+    return base, partners
+
+
+def generate(rows: int, duplicateRate: float = 0.2, seed: int = 0, path: str = None) \
+        -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Generates a dataset with the columns of restaurants.tsv and a known share of duplicates.
+
+    Every distinct restaurant (entity) is derived from a base row. The first copy of a base row keeps its values, every
+    further copy gets its own phone number and street number and an additional name token, so it is a different
+    restaurant of the same chain. The duplicates are copies of random entities with realistic perturbations: another
+    phone format, other address spellings, "between ..." suffixes, city aliases and the name and type of the
+    duplicate partner in the Gold Standard.
+
+    Args:
+        rows: the number of rows to generate
+        duplicateRate: the share of the rows, that are a duplicate of another row, default = 0.2
+        seed: of the random number generator, default = 0
+        path: the directory of restaurants.tsv and restaurants_DPL.tsv, default = PATH_PREFIX
+
+    Returns:
+        a tuple (df, gold).
+            df contains the generated rows in random order with the ids 1 to rows
+            gold contains the duplicate pairs (id1, id2) in the format of restaurants_DPL.tsv
+    """
+    rand = np.random.RandomState(seed)
+    base, partners = loadCorpus(path)
+    duplicates = int(round(rows * duplicateRate))
+    entities = rows - duplicates
+
+    # the entities
+    entity = np.arange(entities)
+    df = base.iloc[entity % len(base)].reset_index(drop=True)
+    copy = entity // len(base)
+    modified = copy > 0
+    tokens = np.array(sorted({t for name in base.name for t in name.split() if t.isalpha() and len(t) > 3}), dtype=object)
+    nameToken = np.where(modified, " " + tokens[rand.randint(len(tokens), size=entities)], "")
+    df["name"] = df.name + nameToken
+    digits = df.phone.str.replace(r"[^0-9]", "", regex=True).str.pad(10, fillchar="0").str[:10]
+    # multiplying with a number coprime to 10^7 is a bijection, so the new numbers are unique per area code
+    newNumbers = pd.Series((entity * 7919 + 1234567) % 10 ** 7, index=df.index).astype(str).str.zfill(7)
+    digits[modified] = digits.str[:3][modified] + newNumbers[modified]
+    streetNumbers = pd.Series(rand.randint(1, 30000, size=entities), index=df.index).astype(str)
+    # addresses without a street number get one, otherwise all copies would have the same address
+    df.loc[modified, "address"] = streetNumbers + " " + df.address.str.replace(r"^\d+ ", "", regex=True)
+
+    # the duplicates
+    of = rand.randint(entities, size=duplicates)
+    dupes = df.iloc[of].reset_index(drop=True)
+    dupeDigits = digits.iloc[of].reset_index(drop=True)
+    baseIds = base.id.to_numpy()[of % len(base)]
+    usePartner = np.isin(baseIds, partners.index) & (rand.rand(duplicates) < 0.5)
+    partnerRows = partners.reindex(baseIds)
+    dupes.loc[usePartner, "name"] = partnerRows.name.to_numpy()[usePartner] + nameToken[of][usePartner]
+    dupes.loc[usePartner, "type"] = partnerRows.type.to_numpy()[usePartner]
+    for regex, replacement in ADDRESS_VARIANTS:
+        mask = rand.rand(duplicates) < 0.5
+        dupes.loc[mask, "address"] = dupes.address[mask].str.replace(regex, replacement, regex=True)
+    suffix = rand.randint(len(BETWEEN_SUFFIXES) * 4, size=duplicates)
+    for s, betweenSuffix in enumerate(BETWEEN_SUFFIXES):
+        dupes.loc[suffix == s, "address"] = dupes.address[suffix == s] + betweenSuffix
+    for city, aliases in CITY_ALIASES.items():
+        mask = (dupes.city == city).to_numpy()
+        dupes.loc[mask, "city"] = np.array(aliases)[rand.randint(len(aliases), size=mask.sum())]
+
+    # shuffle the entities and the duplicates together
+    result = pd.concat([df, dupes], ignore_index=True)
+    result["phone"] = _formatPhones(pd.concat([digits, dupeDigits], ignore_index=True),
+                                    rand.randint(len(PHONE_FORMATS), size=rows))
+    order = rand.permutation(rows)
+    result = result.iloc[order].reset_index(drop=True)
+    result["id"] = np.arange(1, rows + 1)
+
+    # every duplicate is paired with the first row of its entity, just like in restaurants_DPL.tsv
+    entityOf = np.concatenate([entity, of])[order]
+    clusters = pd.DataFrame({"entity": entityOf, "id": result.id}).groupby("entity").id
+    first = clusters.transform("min")
+    gold = pd.DataFrame({"id1": first, "id2": result.id})[first != result.id].sort_values(["id1", "id2"])
+    return result, gold.reset_index(drop=True)
+
+
+def writeDataset(df: pd.DataFrame, gold: pd.DataFrame, path: str):
+    """Writes the generated rows to path and the duplicate pairs next to it, with the suffix _DPL.tsv."""
+    df.to_csv(path, sep="\t", index=False)
+    gold.to_csv(goldPath(path), sep="\t", index=False)
+
+
+def goldPath(path: str) -> str:
+    return path[:-4] + "_DPL.tsv" if path.endswith(".tsv") else path + "_DPL.tsv"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generates a synthetic restaurant dataset with known duplicates")
+    parser.add_argument("--rows", type=int, default=100000, help="number of rows, default = 100000")
+    parser.add_argument("--duplicate-rate", type=float, default=0.2, help="share of duplicate rows, default = 0.2")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random number generator, default = 0")
+    parser.add_argument("--output", default=utils.PATH_PREFIX + "/synthetic.tsv",
+                        help="the tsv file to write, default = " + utils.PATH_PREFIX + "/synthetic.tsv")
+    args = parser.parse_args()
+
+    generated, goldPairs = generate(args.rows, args.duplicate_rate, args.seed)
+    writeDataset(generated, goldPairs, args.output)
+    print("Written {} rows with {} duplicate pairs to '{}'.".format(len(generated), len(goldPairs), args.output))
@@ -0,0 +1,40 @@
+import unittest
+
+import pandas as pd
+
+from src.blocking import candidatePairs, streetNumbers
+
+
+class TestBlocking(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "cname": ["arnie mortons of chicago", "arnie mortons", "cafe bizou", "bizou", "campanile"],
+            "caddress": ["435 s la cienega blvd", "435 s la cienega blvd", "14016 ventura blvd", "14016 ventura blvd",
+                         "624 s la brea ave"],
+            "city": ["los angeles", "los angeles", "sherman oaks", "studio city", "los angeles"],
+            "phone": ["3102461501", "3102461502", "8187883536", "8187883536", "2139381447"],
+        })
+
+    def test_street_numbers(self):
+        self.assertEqual((435,), streetNumbers("435 s la cienega blvd"))
+        self.assertEqual((1, 2), streetNumbers("1 main st 2nd floor 2"))
+        self.assertEqual((), streetNumbers("main st"))
+
+    def test_candidate_pairs(self):
+        pairs, pruned = candidatePairs(self.df)
+        self.assertEqual([(0, 1), (2, 3)], pairs)
+        self.assertEqual(10 - 2, pruned)
+
+    def test_candidate_pairs_custom_keys(self):
+        pairs, pruned = candidatePairs(self.df, ["rareNameTokens"])
+        self.assertIn((0, 1), pairs)
+        self.assertIn((2, 3), pairs)
+        self.assertNotIn((0, 4), pairs)
+
+        pairs, pruned = candidatePairs(self.df, [lambda df: df.city])
+        self.assertEqual([(0, 1), (0, 4), (1, 4)], pairs)
+        self.assertEqual(7, pruned)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,9 @@
 import unittest
-from src.clean import calcDistances, convertToEqualityRings
+
+import pandas as pd
+
+from src import clean, utils
+from src.clean import boundedDistances, calcDistances, convertToEqualityRings, preProcess
 
 
 class Test(unittest.TestCase):
@@ -27,6 +31,56 @@ class Test(unittest.TestCase):
         print(eqRing)
         # self.fail()
 
+    def test_bounded_distances_equal_unbounded(self):
+        names = set(preProcess(pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t')).cname.dropna())
+        for bias, cutoff in [(0.5, 0.45), (0.7, 0.65), (0.0, 0.3)]:
+            full = {frozenset(d[:2]): d[2] for d in calcDistances(names, bias, readFromFile=False, writeToFile=False)
+                    if d[2] >= cutoff}
+            bounded = calcDistances(names, bias, readFromFile=False, writeToFile=False, minDistance=cutoff,
+                                    bounded=True)
+            self.assertEqual(set(full), {frozenset(d[:2]) for d in bounded})
+            for s1, s2, d in bounded:
+                self.assertGreaterEqual(d, cutoff)
+                self.assertAlmostEqual(full[frozenset((s1, s2))], d, places=6)
+            # the size of the blocks doesn't change the result
+            small = boundedDistances(names, bias, minDistance=cutoff, pairsPerBlock=1000)
+            large = boundedDistances(names, bias, minDistance=cutoff)
+            self.assertEqual(small[0], large[0])
+            self.assertEqual({frozenset(p) for p in zip(small[1].tolist(), small[2].tolist())},
+                             {frozenset(p) for p in zip(large[1].tolist(), large[2].tolist())})
+
+    def test_bounded_distances_top_k(self):
+        names = ["pizza hut", "pizza hut express", "pizza palace", "golden dragon", "golden dragon palace",
+                 "blue star cafe", "star cafe", "cafe"]
+        strings, left, right, distances = boundedDistances(names, 0.5, topK=2, pairsPerBlock=3)
+        full = {frozenset(d[:2]): d[2] for d in calcDistances(names, 0.5, readFromFile=False, writeToFile=False)}
+        expected = set()
+        for name in names:
+            neighbours = sorted(((d, next(iter(pair - {name}))) for pair, d in full.items()
+                                 if name in pair), key=lambda x: (-x[0], strings.index(x[1])))
+            expected.update(frozenset((name, other)) for _, other in neighbours[:2])
+        self.assertEqual(expected, {frozenset((strings[l], strings[r])) for l, r in zip(left, right)})
+        self.assertEqual(sorted(distances, reverse=True), list(distances))
+        self.assertEqual("float32", distances.dtype.name)
+
+    def test_bounded_distances_blocks_are_bounded(self):
+        # more names than pairs per block, so even a single row doesn't fit into one block
+        names = sorted(set(preProcess(pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t'))
+                           .cname.dropna()))[:50]
+        full = boundedDistances(names, 0.5, minDistance=0.2)
+        clean.RECORDER.reset()
+        clean.RECORDER.enable()
+        try:
+            small = boundedDistances(names, 0.5, minDistance=0.2, pairsPerBlock=16)
+            topK = boundedDistances(names, 0.5, topK=3, pairsPerBlock=16)
+        finally:
+            clean.RECORDER.disable()
+        self.assertLessEqual(max(clean.RECORDER.histograms["distanceBlockPairs"]), 16)
+        self.assertEqual(2 * 50 * 49 // 2, clean.RECORDER.counters["pairsScored"])
+        self.assertEqual(set(zip(full[1].tolist(), full[2].tolist())), set(zip(small[1].tolist(), small[2].tolist())))
+        self.assertEqual({frozenset(p) for p in zip(*boundedDistances(names, 0.5, topK=3)[1:3])},
+                         {frozenset(p) for p in zip(topK[1].tolist(), topK[2].tolist())})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src import cli
+from src.test_incremental import restaurants
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestCli(unittest.TestCase):
+    def test_imports_are_lazy(self):
+        code = "import sys, cli, utils; cli.buildParser(); " \
+               "print('textdistance' in sys.modules, 'evaluation' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], cwd=SRC, stdout=subprocess.PIPE, check=True)
+        self.assertEqual("False False", output.stdout.decode().strip())
+
+    def test_help_without_pandas(self):
+        code = "import sys, cli\ntry:\n    cli.main(['--help'])\nexcept SystemExit:\n    print('pandas' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], cwd=SRC, stdout=subprocess.PIPE, check=True)
+        self.assertEqual("False", output.stdout.decode().strip().splitlines()[-1])
+
+    def test_dedupe_and_evaluate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            inputPath = os.path.join(directory, "restaurants.tsv")
+            groupsPath = os.path.join(directory, "groups.tsv")
+            restaurants().to_csv(inputPath, sep="\t", index=False)
+            pd.DataFrame({"id1": [1, 2], "id2": [3, 6]}).to_csv(os.path.join(directory, "gold.tsv"), sep="\t",
+                                                                index=False)
+            cli.main(["dedupe", "--input", inputPath, "--groups", groupsPath, "--no-gold"])
+            self.assertEqual([0, 1, 0, 2, 2, 1, -7], pd.read_csv(groupsPath, delimiter="\t").group.tolist())
+            self.assertEqual([{1, 3}, {2, 6}, {4, 5}], cli._readGroups(groupsPath))
+            cli.main(["dedupe", "--input", inputPath, "--groups", groupsPath + ".stream", "--stream", "--no-gold"])
+            with open(groupsPath) as expected, open(groupsPath + ".stream") as actual:
+                self.assertEqual(expected.read(), actual.read())
+            cli.main(["evaluate", "--groups", groupsPath, "--gold", os.path.join(directory, "gold.tsv"),
+                      "--total", "7"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src import utils
+from src.clean import preProcess
+from src.comparison import ALGORITHMS, compareAlgorithms
+from src.sweep import sweep, sweepDistances
+
+
+def restaurants():
+    return pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t').iloc[:60]
+
+
+class TestComparison(unittest.TestCase):
+    biases = [0.0, 0.5, 0.7]
+    cutoffs = [0.3, 0.45, 0.65, 0.9]
+
+    def test_jaccard_equals_sweep(self):
+        self.assertEqual(sweep(restaurants(), self.biases, self.cutoffs),
+                         compareAlgorithms(restaurants(), ["jaccard"], self.biases, self.cutoffs))
+
+    def test_equals_all_pairs(self):
+        df = preProcess(restaurants())
+        names = list(df.cname.unique())
+        left, right = np.triu_indices(len(names), 1)
+        expected = []
+        for algo in ["sorensen", "tanimoto", "levenshtein", "ratcliff_obershelp"]:
+            algorithm, onSets = ALGORITHMS[algo]
+            values = [name.split() for name in names] if onSets else names
+            distances = np.array([algorithm(values[i], values[j]) for i, j in zip(left, right)])
+            expected.extend(sweepDistances(df, names, left, right, distances, self.biases, self.cutoffs, algo, 60))
+        results = compareAlgorithms(restaurants(), ["sorensen", "tanimoto", "levenshtein", "ratcliff_obershelp"],
+                                    self.biases, self.cutoffs, workers=2)
+        self.assertEqual(expected, results)
+
+    def test_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            compareAlgorithms(restaurants(), ["jaccard", "unknown"], self.biases, self.cutoffs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pandas as pd
+
+from src import utils
+from src.clean import clean
+from src.deduplicator import Deduplicator
+from src.distancecache import DistanceCache, pairKeys, stringHashes
+
+
+def restaurants():
+    return pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t').iloc[:120]
+
+
+def groups(df: pd.DataFrame):
+    return sorted(sorted(ids) for ids in df.id)
+
+
+class TestDeduplicator(unittest.TestCase):
+    params = [(0.5, 0.45), (0.7, 0.65), (0.0, 0.9), (0.7, 0.3)]
+
+    def test_resolve_equals_clean(self):
+        deduplicator = Deduplicator().fit(restaurants())
+        for bias, cutoff in self.params:
+            expected = clean(restaurants(), bias, cutoff, readFromFile=False, writeToFile=False)
+            resolved = deduplicator.resolve(bias, cutoff)
+            self.assertEqual(groups(expected), groups(resolved))
+            self.assertEqual(utils.compareDfToGold(expected, total=120)[3],
+                             utils.compareDfToGold(resolved, total=120)[3])
+
+    def test_thresholds_reuse_distances(self):
+        deduplicator = Deduplicator().fit(restaurants())
+        with mock.patch.object(deduplicator, "_score", wraps=deduplicator._score) as score:
+            matches = deduplicator.match(0.5, 0.45)
+            deduplicator.match(0.9, 0.45)
+            deduplicator.match(0.0, 0.8)
+            self.assertEqual(1, score.call_count)
+            self.assertEqual(matches, deduplicator.match(0.5, 0.45))
+            # only the pairs below the former cutoff are scored
+            deduplicator.match(0.5, 0.2)
+            self.assertEqual(2, score.call_count)
+            (_, left1, right1), (_, left2, right2) = (call[0] for call in score.call_args_list)
+            self.assertFalse(set(zip(left1.tolist(), right1.tolist())) & set(zip(left2.tolist(), right2.tolist())))
+        self.assertEqual(matches, deduplicator.match(0.5, 0.45))
+
+    def test_concurrent_sessions(self):
+        deduplicators = [Deduplicator().fit(restaurants()), Deduplicator().fit(restaurants().iloc[::-1])]
+        expected = {(i, p): groups(d.resolve(*p)) for i, d in enumerate(deduplicators) for p in self.params}
+        fresh = [Deduplicator().fit(restaurants()), Deduplicator().fit(restaurants().iloc[::-1])]
+        with ThreadPoolExecutor(8) as executor:
+            keys = [(i, p) for _ in range(3) for i in range(2) for p in self.params]
+            results = list(executor.map(lambda key: groups(fresh[key[0]].resolve(*key[1])), keys))
+        for key, result in zip(keys, results):
+            self.assertEqual(expected[key], result)
+
+    def test_concurrent_sessions_share_cache_dir(self):
+        with tempfile.TemporaryDirectory() as cacheDir:
+            fresh = [Deduplicator(cacheDir=cacheDir).fit(restaurants().iloc[i::2]) for i in range(4)]
+            expected = [groups(Deduplicator().fit(restaurants().iloc[i::2]).resolve()) for i in range(4)]
+            with ThreadPoolExecutor(4) as executor:
+                results = list(executor.map(lambda d: groups(d.resolve()), fresh))
+            self.assertEqual(expected, results)
+            # the distances saved by every session are kept
+            keys = {key for d in fresh for key in pairKeys(stringHashes(d._state.names), d._state.left, d._state.right)}
+            self.assertEqual(len(keys), len(DistanceCache(cacheDir, "jaccard", "tokens")))
+
+    def test_config_is_copied(self):
+        deduplicator = Deduplicator({"useOldCalculation": True})
+        self.assertTrue(deduplicator.config["useOldCalculation"])
+        self.assertEqual((0.7, 0.65), (deduplicator.completelyInsideOtherBias, deduplicator.filterCutoff))
+        self.assertFalse(utils.config["useOldCalculation"])
+
+    def test_not_fitted(self):
+        with self.assertRaises(ValueError):
+            Deduplicator().resolve()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from src.distancecache import DistanceCache, pairKeys, stringHashes
+
+
+class TestDistanceCache(unittest.TestCase):
+    def test_pair_keys_are_order_independent(self):
+        hashes = stringHashes(["hello world", "hallo welt", "hellas amigos"])
+        self.assertEqual(list(pairKeys(hashes, np.array([0, 1]), np.array([1, 2]))),
+                         list(pairKeys(hashes, np.array([1, 2]), np.array([0, 1]))))
+        self.assertEqual(3, len(set(pairKeys(hashes, np.array([0, 0, 1]), np.array([1, 2, 2])))))
+
+    def test_lookup_only_returns_cached_pairs(self):
+        hashes = stringHashes(["a", "b", "c", "d"])
+        with tempfile.TemporaryDirectory() as path:
+            cache = DistanceCache(path, "jaccard", "tokens")
+            cache.add(pairKeys(hashes, np.array([0, 1]), np.array([1, 2])), [0.5, 0.25])
+            cache.save()
+
+            cache = DistanceCache(path, "jaccard", "tokens")
+            self.assertEqual(2, len(cache))
+            values, found = cache.lookup(pairKeys(hashes, np.array([1, 2, 0]), np.array([0, 3, 3])))
+            self.assertEqual([True, False, False], list(found))
+            self.assertEqual(0.5, values[0])
+
+            cache.add(pairKeys(hashes, np.array([2]), np.array([3])), [1.0])
+            cache.save()
+            values, found = DistanceCache(path, "jaccard", "tokens").lookup(pairKeys(hashes, np.array([3]),
+                                                                                     np.array([2])))
+            self.assertEqual([1.0], list(values))
+
+            self.assertEqual(0, len(DistanceCache(path, "jaccard", "chars")))
+
+    def test_concurrent_saves_keep_all_entries(self):
+        hashes = stringHashes([str(i) for i in range(210)])
+
+        def save(path, thread):
+            for batch in range(10):
+                cache = DistanceCache(path, "jaccard", "tokens")
+                left = np.arange(batch * 10, batch * 10 + 10)
+                cache.add(pairKeys(hashes, left, left + 100 + thread), [float(thread)] * 10)
+                cache.save()
+
+        with tempfile.TemporaryDirectory() as path:
+            threads = [threading.Thread(target=save, args=(path, thread)) for thread in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(400, len(DistanceCache(path, "jaccard", "tokens")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src import utils
+from src.evaluation import GoldStandard, pairsOf
+
+
+class TestEvaluation(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "dpl.tsv")
+        pd.DataFrame({"id1": [1, 3, 3, 7], "id2": [2, 4, 5, 8]}).to_csv(self.path, sep="\t", index=False)
+        self.nonDuplicatesPath = os.path.join(self.directory.name, "ndpl.tsv")
+        pd.DataFrame({"id1": [9, 2], "id2": [10, 11]}).to_csv(self.nonDuplicatesPath, sep="\t", index=False)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_lazy_loading(self):
+        gold = GoldStandard(os.path.join(self.directory.name, "missing.tsv"))
+        with self.assertRaises(FileNotFoundError):
+            _ = gold.sets
+
+    def test_sets(self):
+        gold = GoldStandard(self.path)
+        self.assertEqual([{1, 2}, {3, 4, 5}, {7, 8}], gold.sets)
+        self.assertEqual({(1, 2), (3, 4), (3, 5), (4, 5), (7, 8)}, gold.pairs)
+
+    def test_compare(self):
+        gold = GoldStandard(self.path)
+        tp, fn, fp = gold.compare([{2, 1}, {3, 4}, {9, 10}])
+        self.assertEqual({frozenset({1, 2})}, tp)
+        self.assertEqual({frozenset({3, 4, 5}), frozenset({7, 8})}, fn)
+        self.assertEqual({frozenset({3, 4}), frozenset({9, 10})}, fp)
+
+    def test_pairwise(self):
+        gold = GoldStandard(self.path, self.nonDuplicatesPath)
+        tp, fp, fn, precision, recall, fScore = gold.pairwise([{1, 2}, {3, 4}, {9, 10}])
+        self.assertEqual((2, 1, 3), (tp, fp, fn))
+        self.assertAlmostEqual(2 / 3, precision)
+        self.assertAlmostEqual(2 / 5, recall)
+        self.assertAlmostEqual(0.5, fScore)
+        self.assertEqual({(9, 10)}, gold.knownNonDuplicates([{1, 2}, {3, 4}, {9, 10}]))
+
+    def test_pairs_of(self):
+        self.assertEqual({(1, 2), (1, 3), (2, 3)}, pairsOf([{3, 1, 2}, {4}]))
+
+    def test_difference(self):
+        self.assertEqual(([{5}], [{1, 2}]), utils.difference([{1, 2}, {3}], [{3}, {5}]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src import cli, export
+from src.export import clusterKeys, exportFile, exportFrame, readManifest
+from src.main import deduplicate, preProcess
+from src.test_incremental import restaurants
+
+
+def _read(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "restaurants.tsv")
+        restaurants().to_csv(self.path, sep="\t", index=False)
+        self.output = os.path.join(self.directory.name, "export")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_cluster_keys(self):
+        self.assertEqual({1: 1, 3: 1, 2: 2, 6: 2}, clusterKeys([{3, 1}, {6, 2}]))
+
+    def test_export_file(self):
+        counts = exportFile(self.path, [{1, 3}, {2, 6}, {4, 5}], self.output, chunkSize=2, partitions=3, shards=2,
+                            batchSize=1)
+        self.assertEqual({"inserted": 4, "changed": 0, "unchanged": 0, "deleted": 0}, counts)
+        raw = _read(os.path.join(self.output, "raw-0.ndjson")) + _read(os.path.join(self.output, "raw-1.ndjson"))
+        self.assertEqual([[1, 3], [2, 6], [4, 5], [7]], sorted(document["id"] for document in raw))
+        self.assertEqual({2, 4}, {document["_id"] for document in _read(os.path.join(self.output, "raw-0.ndjson"))})
+        first = next(d for d in _read(os.path.join(self.output, "clean-1.ndjson")) if d["_id"] == 1)
+        self.assertEqual("arnie morton's of chicago", first["name"])
+        self.assertEqual(["american", "steakhouses"], first["type"])
+        self.assertEqual({1, 2, 4, 7}, set(readManifest(self.output)))
+
+    def test_diff(self):
+        exportFile(self.path, [{1, 3}, {2, 6}, {4, 5}], self.output)
+        counts = exportFile(self.path, [{1, 3}, {2, 6}, {4, 5}], self.output, diff=True)
+        self.assertEqual({"inserted": 0, "changed": 0, "unchanged": 4, "deleted": 0}, counts)
+        self.assertEqual([], _read(os.path.join(self.output, "raw-0.ndjson")))
+
+        # splitting a cluster changes the cluster keeping the smallest id and inserts the other one
+        counts = exportFile(self.path, [{1, 3}, {2, 6}], self.output, diff=True)
+        self.assertEqual({"inserted": 1, "changed": 1, "unchanged": 3, "deleted": 0}, counts)
+        self.assertEqual([4, 5], sorted(d["_id"] for d in _read(os.path.join(self.output, "clean-0.ndjson"))))
+
+        # merging them again deletes the cluster of the larger id
+        df = preProcess(restaurants())
+        counts = exportFrame(df, [{1, 3}, {2, 6}, {4, 5}], self.output, diff=True)
+        self.assertEqual({"inserted": 0, "changed": 1, "unchanged": 3, "deleted": 1}, counts)
+        self.assertEqual([{"_id": 5}], _read(os.path.join(self.output, "deleted.ndjson")))
+        self.assertEqual(list(preProcess(restaurants()).name), list(df.name))
+
+    def test_diff_after_changed_rules(self):
+        exportFile(self.path, [{1, 3}, {2, 6}, {4, 5}], self.output)
+        config = export.survivorship.utils.config
+        rules, sources = config["survivorshipRules"], config["preferredSources"]
+        config["survivorshipRules"], config["preferredSources"] = ["preferredSource:name"], ["arnie morton's"]
+        try:
+            counts = exportFile(self.path, [{1, 3}, {2, 6}, {4, 5}], self.output, diff=True)
+        finally:
+            config["survivorshipRules"], config["preferredSources"] = rules, sources
+        # only the canonical record of the cluster of arnie morton's changes
+        self.assertEqual({"inserted": 0, "changed": 1, "unchanged": 3, "deleted": 0}, counts)
+        self.assertEqual([{"_id": 1, "name": "arnie morton's"}],
+                         [{"_id": d["_id"], "name": d["name"]} for d in _read(os.path.join(self.output,
+                                                                                         "clean-0.ndjson"))])
+
+    def test_export_frame_equals_export_file(self):
+        _, dupes = deduplicate(restaurants())
+        exportFile(self.path, dupes, self.output)
+        fileManifest = readManifest(self.output)
+        exportFrame(preProcess(restaurants()), dupes, self.output + "2", partitions=2)
+        self.assertEqual(fileManifest, readManifest(self.output + "2"))
+
+    def test_cli(self):
+        groupsPath = os.path.join(self.directory.name, "groups.tsv")
+        cli.main(["dedupe", "--input", self.path, "--groups", groupsPath, "--no-gold"])
+        cli.main(["export", "--input", self.path, "--groups", groupsPath, "--ndjson", "--output", self.output,
+                  "--shards", "2"])
+        cli.main(["export", "--input", self.path, "--groups", groupsPath, "--ndjson", "--output", self.output,
+                  "--diff"])
+        self.assertEqual([], _read(os.path.join(self.output, "raw-0.ndjson")))
+        self.assertEqual(4, len(readManifest(self.output)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import textdistance as td
+
+from src.features import areRowsSameBatch
+from src.main import areRowsSame
+from src.recordstore import RecordStore, TextColumn
+
+
+class TestFeatures(unittest.TestCase):
+    def test_jaccard_equals_textdistance(self):
+        strings = ["hello world test", "test world hello", "hello hello world", "hella", "", "a b a", "b a b"]
+        features = TextColumn(strings)
+        left, right = np.array(list(combinations(range(len(strings)), 2))).T
+        left = np.concatenate([left, np.arange(len(strings))])
+        right = np.concatenate([right, np.arange(len(strings))])
+        for i, j, tokenSim, charSim in zip(left, right, features.tokenJaccard(left, right),
+                                           features.charJaccard(left, right)):
+            self.assertEqual(td.jaccard(strings[i].split(), strings[j].split()), tokenSim)
+            self.assertEqual(td.jaccard(strings[i], strings[j]), charSim)
+
+    def test_are_rows_same_batch(self):
+        df = pd.DataFrame({
+            "id": [1, 2, 3, 4, 5, 6],
+            "cname": ["arts delicatessen", "arts deli", "cafe bizou", "cafe bizou", "bizou", "campanile"],
+            "caddress": ["12224 ventura blvd", "12224 ventura blvd", "14016 ventura blvd", "14016 ventura blvd",
+                         "14016 ventura blvd", "624 s la brea ave"],
+            "city": ["studio city", "studio city", "sherman oaks", "sherman oaks", "sherman oaks", "los angeles"],
+            "phone": ["8187621221", "8187621221", "8187883536", "8187883537", np.nan, np.nan],
+        })
+        rows = list(df.itertuples())
+        left, right = np.triu_indices(len(df), 1)
+        for minTokenDistance, minTextDistance in [(0.5, 0.9), (0.2, 0.3), (1.0, 1.0)]:
+            same = areRowsSameBatch(RecordStore(df), left, right, minTokenDistance, minTextDistance)
+            expected = [areRowsSame(rows[i], rows[j], td.jaccard, minTokenDistance, minTextDistance)
+                        for i, j in zip(left, right)]
+            self.assertEqual(expected, list(same))
+
+
+if __name__ == '__main__':
+    unittest.main()
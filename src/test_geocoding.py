@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+import pandas as pd
+
+from src.geocoding import GeocodeCache, RateLimiter, ReplayBackend, geocode, normalizedAddress
+
+
+def _rows():
+    return pd.DataFrame({"id": [1, 2, 3, 4],
+                         "address": ["435 s. la cienega blv.", "435 S. La Cienega Blvd.", "12224 ventura blvd.",
+                                     "1022 3rd ave."],
+                         "city": ["los angeles", "los angeles", "studio city", "new york city"]})
+
+
+class _FakeBackend:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def __call__(self, address):
+        with self.lock:
+            self.queries.append(address)
+            if self.failures > 0:
+                self.failures -= 1
+                raise IOError("timeout")
+        return [{"formatted_address": address}]
+
+
+class TestGeocoding(unittest.TestCase):
+    def test_normalized_address(self):
+        self.assertEqual(normalizedAddress("435 s. la cienega blv.", "los angeles"),
+                         normalizedAddress("435 S. La Cienega  Blvd. ", "Los Angeles"))
+        self.assertEqual("1022 3rd ave., new york", normalizedAddress("1022 3rd av.", "new york city"))
+
+    def test_geocode_dedupes_and_caches(self):
+        backend = _FakeBackend()
+        with tempfile.TemporaryDirectory() as directory:
+            df = _rows()
+            geocoded = geocode(df, backend, GeocodeCache(directory), rate=None)
+            self.assertNotIn("google_geocode", df)
+            self.assertEqual(3, len(backend.queries))
+            # both spellings of the first address get the response of the first row
+            self.assertEqual(geocoded.google_geocode[0], geocoded.google_geocode[1])
+            self.assertEqual("435 s. la cienega blv., los angeles",
+                             json.loads(geocoded.google_geocode[1])[0]["formatted_address"])
+
+            again = geocode(df, backend, GeocodeCache(directory), rate=None)
+            self.assertEqual(3, len(backend.queries))
+            self.assertEqual(geocoded.google_geocode.tolist(), again.google_geocode.tolist())
+
+    def test_cache_ignores_partial_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = GeocodeCache(directory)
+            cache.add("a, b", [])
+            cache.save()
+            with open(cache.file, "a") as file:
+                file.write('{"address": "c, d", "res')
+            self.assertEqual({"a, b": []}, GeocodeCache(directory).entries)
+
+    def test_retries_and_failures(self):
+        geocoded = geocode(_rows(), _FakeBackend(failures=2), rate=None, retries=2, backoff=0, workers=1)
+        self.assertTrue(geocoded.google_geocode.notna().all())
+        geocoded = geocode(_rows(), _FakeBackend(failures=3), rate=None, retries=2, backoff=0, workers=1)
+        # the first address failed three times, the other ones are found
+        self.assertTrue(geocoded.google_geocode[:2].isna().all())
+        self.assertTrue(geocoded.google_geocode[2:].notna().all())
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter(1000.0)
+        slots = []
+        for _ in range(5):
+            limiter.wait()
+            slots.append(limiter.next)
+        self.assertTrue(all(b - a >= 0.001 - 1e-9 for a, b in zip(slots, slots[1:])))
+
+    def test_replay_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "geocoded.csv")
+            _rows().assign(google_geocode=json.dumps([{"place_id": "p"}])).to_csv(path, index=False)
+            backend = ReplayBackend(path)
+            self.assertEqual([{"place_id": "p"}], backend("1022 3rd ave., new york city"))
+            self.assertEqual([], backend("unknown, nowhere"))
+            self.assertEqual(2, backend.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
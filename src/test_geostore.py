@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.geostore import GeocodeStore, SpatialIndex, haversineKm, parseGeocode
+
+
+def _geocode(lat, lng, placeId="p", postalCode="90069"):
+    return [{"geometry": {"location": {"lat": lat, "lng": lng}}, "place_id": placeId,
+             "formatted_address": "435 S La Cienega Blvd, Los Angeles",
+             "address_components": [{"long_name": postalCode, "types": ["postal_code"]}]}]
+
+
+def _bruteForce(keys, lat, lng, queryLat, queryLng):
+    distances = haversineKm(queryLat, queryLng, lat, lng)
+    return sorted(zip(distances.tolist(), keys.tolist()))
+
+
+class TestGeostore(unittest.TestCase):
+    def test_parse_geocode(self):
+        parsed = parseGeocode(json.dumps(_geocode(34.07, -118.38)))
+        self.assertEqual({"lat": 34.07, "lng": -118.38, "placeId": "p",
+                          "formattedAddress": "435 S La Cienega Blvd, Los Angeles", "postalCode": "90069"}, parsed)
+        # the older files contain the repr of the python list
+        self.assertEqual(parsed, parseGeocode(repr(_geocode(34.07, -118.38))))
+        self.assertTrue(np.isnan(parseGeocode("[]")["lat"]))
+        self.assertEqual("", parseGeocode(float("nan"))["placeId"])
+
+    def test_save_and_load(self):
+        store = GeocodeStore.fromRecords([3, 1], [parseGeocode(json.dumps(_geocode(34.0, -118.0, "ä"))),
+                                                  parseGeocode("[]")])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "geocodes")
+            store.save(path)
+            loaded = GeocodeStore.load(path)
+            self.assertEqual(2, len(loaded))
+            self.assertEqual("ä", loaded.record(3)["placeId"])
+            self.assertEqual(-118.0, loaded.record(3)["lng"])
+            self.assertTrue(np.isnan(loaded.record(1)["lat"]))
+            self.assertRaises(KeyError, loaded.position, 2)
+
+    def test_queries_equal_brute_force(self):
+        rand = np.random.RandomState(0)
+        for centerLat, cellDegrees in [(34.0, 0.02), (70.0, 0.05), (-45.0, 0.001)]:
+            lat = centerLat + rand.uniform(-1, 1, 500)
+            lng = 179 + rand.uniform(-1, 0.9, 500)
+            keys = np.arange(500)
+            index = SpatialIndex(keys, lat, lng, cellDegrees)
+            for queryLat, queryLng in zip(centerLat + rand.uniform(-1.5, 1.5, 20), 179 + rand.uniform(-1.5, 1, 20)):
+                expected = _bruteForce(keys, lat, lng, queryLat, queryLng)
+                nearest = index.nearest(queryLat, queryLng, 5)
+                self.assertEqual([k for _, k in expected[:5]], [k for k, _ in nearest])
+                within = index.within(queryLat, queryLng, 20.0)
+                self.assertEqual([k for d, k in expected if d <= 20.0], [k for k, _ in within])
+
+    def test_from_store_indexes_every_cluster_once(self):
+        records = [parseGeocode("[]"), parseGeocode(json.dumps(_geocode(34.0, -118.0))),
+                   parseGeocode(json.dumps(_geocode(34.1, -118.0))), parseGeocode(json.dumps(_geocode(35.0, -118.0)))]
+        index = SpatialIndex.fromStore(GeocodeStore.fromRecords([1, 2, 3, 4], records), [{1, 2, 3}])
+        self.assertEqual(2, len(index))
+        # the cluster key is 1, but its coordinates are the ones of 2, the smallest id with a geocode
+        key, distance = index.nearest(34.0, -118.0)[0]
+        self.assertEqual(1, key)
+        self.assertAlmostEqual(0.0, distance)
+        self.assertEqual([1, 4], [k for k, _ in index.nearest(34.0, -118.0, 10)])
+        self.assertEqual([], SpatialIndex([], [], []).nearest(0.0, 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
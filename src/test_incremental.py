@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src import incremental
+from src.incremental import ResolvedStore
+from src.main import deduplicate
+
+
+def restaurants() -> pd.DataFrame:
+    return pd.DataFrame({
+        "id": [1, 2, 3, 4, 5, 6, 7],
+        "name": ["arnie morton's of chicago", "campanile", "arnie morton's", "cafe bizou", "cafe bizou (french)",
+                 "campanile", "hotel bel-air"],
+        "address": ["435 s. la cienega blv.", "624 s. la brea ave.", "435 s. la cienega blvd.",
+                    "14016 ventura blvd.", "14016 ventura blvd.", "624 s. la brea ave.", "701 stone canyon rd."],
+        "city": ["los angeles", "los angeles", "los angeles", "sherman oaks", "sherman oaks", "los angeles",
+                 "bel air"],
+        "phone": ["310/246-1501", "213-938-1447", "310-246-1501", "818/788-3536", "818-788-3536", "213/938-1447",
+                  "310-472-1211"],
+        "type": ["american", "american", "steakhouses", "french", "french bistro", "californian", "californian"],
+    })
+
+
+class TestIncremental(unittest.TestCase):
+    def test_batches_equal_full_run(self):
+        fullDf, fullDupes = deduplicate(restaurants())
+        for cuts in [[7], [3, 7], [1, 2, 5, 7]]:
+            store = ResolvedStore()
+            start = 0
+            for end in cuts:
+                store.add(restaurants().iloc[start:end])
+                start = end
+            df, dupes = store.result()
+            self.assertEqual(fullDupes, dupes)
+            self.assertTrue(fullDf.equals(df))
+
+    def test_save_and_load(self):
+        store = ResolvedStore()
+        store.add(restaurants().iloc[:4])
+        with tempfile.TemporaryDirectory() as path:
+            store.save(path)
+            store = ResolvedStore.load(path)
+        store.add(restaurants().iloc[4:])
+        self.assertEqual(deduplicate(restaurants())[1], store.result()[1])
+
+    def test_save_appends_segments(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = ResolvedStore()
+            store.add(restaurants().iloc[:3])
+            store.save(path)
+            first = os.path.join(path, ResolvedStore.SEGMENT_FILES.format(0))
+            modified = os.stat(first).st_mtime_ns
+            store.add(restaurants().iloc[3:5])
+            # reading the rows concatenates the segments, the saved segments stay the same
+            self.assertEqual(5, len(store.rows))
+            store.add(restaurants().iloc[5:])
+            store.save(path)
+            self.assertEqual(modified, os.stat(first).st_mtime_ns)
+            self.assertEqual(3, len([f for f in os.listdir(path) if f.startswith("resolved_segment_")]))
+            loaded = ResolvedStore.load(path)
+        self.assertEqual(store.clusters, loaded.clusters)
+        self.assertTrue(store.result()[0].equals(loaded.result()[0]))
+
+    def test_add_work_is_independent_of_the_store_size(self):
+        def stored(count: int) -> pd.DataFrame:
+            # rows sharing no blocking key with restaurants, every tenth row is a duplicate of the row before it
+            k = [i - (i % 10 == 9) for i in range(count)]
+            return pd.DataFrame({"id": range(1, count + 1), "name": ["stored {}".format(i) for i in k],
+                                 "address": ["{} main st.".format(1000 + i) for i in k],
+                                 "city": ["springfield"] * count, "phone": ["555-{:07d}".format(i) for i in k],
+                                 "type": ["american"] * count})
+
+        counters = []
+        for count in [50, 500]:
+            store = ResolvedStore()
+            store.add(stored(count))
+            delta = restaurants()
+            delta["id"] += count
+            incremental.RECORDER.reset()
+            incremental.RECORDER.enable()
+            try:
+                store.add(delta.iloc[:3])
+                store.add(delta.iloc[3:])
+            finally:
+                incremental.RECORDER.disable()
+            counters.append({name: incremental.RECORDER.counters[name]
+                             for name in ["storeRowsGathered", "storeClustersMerged", "pairsScored"]})
+            self.assertEqual(count // 10 + 3, len(store.clusters))
+        self.assertEqual(counters[0], counters[1])
+        self.assertGreater(counters[0]["storeRowsGathered"], 0)
+
+    def test_dataset_dependent_keys_are_rejected(self):
+        with self.assertRaises(ValueError):
+            ResolvedStore(["phone", "rareNameTokens"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from src.instrumentation import Recorder
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        recorder = Recorder()
+        with recorder.stage("a"):
+            recorder.count("pairs", 3)
+            recorder.histogram("clusterSize", [2, 3])
+        report = recorder.report()
+        self.assertEqual({}, report["stages"])
+        self.assertEqual({}, report["counters"])
+        self.assertEqual({}, report["histograms"])
+
+    def test_nested_stages_and_counters(self):
+        recorder = Recorder()
+        recorder.enable()
+        for _ in range(2):
+            with recorder.stage("deduplicate"):
+                with recorder.stage("matchPairs"):
+                    recorder.count("pairsScored", 5)
+        recorder.histogram("clusterSize", [2, 2, 3])
+        report = recorder.report()
+        self.assertEqual({"deduplicate", "deduplicate/matchPairs"}, set(report["stages"]))
+        self.assertEqual(2, report["stages"]["deduplicate/matchPairs"]["calls"])
+        self.assertEqual({"pairsScored": 10}, report["counters"])
+        self.assertEqual({"2": 2, "3": 1}, report["histograms"]["clusterSize"])
+
+    def test_stage_is_recorded_on_exception(self):
+        recorder = Recorder()
+        recorder.enable()
+        with self.assertRaises(KeyError):
+            with recorder.stage("failing"):
+                raise KeyError()
+        self.assertEqual(1, recorder.report()["stages"]["failing"]["calls"])
+
+    def test_memory_is_relative_to_the_stage(self):
+        recorder = Recorder()
+        recorder.enable()
+        with recorder.stage("heavy"):
+            # every page is written, so it is resident
+            data = bytearray(200 * 1024 * 1024)
+            data[::4096] = b"x" * len(data[::4096])
+        del data
+        with recorder.stage("light"):
+            sum(range(1000))
+        stages = recorder.report()["stages"]
+        if sys.platform.startswith("linux"):
+            self.assertGreater(stages["heavy"]["rssIncreaseMb"], 100)
+        # the peak of the heavy stage isn't reported for the light stage after it
+        self.assertLess(stages["light"]["peakRssIncreaseMb"], 10)
+        self.assertLess(stages["light"]["rssIncreaseMb"], 10)
+
+    def test_write_report_and_profile(self):
+        recorder = Recorder()
+        recorder.enable(profileStage="profiled")
+        with recorder.stage("outer"):
+            with recorder.stage("profiled"):
+                sum(range(1000))
+        with tempfile.TemporaryDirectory() as directory:
+            reportPath = os.path.join(directory, "report.json")
+            recorder.writeReport(reportPath, reportPath + ".prof")
+            with open(reportPath) as file:
+                self.assertIn("outer/profiled", json.load(file)["stages"])
+            self.assertTrue(os.path.exists(reportPath + ".prof"))
+
+
+if __name__ == '__main__':
+    unittest.main()
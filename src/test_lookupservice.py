@@ -0,0 +1,77 @@
+import asyncio
+import json
+import unittest
+
+from src.lookupservice import MatchIndex, MatchService
+from src.main import deduplicate
+from src.test_incremental import restaurants
+
+
+class TestLookupService(unittest.TestCase):
+    def setUp(self):
+        self.index = MatchIndex.fromFrame(restaurants().iloc[:6])
+
+    def test_match_equals_deduplicate(self):
+        _, dupes = deduplicate(restaurants())
+        index = MatchIndex.fromFrame(restaurants())
+        results = index.match(restaurants().to_dict("records"))
+        for rowId, result in zip(restaurants().id, results):
+            expected = {rowId} | {i for dupeSet in dupes if rowId in dupeSet for i in dupeSet}
+            self.assertEqual(sorted(expected), result["ids"])
+            self.assertEqual([min(expected)], result["clusters"])
+
+    def test_match(self):
+        result = self.index.match([{"name": "arnie morton's", "address": "435 S. La Cienega Blvd.",
+                                    "city": "los angeles", "phone": "310-246-1501"}])[0]
+        self.assertEqual({"matched": True, "clusters": [1], "ids": [1, 3], "candidates": 2}, result)
+        self.assertEqual([{"matched": False, "clusters": [], "ids": [], "candidates": 0}],
+                         self.index.match(restaurants().iloc[6:].to_dict("records")))
+        self.assertEqual([], self.index.match([]))
+
+    def test_missing_values(self):
+        result = self.index.match([{"name": None, "phone": None}, {"name": "campanile", "address": "624 s la brea ave",
+                                                                    "city": "los angeles"}])
+        self.assertEqual({"matched": False, "clusters": [], "ids": [], "candidates": 0}, result[0])
+        # no phone, but the same city, street number and similar names
+        self.assertEqual([2, 6], result[1]["ids"])
+        self.assertEqual([2], result[1]["clusters"])
+
+    def test_service(self):
+        async def request(reader, writer, method, path, payload=None):
+            body = json.dumps(payload).encode() if payload is not None else b""
+            writer.write("{} {} HTTP/1.1\r\nContent-Length: {}\r\n\r\n".format(method, path, len(body)).encode() + body)
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b"\r\n":
+                    break
+                if line.lower().startswith(b"content-length"):
+                    length = int(line.split(b":")[1])
+            return status, json.loads(await reader.readexactly(length))
+
+        async def run():
+            service = MatchService(self.index, maxBatch=4)
+            server = await service.start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            connections = [await asyncio.open_connection("127.0.0.1", port) for _ in range(3)]
+            reader, writer = connections[0]
+            self.assertEqual((200, {"rows": 6, "clusters": 3}), await request(reader, writer, "GET", "/health"))
+            self.assertEqual(404, (await request(reader, writer, "GET", "/unknown"))[0])
+            self.assertEqual(400, (await request(reader, writer, "POST", "/match", "text"))[0])
+            listings = restaurants().drop(columns="id").to_dict("records")
+            responses = await asyncio.gather(*(request(r, w, "POST", "/match", listings[i])
+                                               for i, (r, w) in enumerate(connections)))
+            self.assertEqual([[1], [2], [1]], [response["clusters"] for _, response in responses])
+            status, batch = await request(reader, writer, "POST", "/match", listings)
+            self.assertEqual([[1], [2], [1], [4], [4], [2], []], [response["clusters"] for response in batch])
+            for _, w in connections:
+                w.close()
+            server.close()
+            await server.wait_closed()
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
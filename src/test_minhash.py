@@ -0,0 +1,80 @@
+import unittest
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from src import main
+from src.features import minHashCandidates
+from src.minhash import bucketPairs, candidatePairs, collisionProbability, sharesBucket
+from src.recordstore import RecordStore, TextColumn
+from src.test_simjoin import _randomNames
+
+
+class TestMinHash(unittest.TestCase):
+    def test_bucket_pairs(self):
+        left, right = bucketPairs(np.array([5, 3, 5, 5, 3, 7], dtype=np.uint64))
+        self.assertEqual({(0, 2), (0, 3), (2, 3), (1, 4)}, set(zip(left.tolist(), right.tolist())))
+        self.assertEqual(0, len(bucketPairs(np.array([1, 2, 3], dtype=np.uint64))[0]))
+
+    def test_collision_probability(self):
+        self.assertAlmostEqual(1.0, collisionProbability(1.0, 8, 4))
+        self.assertAlmostEqual(1 - (1 - 0.5 ** 4) ** 8, collisionProbability(0.5, 8, 4))
+
+    def test_candidate_pairs_find_similar_pairs(self):
+        column = TextColumn(_randomNames(300) + [" ", ""])
+        everything = np.array(list(combinations(range(len(column.strings)), 2)))
+        similarities = column.tokenJaccard(everything[:, 0], everything[:, 1])
+        left, right = candidatePairs(column, bands=64, rows=2)
+        found = set(zip(left.tolist(), right.tolist()))
+        self.assertTrue((left < right).all())
+        self.assertLessEqual(set(map(tuple, everything[similarities == 1].tolist())), found)
+        similar = set(map(tuple, everything[similarities >= 0.6].tolist()))
+        self.assertGreater(len(similar & found), 0.95 * len(similar))
+        self.assertLess(len(found), len(everything))
+
+    def test_shares_bucket_equals_candidate_pairs(self):
+        column = TextColumn(_randomNames(100))
+        everything = np.array(list(combinations(range(len(column.strings)), 2)))
+        for chars in (False, True):
+            found = set(zip(*(side.tolist() for side in candidatePairs(column, chars, 8, 3))))
+            shared = sharesBucket(column, everything[:, 1], everything[:, 0], chars, 8, 3)
+            self.assertEqual(found, set(map(tuple, everything[shared].tolist())))
+
+    def test_min_hash_candidates_keep_same_phones(self):
+        df = pd.DataFrame({
+            "cname": ["cafe bizou", "bizou", "cafe bizou", "campanile", np.nan],
+            "caddress": ["14016 ventura blvd"] * 5,
+            "city": ["sherman oaks"] * 5,
+            "phone": ["8187883536", "8187883536", "1", "2", "3"],
+        })
+        left, right = np.triu_indices(len(df), 1)
+        selected = minHashCandidates(RecordStore(df), left, right)
+        pairs = set(zip(left[selected].tolist(), right[selected].tolist()))
+        self.assertIn((0, 1), pairs)
+        self.assertIn((0, 2), pairs)
+        self.assertNotIn((0, 3), pairs)
+        self.assertFalse(any(4 in pair for pair in pairs))
+
+    def test_approximate_deduplicate(self):
+        df = pd.DataFrame({
+            "id": [1, 2, 3, 4, 5, 6],
+            "name": ["Arts Delicatessen", "Arts Deli", "Cafe Bizou", "Cafe Bizou", "Bizou", "Campanile"],
+            "address": ["12224 Ventura Blvd.", "12224 Ventura Blvd.", "14016 Ventura Blvd.", "14016 Ventura Blvd.",
+                        "14016 Ventura Blvd.", "624 S. La Brea Ave."],
+            "city": ["Studio City", "Studio City", "Sherman Oaks", "Sherman Oaks", "Sherman Oaks", "Los Angeles"],
+            "phone": ["818/762-1221", "818/762-1221", "818/788-3536", "818-788-3536", "818/788-3536", "213/938-1447"],
+            "type": ["delis", "delis", "french", "french", "french", "american"],
+        })
+        oldStats = main.utils.config["printBlockingStats"]
+        main.utils.config["printBlockingStats"] = False
+        try:
+            _, exact = main.deduplicate(df.copy())
+            _, approximate = main.deduplicate(df.copy(), approximate=True)
+        finally:
+            main.utils.config["printBlockingStats"] = oldStats
+        self.assertEqual(sorted(map(sorted, exact)), sorted(map(sorted, approximate)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from src import clean, main, utils
+from src.parallel import mapChunks, splitPairs
+
+
+def _sumChunk(shared, left, right):
+    return [shared[i] + shared[j] for i, j in zip(left, right)]
+
+
+class TestParallel(unittest.TestCase):
+    def test_split_pairs(self):
+        left, right = np.triu_indices(5, 1)
+        chunks = splitPairs(left, right, 3)
+        self.assertEqual(4, len(chunks))
+        self.assertEqual(list(left), [i for l, _ in chunks for i in l])
+        self.assertEqual(list(right), [j for _, r in chunks for j in r])
+
+    def test_map_chunks_equals_serial(self):
+        shared = list(range(100, 120))
+        chunks = splitPairs(*np.triu_indices(len(shared), 1), 7)
+        self.assertEqual(mapChunks(_sumChunk, shared, chunks), mapChunks(_sumChunk, shared, chunks, workers=3))
+
+    def _parallel(self):
+        # small chunks, so the few pairs of the tests are split into several chunks and really sent to a pool
+        return mock.patch.multiple(clean.parallel, MIN_CHUNK_SIZE=2,
+                                   ProcessPoolExecutor=mock.Mock(wraps=ProcessPoolExecutor))
+
+    def test_calc_distances_workers(self):
+        strings = {"hallo welt", "hello world", "hellas amigos", "hello amigos", "world", "hello", "amigos world"}
+        serial = clean.calcDistances(strings, readFromFile=False, writeToFile=False)
+        with self._parallel():
+            parallel = clean.calcDistances(strings, readFromFile=False, writeToFile=False, workers=2)
+            self.assertEqual(1, clean.parallel.ProcessPoolExecutor.call_count)
+        self.assertEqual(serial, parallel)
+
+    def test_deduplicate_workers(self):
+        def restaurants():
+            return pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t').iloc[:200]
+
+        printBlockingStats = main.utils.config["printBlockingStats"]
+        main.utils.config["printBlockingStats"] = False
+        try:
+            serialDf, serialSets = main.deduplicate(restaurants())
+            with self._parallel():
+                parallelDf, parallelSets = main.deduplicate(restaurants(), workers=2)
+                self.assertEqual(1, main.parallel.ProcessPoolExecutor.call_count)
+        finally:
+            main.utils.config["printBlockingStats"] = printBlockingStats
+        self.assertEqual(serialSets, parallelSets)
+        pd.testing.assert_frame_equal(serialDf, parallelDf)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.benchmark_preprocessing import legacyPreProcess
+from src.preprocessing import Pipeline, preProcess
+
+
+def restaurants() -> pd.DataFrame:
+    return pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "name": ["arnie morton's of chicago", "Cafe Bizou (French)", "the palm  the", np.nan],
+        "address": ["435 s. la cienega blv.", "14016 Ventura Av. between 1st and 2nd", "W. 56th sts", np.nan],
+        "city": ["w. hollywood", "new york city", "LA", np.nan],
+        "phone": ["310/246-1501", "818-788-3536", np.nan, "212 555 0000"],
+        "type": ["american", "french (new)", np.nan, "213 456 7890 american"],
+    })
+
+
+class TestPreprocessing(unittest.TestCase):
+    def test_equals_legacy(self):
+        expected = legacyPreProcess(restaurants())
+        self.assertTrue(expected.equals(preProcess(restaurants(), Pipeline())))
+
+    def test_normalized_values(self):
+        df = preProcess(restaurants(), Pipeline())
+        self.assertEqual("435 s la cienega blvd.", df.address[0])
+        self.assertEqual("west hollywood", df.city[0])
+        self.assertEqual("3102461501", df.phone[0])
+        self.assertEqual("Cafe Bizou", df.name[1])
+        self.assertEqual("french", df.type[1])
+        self.assertEqual("", df.type[2])
+        self.assertEqual("american", df.type[3])
+        self.assertEqual("arnie mortons of chicago", df.cname[0])
+        self.assertTrue(pd.isna(df.cname[3]))
+
+    def test_memo_is_reused(self):
+        pipeline = Pipeline()
+        first = preProcess(restaurants(), pipeline)
+        self.assertEqual(4, len(pipeline.memo["name"]))
+        misses = pipeline.misses
+        self.assertTrue(first.equals(preProcess(restaurants(), pipeline)))
+        # every value of the second run is taken from the memo
+        self.assertEqual(misses, pipeline.misses)
+        self.assertGreater(pipeline.hits, 0)
+
+    def test_memo_limit(self):
+        df = pd.concat([restaurants().assign(name=lambda d: d.name + " " + str(i)) for i in range(20)],
+                       ignore_index=True)
+        pipeline = Pipeline(memoLimit=10)
+        limited = preProcess(df.copy(), pipeline)
+        self.assertLessEqual(pipeline.memoSize, 10)
+        self.assertLessEqual(sum(map(len, pipeline.memo.values())), 10)
+        self.assertTrue(preProcess(df.copy(), Pipeline(memoLimit=None)).equals(limited))
+
+
+if __name__ == '__main__':
+    unittest.main()
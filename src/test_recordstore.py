@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.recordstore import MISSING, RecordStore, TextColumn, Vocabulary, isSame, phoneNumbers
+
+
+class TestRecordStore(unittest.TestCase):
+    def test_phone_numbers(self):
+        phones = phoneNumbers(pd.Series(["3102461501", "3102461501", "0123", "abc", "abc", np.nan, "123"]))
+        self.assertEqual(3102461501, phones[0])
+        self.assertEqual(123, phones[6])
+        # values, that aren't plain numbers, get negative codes and never equal a number
+        self.assertLess(phones[2], MISSING)
+        self.assertEqual(phones[3], phones[4])
+        self.assertNotEqual(phones[2], phones[3])
+        self.assertEqual(MISSING, phones[5])
+        left, right = np.array([0, 3, 5]), np.array([1, 4, 5])
+        self.assertEqual([True, True, False], list(isSame(phones, left, right)))
+
+    def test_text_column_interns_distinct_values(self):
+        vocabulary = Vocabulary()
+        names = TextColumn(["cafe bizou", "campanile", "cafe bizou", np.nan], vocabulary)
+        addresses = TextColumn(["14016 ventura blvd", "624 s la brea ave"], vocabulary)
+        self.assertEqual([0, 1, 0, MISSING], list(names.codes))
+        self.assertEqual(2, len(names.strings))
+        self.assertEqual(11, len(vocabulary))
+        self.assertEqual(np.uint8, names.charCounts.dtype)
+        self.assertEqual([3, 4, 5], list(addresses.tokenIds[:3]))
+        self.assertEqual([1.0, 0.0], list(names.tokenJaccard(np.array([0, 0]), np.array([0, 1]))))
+
+    def test_record_store(self):
+        df = pd.DataFrame({
+            "phone": ["8187621221", "8187621221", np.nan],
+            "city": ["studio city", "studio city", np.nan],
+            "type": ["american", "delis", "delis"],
+            "cname": ["arts delicatessen", "arts deli", "arts deli"],
+            "caddress": ["12224 ventura blvd", "12224 ventura blvd 2", "ventura blvd"],
+        })
+        store = RecordStore(df)
+        self.assertEqual(3, len(store))
+        self.assertEqual([0, 0, MISSING], list(store.cityCodes))
+        self.assertEqual([0, 1, 1], list(store.typeCodes))
+        self.assertEqual([12224, 12224, 2], list(store.numberValues))
+        self.assertEqual([0, 1, 3, 3], list(store.numberIndptr))
+        self.assertEqual(3, len(set(store.numberCodes)))
+        self.assertGreater(store.nbytes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from itertools import combinations
+
+import numpy as np
+
+from src import clean
+from src.recordstore import TextColumn
+from src.simjoin import candidatePairs, containmentCandidates, elementSets, jaccardCandidates
+
+
+def _randomNames(count, seed=0):
+    rand = np.random.RandomState(seed)
+    tokens = ["cafe", "bizou", "grill", "the", "palm", "art", "arts", "deli", "la", "bistro", "b", "o"]
+    names = {" ".join(rand.choice(tokens, size=rand.randint(0, 5))) for _ in range(count)}
+    return sorted(names)
+
+
+class Test(unittest.TestCase):
+    def test_element_sets_keep_repeated_tokens(self):
+        column = TextColumn(["the palm the", "the palm"])
+        indptr, ranks = elementSets(column)
+        self.assertEqual([0, 3, 5], indptr.tolist())
+        self.assertEqual(2, len(set(ranks[3:5]) & set(ranks[0:3])))
+        self.assertEqual(sorted(ranks[0:3].tolist()), ranks[0:3].tolist())
+
+    def test_jaccard_candidates_contain_all_similar_pairs(self):
+        names = _randomNames(300)
+        column = TextColumn(names)
+        everything = np.array(list(combinations(range(len(names)), 2)))
+        similarities = column.tokenJaccard(everything[:, 0], everything[:, 1])
+        for threshold in (0.2, 0.45, 0.65, 1.0):
+            left, right = jaccardCandidates(*elementSets(column), threshold)
+            found = set(zip(np.minimum(left, right).tolist(), np.maximum(left, right).tolist()))
+            expected = set(map(tuple, everything[similarities >= threshold].tolist()))
+            self.assertLessEqual(expected, found)
+            self.assertLess(len(found), len(everything))
+
+    def test_containment_candidates(self):
+        names = ["cafe bizou", "bizou", "b", "", "cafe", "deli"]
+        left, right = containmentCandidates(names)
+        expected = {(i, j) for i, j in combinations(range(len(names)), 2)
+                    if names[i] in names[j] or names[j] in names[i]}
+        self.assertEqual(expected, set(zip(np.minimum(left, right).tolist(), np.maximum(left, right).tolist())))
+
+    def test_candidate_pairs_are_sorted_and_unique(self):
+        column = TextColumn(_randomNames(100))
+        left, right = candidatePairs(column, 0.45, 0.5)
+        keys = left * len(column.strings) + right
+        self.assertTrue((left < right).all())
+        self.assertEqual(sorted(set(keys.tolist())), keys.tolist())
+
+    def test_calc_distances_equals_filtered_distances(self):
+        names = _randomNames(200)
+        oldCalculation = clean.utils.config["useOldCalculation"]
+        try:
+            for useOldCalculation in (False, True):
+                clean.utils.config["useOldCalculation"] = useOldCalculation
+                full = clean.calcDistances(names, readFromFile=False, writeToFile=False, doBias=False)
+                for bias, cutoff, doBias in [(0.5, 0.45, True), (0.7, 0.65, True), (0.2, 0.3, False)]:
+                    expected = {(min(s1, s2), max(s1, s2), d + (bias if doBias and (s1 in s2 or s2 in s1) else 0))
+                                for s1, s2, d in full}
+                    expected = {d for d in expected if d[2] >= cutoff}
+                    joined = clean.calcDistances(names, bias, readFromFile=False, writeToFile=False,
+                                                 doBias=doBias, minDistance=cutoff)
+                    self.assertEqual(expected, {(min(s1, s2), max(s1, s2), d) for s1, s2, d in joined})
+        finally:
+            clean.utils.config["useOldCalculation"] = oldCalculation
+
+
+if __name__ == '__main__':
+    unittest.main()
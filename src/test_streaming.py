@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src import streaming
+from src.main import deduplicate
+from src.streaming import deduplicateStream, writeGroups
+from src.synthetic import generate
+from src.test_incremental import restaurants
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "restaurants.tsv")
+        restaurants().to_csv(self.path, sep="\t", index=False)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_equals_deduplicate(self):
+        fullDf, fullDupes = deduplicate(restaurants())
+        for chunkSize, partitions, batchSize in [(100, 4, 65536), (2, 3, 1), (1, 1, 2)]:
+            self.assertEqual(fullDupes, deduplicateStream(self.path, chunkSize=chunkSize, partitions=partitions,
+                                                          batchSize=batchSize))
+
+    def test_split_partitions_equal_deduplicate(self):
+        fullDf, fullDupes = deduplicate(restaurants())
+        for partitionSize in [1, 2, 5]:
+            self.assertEqual(fullDupes, deduplicateStream(self.path, chunkSize=3, partitions=1,
+                                                          partitionSize=partitionSize))
+
+    def test_memory_is_bounded(self):
+        chunkSize, partitionSize = 100, 150
+        maxima = []
+        for rows in [500, 2000]:
+            path = os.path.join(self.directory.name, "synthetic{}.tsv".format(rows))
+            generate(rows, seed=1)[0].to_csv(path, sep="\t", index=False)
+            streaming.RECORDER.reset()
+            streaming.RECORDER.enable()
+            try:
+                dupes = deduplicateStream(path, chunkSize=chunkSize, partitions=2, partitionSize=partitionSize)
+            finally:
+                streaming.RECORDER.disable()
+            self.assertEqual(deduplicate(pd.read_csv(path, delimiter="\t"))[1], dupes)
+            histograms = streaming.RECORDER.histograms
+            maxima.append((max(histograms["streamMemoSize"]), max(histograms["streamPartitionEntries"])))
+        for memoSize, partitionEntries in maxima:
+            # every chunk holds at most chunkSize values per column
+            self.assertLessEqual(memoSize, chunkSize * len(streaming.preprocessing.COLUMNS))
+            self.assertLessEqual(partitionEntries, partitionSize)
+
+    def test_write_groups(self):
+        output = os.path.join(self.directory.name, "groups.tsv")
+        writeGroups(self.path, [{1, 3}, {2, 6}, {4, 5}], output, chunkSize=3)
+        self.assertEqual([0, 1, 0, 2, 2, 1, -7], pd.read_csv(output, delimiter="\t").group.tolist())
+
+    def test_dataset_dependent_keys_are_rejected(self):
+        with self.assertRaises(ValueError):
+            deduplicateStream(self.path, blockingKeys=["rareNameTokens"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src import survivorship
+from src.main import deduplicate, groupDuplicates, preProcess
+from src.survivorship import clusterLabels, survive
+from src.test_incremental import restaurants
+
+
+class TestSurvivorship(unittest.TestCase):
+    def test_cluster_labels(self):
+        self.assertEqual([-7, 0, 1, -5, 0], clusterLabels([7, 3, 9, 5, 1], [{1, 3}, {9}]).tolist())
+        self.assertEqual([-1, -2], clusterLabels([1, 2], []).tolist())
+
+    def test_ids_dont_have_to_match_positions(self):
+        df = preProcess(restaurants().iloc[::-1].assign(id=lambda d: d.id * 10).reset_index(drop=True))
+        members, canonical = survive(df, [{10, 30}, {20, 60}, {40, 50}])
+        self.assertEqual([-70, 0, 0, 1, 1, 2, 2], members.group.tolist())
+        self.assertEqual([70, 10, 20, 40], canonical.id.tolist())
+
+    def test_rules(self):
+        df = pd.DataFrame({"id": [1, 2, 3, 4], "name": ["cafe", "cafe bizou", "cafe", None],
+                           "phone": [np.nan, "1", "1", "1"], "source": ["a", "b", "c", "b"]})
+        sets = [{1, 2, 3, 4}]
+        self.assertEqual(2, survive(df, sets, ["mostComplete"])[1].id[0])
+        self.assertEqual(1, survive(df, sets, ["mostFrequent:name"])[1].id[0])
+        self.assertEqual(3, survive(df, sets, ["mostComplete", "mostFrequent"])[1].id[0])
+        self.assertEqual(2, survive(df, sets, ["longest:name"])[1].id[0])
+        self.assertEqual(1, survive(df, sets, [])[1].id[0])
+        sources = survivorship.utils.config["preferredSources"]
+        try:
+            survivorship.utils.config["preferredSources"] = ["c", "b"]
+            members, _ = survive(df, sets, ["preferredSource"])
+            self.assertEqual([3, 2, 4, 1], members.id.tolist())
+            self.assertEqual([True, False, False, False], members.canonical.tolist())
+        finally:
+            survivorship.utils.config["preferredSources"] = sources
+        self.assertRaises(ValueError, survive, df, sets, ["unknown"])
+
+    def test_deduplicate(self):
+        df, dupes = deduplicate(restaurants())
+        self.assertEqual([-7, 0, 0, 1, 1, 2, 2], df.group.tolist())
+        canonical = df[df.canonical]
+        self.assertEqual([7, 1, 2, 4], canonical.id.tolist())
+        self.assertEqual("arnie morton's of chicago", canonical.name.tolist()[1])
+        self.assertTrue(groupDuplicates(preProcess(restaurants()), dupes).equals(df))
+
+
+if __name__ == '__main__':
+    unittest.main()
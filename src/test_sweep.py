@@ -0,0 +1,25 @@
+import unittest
+
+import pandas as pd
+
+from src import utils
+from src.clean import clean
+from src.sweep import sweep
+
+
+class TestSweep(unittest.TestCase):
+    def test_sweep_equals_clean(self):
+        def restaurants():
+            return pd.read_csv(utils.PATH_PREFIX + '/restaurants.tsv', delimiter='\t').iloc[:60]
+
+        biases = [0.0, 0.5, 0.7]
+        cutoffs = [0.0, 0.3, 0.45, 0.65, 0.9]
+        results = sweep(restaurants(), biases, cutoffs)
+        self.assertEqual(len(biases) * len(cutoffs), len(results))
+        for bias, cutoff, algo, *params in results:
+            cleaned = clean(restaurants(), bias, cutoff, readFromFile=False, writeToFile=False)
+            self.assertEqual(utils.compareDfToGold(cleaned, total=60)[3], params)
+
+
+if __name__ == '__main__':
+    unittest.main()
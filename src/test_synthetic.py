@@ -0,0 +1,34 @@
+import unittest
+
+from src import main
+from src.evaluation import pairsOf, pairwiseMetrics
+from src.synthetic import generate
+
+
+class TestSynthetic(unittest.TestCase):
+    def test_shape(self):
+        df, gold = generate(3000, 0.25, seed=1)
+        self.assertEqual(3000, len(df))
+        self.assertEqual(list(range(1, 3001)), df.id.tolist())
+        # every duplicate row is paired once with the first row of its restaurant
+        self.assertEqual(750, len(gold))
+        self.assertTrue((gold.id1 < gold.id2).all())
+        self.assertFalse(gold.id2.duplicated().any())
+
+    def test_deterministic(self):
+        df1, gold1 = generate(500, seed=3)
+        df2, gold2 = generate(500, seed=3)
+        self.assertTrue(df1.equals(df2))
+        self.assertTrue(gold1.equals(gold2))
+
+    def test_duplicates_are_found(self):
+        df, gold = generate(2000, 0.2, seed=2)
+        goldPairs = pairsOf([[id1] + id2s for id1, id2s in gold.groupby("id1").id2.agg(list).items()])
+        _, dupes = main.deduplicate(df)
+        _, _, _, precision, recall, _ = pairwiseMetrics(pairsOf(dupes), goldPairs)
+        self.assertGreater(precision, 0.95)
+        self.assertGreater(recall, 0.95)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import random
+import unittest
+
+from src.unionfind import Clusters, UnionFind
+from src.utils import merge_common
+
+
+class TestUnionFind(unittest.TestCase):
+    def test_union_find(self):
+        unionFind = UnionFind(5)
+        self.assertNotEqual(-1, unionFind.union(0, 1))
+        self.assertNotEqual(-1, unionFind.union(3, 4))
+        self.assertEqual(-1, unionFind.union(1, 0))
+        self.assertEqual(unionFind.find(0), unionFind.find(1))
+        self.assertNotEqual(unionFind.find(0), unionFind.find(3))
+        self.assertNotEqual(unionFind.find(2), unionFind.find(3))
+
+    def test_rings_equal_merge_common(self):
+        rand = random.Random(42)
+        for _ in range(20):
+            edges = [("s" + str(rand.randrange(30)), "s" + str(rand.randrange(30)), 1) for _ in range(25)]
+            edges = [e for e in edges if e[0] != e[1]]
+            self.assertEqual(list(merge_common(map(lambda x: set(x[0:2]), edges))), Clusters(edges).rings())
+
+    def test_representatives(self):
+        representatives = Clusters([("b", "c", 1), ("a", "c", 1), ("x", "y", 1)]).representatives()
+        self.assertEqual({"a": "a", "b": "a", "c": "a", "x": "x", "y": "x"}, representatives)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+from typing import Dict, Hashable, Iterable, List, Sequence
+
+
+class UnionFind:
+    """
+    Disjoint sets over the integers 0..size-1 with path compression and union by size.
+    """
+
+    def __init__(self, size: int):
+        self.parent: List[int] = list(range(size))
+        self.size: List[int] = [1] * size
+
+    def find(self, x: int) -> int:
+        """Returns the representative of the set containing x."""
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # path compression
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, x: int, y: int) -> int:
+        """Merges the sets containing x and y.
+
+        Returns:
+            the representative of the merged set, or -1 if x and y already were in the same set
+        """
+        x = self.find(x)
+        y = self.find(y)
+        if x == y:
+            return -1
+        if self.size[x] < self.size[y]:
+            x, y = y, x
+        self.parent[y] = x
+        self.size[x] += self.size[y]
+        return x
+
+
+class Clusters:
+    """
+    Clusters the elements of a list of edges into connected components with a UnionFind.
+
+    Every edge is a sequence, of which only the first two elements are used, so distance tuples of the form
+    (name1, name2, distanceValue) can be used directly.
+    """
+
+    def __init__(self, edges: Iterable[Sequence[Hashable]]):
+        ids: Dict[Hashable, int] = {}
+        pairs = []
+        for edge in edges:
+            pairs.append((ids.setdefault(edge[0], len(ids)), ids.setdefault(edge[1], len(ids))))
+        self.elements: List[Hashable] = list(ids)
+        self.unionFind = UnionFind(len(self.elements))
+        for x, y in pairs:
+            self.unionFind.union(x, y)
+
+    def rings(self) -> List[List[Hashable]]:
+        """Returns the sorted members of every cluster.
+
+        The clusters are ordered by their first appearance in the edges, which is the same result as
+        utils.merge_common returns for the same edges.
+        """
+        members: Dict[int, List[Hashable]] = {}
+        # the ids were given in order of appearance, so the first id of every root is its first appearance
+        for i, element in enumerate(self.elements):
+            members.setdefault(self.unionFind.find(i), []).append(element)
+        return [sorted(ring) for ring in members.values()]
+
+    def representatives(self) -> Dict[Hashable, Hashable]:
+        """Returns a dict from every element to the smallest element of its cluster, the first of its ring."""
+        return {element: ring[0] for ring in self.rings() for element in ring}
@@ -1,8 +1,11 @@
+import os
 from collections import defaultdict
 from typing import List, Any, Set, Tuple, Iterable
 
 import pandas as pd
 
+from instrumentation import RECORDER
+
 
 def printUniqueTokens(series: pd.Series):
     unique_series = series.unique()
@@ -50,23 +53,24 @@ def loadGoldStandard() -> Tuple[List[Set[int]], List[int]]:
             dupeSets is a list of all rows in the Gold Standard as sets
             dupeIds is a list of all ids that are in Gold Standard
     """
-    dupeDf = pd.read_csv(PATH_PREFIX + '/restaurants_DPL.tsv', delimiter='\t')
-    dupeDict = {}
-    for i, dupeRow in dupeDf.iterrows():
-        if dupeRow[0] not in dupeDict:
-            dupeDict[dupeRow[0]] = set()
-            dupeDict[dupeRow[0]].add(dupeRow[0])
-        dupeDict[dupeRow[0]].add(dupeRow[1])
-
-    dupeSets: List[Set[Any]] = list(dupeDict.values())
-    dupeIds: List[int] = [y for x in dupeSets for y in x]
-    return dupeSets, dupeIds
+    from evaluation import GoldStandard
+    gold = GoldStandard()
+    return gold.sets, gold.ids
 
 
 def compareDfToGold(df: pd.DataFrame, total=864) -> Tuple[Set, Set, Set, List]:
     return compareToGold(list(df[df.id.map(len) > 1].id), total)
 
 
+def goldParams(tp: int, fp: int, fn: int, total=864) -> List:
+    """Calculates the list of parameters [tp, tn, fp, fn, precision, recall, fScore] from the given counts."""
+    tn = total - tp - fn - fp
+    precision = tp / (tp + fp)
+    recall = tp / (tp + fn)
+    fScore = (2 * precision * recall) / (precision + recall)
+    return [tp, tn, fp, fn, precision, recall, fScore]
+
+
 def compareToGold(duplicates: List[Set[int]], total=864, printType="table") -> Tuple[Set, Set, Set, List]:
     """Compares the given list of duplicates to the Gold Standard and prints and returns the results
 
@@ -79,30 +83,15 @@ def compareToGold(duplicates: List[Set[int]], total=864, printType="table") -> T
     Returns:
         A Tuple (true_positive, false_negative, false_positive, listOfParams)
     """
-    recognizedDuplicates = duplicates
-    true_positive = set()
-    false_negative = set()
-    false_positive = set()
-    for dupeSet in GOLD_DUPE_SETS:
-        if dupeSet in recognizedDuplicates:
-            true_positive.add(frozenset(dupeSet))
-        else:
-            false_negative.add(frozenset(dupeSet))
-    for recognizedDupeSet in recognizedDuplicates:
-        if recognizedDupeSet in GOLD_DUPE_SETS:
-            true_positive.add(frozenset(recognizedDupeSet))
-        else:
-            false_positive.add(frozenset(recognizedDupeSet))
+    from evaluation import GOLD
+    with RECORDER.stage("compareToGold"):
+        true_positive, false_negative, false_positive = GOLD.compare(duplicates)
 
     # times 2 because we work with sets of 2
     fn = len([e for s in false_negative for e in s])
     fp = len([e for s in false_positive for e in s])
     tp = len([e for s in true_positive for e in s])
-    tn = total - tp - fn - fp
-    precision = tp / (tp + fp)
-    recall = tp / (tp + fn)
-    fScore = (2 * precision * recall) / (precision + recall)
-    listOfParams = [tp, tn, fp, fn, precision, recall, fScore]
+    listOfParams = goldParams(tp, fp, fn, total)
     if printType == "table":
         print("tp={:<5}, tn={:<5}, fp={:<5}, fn={:<5}, precision={:< .3f}, recall={:< .3f}, fScore={:< .3f}"
               .format(*listOfParams))
@@ -114,6 +103,10 @@ def compareToGold(duplicates: List[Set[int]], total=864, printType="table") -> T
 def prepareUploadJsons(df: pd.DataFrame) -> pd.DataFrame:
     """Prepares and saves two json files that can be imported into mongodb.
         Look in ../data/work/deduped_raw.json and ../data/work/deduped_clean.json
+        For the members view of main.groupDuplicates the raw json contains every row with its group and the clean json
+        the canonical record of every group. DataFrames aggregated into sets, like the one of clean.py, are reduced to
+        an element of every set instead.
+        The given DataFrame isn't changed. See export.py for the streaming ndjson export, which can also write diffs.
 
     Args:
         df: a pandas DataFrame
@@ -124,19 +117,25 @@ def prepareUploadJsons(df: pd.DataFrame) -> pd.DataFrame:
 
     def __firstOfSet(s: Any) -> Any:
         if isinstance(s, set):
-            return s.pop()
+            # without removing the element, so the sets of the given DataFrame stay complete
+            return next(iter(s), None)
         else:
             return s
 
-    if "group" in df:
-        df.drop("group", axis=1, inplace=True)
-    df.to_json(PATH_PREFIX + '/deduped_raw.json', orient='records')
-    df.name = df.name.apply(__firstOfSet)
-    df.address = df.address.apply(__firstOfSet)
-    df.city = df.city.apply(__firstOfSet)
-    df.cname = df.cname.apply(__firstOfSet)
-    df.caddress = df.caddress.apply(__firstOfSet)
-    df.to_json(PATH_PREFIX + '/deduped_clean.json', orient='records')
+    with RECORDER.stage("export"):
+        if "canonical" in df:
+            raw = df.drop("canonical", axis=1)
+            raw.to_json(PATH_PREFIX + '/deduped_raw.json', orient='records')
+            df = raw[df.canonical.to_numpy()].reset_index(drop=True)
+        else:
+            df = df.drop("group", axis=1) if "group" in df else df.copy()
+            df.to_json(PATH_PREFIX + '/deduped_raw.json', orient='records')
+            df.name = df.name.apply(__firstOfSet)
+            df.address = df.address.apply(__firstOfSet)
+            df.city = df.city.apply(__firstOfSet)
+            df.cname = df.cname.apply(__firstOfSet)
+            df.caddress = df.caddress.apply(__firstOfSet)
+        df.to_json(PATH_PREFIX + '/deduped_clean.json', orient='records')
     print("Written two jsons 'deduped_raw.json' and 'deduped_clean.json' to directory '"
           + PATH_PREFIX + "'.")
     print("You can use those with mongoimport!")
@@ -146,19 +145,55 @@ def prepareUploadJsons(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def difference(li1: List[Any], li2: List[Any]) -> Tuple[List[Any], List[Any]]:
-    left = [i for i in li1 + li2 if i not in li1]
-    right = [i for i in li1 + li2 if i not in li2]
+    def __key(i: Any) -> Any:
+        return frozenset(i) if isinstance(i, set) else i
+
+    keys1 = {__key(i) for i in li1}
+    keys2 = {__key(i) for i in li2}
+    left = [i for i in li1 + li2 if __key(i) not in keys1]
+    right = [i for i in li1 + li2 if __key(i) not in keys2]
     return left, right
 
 
-PATH_PREFIX = "../data/work"
-GOLD_DUPE_SETS, GOLD_DUPE_IDS = loadGoldStandard()
+def __getattr__(name: str) -> Any:
+    # the Gold Standard is only loaded when GOLD_DUPE_SETS or GOLD_DUPE_IDS are used the first time
+    if name == "GOLD_DUPE_SETS":
+        from evaluation import GOLD
+        return GOLD.sets
+    if name == "GOLD_DUPE_IDS":
+        from evaluation import GOLD
+        return GOLD.ids
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+# relative to this file instead of the working directory, so the scripts can be run from anywhere
+PATH_PREFIX = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "work"))
 config = {
     # if True a comparison to the gold standard will be made
     "compareToGold": True,
     # if True then the results of the deplucation will be prepared and saved as json files
     # to enable an import into mongodb
     "prepareUploadJsons": True,
+    # if True main.deduplicate prints how many candidate pairs the blocking generated and pruned
+    "printBlockingStats": True,
+    # if True main.py additionally prints the pairwise precision and recall, see evaluation.GoldStandard.pairwise
+    "comparePairwiseToGold": True,
+
+    # the bands and rows per band of the MinHash-LSH of the approximate mode, see minhash.py
+    # the token values find pairs with a similarity of 0.45 with 95% probability, the character values are tuned for
+    # the minTextDistance of 0.9 and find pairs of 0.9 with 99.8% probability, see minhash.collisionProbability
+    "minHashTokenBands": 32,
+    "minHashTokenRows": 3,
+    "minHashCharBands": 32,
+    "minHashCharRows": 16,
+
+    # the number of name pairs clean.boundedDistances scores at once, bounds its memory next to the kept pairs
+    "distancePairsPerBlock": 1 << 20,
+
+    # the rules selecting the canonical record of every cluster, in the order they are applied, see survivorship.py
+    "survivorshipRules": ["mostComplete", "mostFrequent:name", "longest:name"],
+    # the sources of the preferredSource rule, the first one is preferred the most
+    "preferredSources": [],
 
     # this is a feature flag to toggle the old way on, that found all but 12 duplicates
     # if this is set to false a slightly improved way is used, which found all but 8 duplicates